@@ -0,0 +1,916 @@
+import os
+import time
+import logging
+import sys
+import random
+import re
+import json
+import shutil
+import argparse
+from urllib.parse import urlsplit
+from lxml import etree
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait, Select
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.fetcher import AsyncFetcher
+from common.store import RecordStore
+from common.dedup import DedupIndex
+from common.snapshot import PageSnapshot, node_text
+from common.structured import StructuredData, first_value
+from common.selector_resolver import SelectorResolver
+from common.checkpoint import Checkpoint, is_navigable
+from common.forms import fill_form
+from common.session import SavedSession
+from common.http import fetch_html
+from common.throttle import RateController
+from common.browser import DEFAULT_BLOCKED, parse_block_list, lean_options, block_resources, wait_for_any, TransferMeter, start_chrome
+from common.cache import ResponseCache
+from common.work_queue import WorkQueue, run_worker, worker_name
+from common.dead_letter import DeadLetterStore, CircuitBreaker, RetryScheduler
+from common.metrics import METRICS
+from common.log import setup_logging
+
+log = logging.getLogger(__name__)
+
+# Default details for the directory-access form; override with --access-details <json file>
+ACCESS_DETAILS = {
+    'First Name':    'Jane',
+    'Last Name':     'Doe',
+    'Email':         'jane.doe@example.com',
+    'Phone Number':  '555-1234',
+    'Company Name':  'Acme LLC',
+    'Company Type':  'M&A Advisory',
+    'Visit Reason':  'researching potential buyers'
+}
+
+# Rotate through a small pool of User-Agents
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.1 Safari/605.1.15'
+]
+
+# Directory categories and the industry tag each one puts on its firms
+BASE_URL = 'https://www.axial.net/forum/companies/'
+CATEGORIES = {
+    'business-brokers': 'Business Brokerage',
+    'm-a-advisory-firms': 'M&A Advisory',
+}
+
+# Selector chains; the resolver probes without waiting and learns which selector matches
+SELECTORS = SelectorResolver('axial.net')
+SELECTORS.register('Website', ["//form/div[3]/p/a"])
+SELECTORS.register('Location', ["//form/div[2]/p/span[1]"])
+SELECTORS.register('Team Member', ["//axl-account-profile-member[1]//p[1]"])
+SELECTORS.register('Listing Name', ["//a[@itemprop='name']"])
+COOKIE_BUTTON_XPATH = "//button[contains(., 'Reject Cookies') or contains(., 'Accept Cookies')]"
+ACCESS_FORM_XPATH = "//form[.//input[@type='email' or contains(translate(@name, 'EMAIL', 'email'), 'email')]]"
+LOCATION_RE = re.compile(r'location["\s:]+([^,"<]+)', re.IGNORECASE)
+INDUSTRY_RE = re.compile(r'industry["\s:]+([^,"<]+)', re.IGNORECASE)
+COLUMNS = ['Company Name', 'Website', 'Location', 'Team Member', 'Industry']
+# Profile fields a result card's schema.org markup can carry; a firm whose card has all of them isn't visited
+LISTING_FIELDS = ('Website', 'Location', 'Team Member')
+MISSING = ('Not available', 'Not specified')
+LISTING_TTL = 24 * 3600  # Result pages gain new firms, so they're revalidated sooner than profiles
+
+
+def category_url(slug):
+    return f"{BASE_URL}{slug}/"
+
+
+def category_industry(slug):
+    """Industry tag for a category slug (unknown slugs get a title-cased version of the slug)"""
+    return CATEGORIES.get(slug) or slug.replace('-', ' ').title()
+
+
+def merge_industries(*values):
+    """Join industry tags into one '; '-separated value, dropping blanks and repeats"""
+    tags = []
+    for value in values:
+        for tag in str(value or '').split(';'):
+            tag = tag.strip()
+            if tag and tag not in tags:
+                tags.append(tag)
+    return '; '.join(tags)
+
+
+def text_value(value):
+    """Text of a schema.org value: the first of a list, an item's name, or the string itself"""
+    value = first_value(value)
+    if isinstance(value, dict):
+        return text_value(value.get('name'))
+    return str(value).strip() or None if value is not None else None
+
+
+def location_value(value):
+    """'City, Region' from a PostalAddress or Place (or a plain location string)"""
+    value = first_value(value)
+    if isinstance(value, dict):
+        if 'address' in value:
+            return location_value(value['address'])
+        parts = [text_value(value.get(key)) for key in ('addressLocality', 'addressRegion')]
+        return ', '.join(part for part in parts if part) or text_value(value)
+    return text_value(value)
+
+
+def listing_fields(item):
+    """Profile columns an Organization item from a result page already fills"""
+    fields = {}
+    for key in ('url', 'sameAs'):
+        values = item.get(key) if isinstance(item.get(key), list) else [item.get(key)]
+        # The card's own link points back at the Axial profile, not at the firm
+        sites = [v for v in values if isinstance(v, str) and v.startswith('http')
+                 and not urlsplit(v).netloc.endswith('axial.net') and '/forum/companies/' not in v]
+        if sites:
+            fields['Website'] = sites[0]
+            break
+    location = location_value(item.get('address') or item.get('location'))
+    if location:
+        fields['Location'] = location
+    for key in ('employee', 'member', 'founder'):
+        member = text_value(item.get(key))
+        if member:
+            fields['Team Member'] = member
+            break
+    industries = item.get('industry') or item.get('knowsAbout')
+    if not isinstance(industries, list):
+        industries = [industries]
+    industry = merge_industries(*[text_value(value) for value in industries])
+    if industry:
+        fields['Industry'] = industry
+    return fields
+
+
+def listing_entry(profile):
+    """(name, href, fields) from a listing entry; checkpoints from earlier runs hold (name, href) pairs"""
+    return profile[0], profile[1], dict(profile[2]) if len(profile) > 2 and profile[2] else {}
+
+
+def extract_profile(snapshot, name, industry=None):
+    """Read a profile's fields from a page snapshot; industry is the tag(s) of the categories listing it"""
+    site = SELECTORS.first(snapshot, 'Website')
+    return {
+        'Company Name': name,
+        'Website': (snapshot.link(site) if site is not None else None) or 'Not available',
+        'Location': SELECTORS.text(snapshot, 'Location') or snapshot.search(LOCATION_RE, 'Not specified'),
+        'Team Member': SELECTORS.text(snapshot, 'Team Member', 'Not specified'),
+        'Industry': merge_industries(snapshot.search(INDUSTRY_RE), industry) or 'Not specified'
+    }
+
+
+def parse_profile_html(page_html, name, url=None, industry=None):
+    """Parse a profile page fetched over HTTP; returns None if the profile form isn't in the HTML"""
+    try:
+        snapshot = PageSnapshot(page_html, url)
+    except (etree.ParserError, ValueError):
+        return None
+    if snapshot.first(SELECTORS.chains['Website']) is None:
+        return None
+    return extract_profile(snapshot, name, industry)
+
+
+def parse_listing_html(page_html, item):
+    """Snapshot of a (slug, url) result page fetched over HTTP"""
+    return PageSnapshot(page_html, item[1])
+
+
+class AxialScraper:
+    """Crawl one or more Axial directory categories through a single browser and login.
+
+    Every category's result pages are walked first (over HTTP, several
+    categories at a time, falling back to the browser when a category's
+    pages don't render without it). The listings are merged into one
+    frontier keyed by company name, so a firm listed in several categories
+    is fetched once and saved with all of its industry tags.
+    """
+
+    def __init__(self, categories, output_name=None, debug=True, concurrency=4, per_host_limit=4,
+                 access_details=None, manual_login=False, use_cache=True, blocked=DEFAULT_BLOCKED, page_load='eager',
+                 use_daemon=True, visit_profiles=False, worker=None, retry_wait=120):
+        self.debug = debug
+        self.concurrency = concurrency  # Pages fetched over HTTP at once; 1 = browser only
+        self.per_host_limit = per_host_limit
+        self.categories = list(categories)
+        if not output_name:
+            output_name = 'axial_' + self.categories[0].replace('-', '_') if len(self.categories) == 1 else 'axial_firms'
+        self.url = category_url(self.categories[0])
+        self.excel_path = os.path.join(os.getcwd(), f'{output_name}.xlsx')
+        self.db_path = os.path.join(os.getcwd(), f'{output_name}.db')
+        self.selector_stats_path = os.path.join(os.getcwd(), f'{output_name}_selectors.json')
+        # Name in a shared work queue; each queue worker keeps its own progress and dedup index
+        self.worker = worker
+        self.progress_dir = os.getcwd()
+        if worker:
+            self.progress_dir = os.path.join(os.getcwd(), f'{output_name}_workers', worker.replace(':', '-'))
+            os.makedirs(self.progress_dir, exist_ok=True)
+        self.firm_chunk_size = 25  # Firms per work-queue task
+        self.cookies_checked = False
+        self.pending_urls = []  # Profile URLs of the records in self.data
+        self.save_frequency = 5
+        self.data = []
+        self.scraped_companies = None  # On-disk index of saved company names
+        self.frontier = {}  # Company name -> {'url': profile URL, 'industries': [tags], 'fields': {column: value}}
+        self.visit_profiles = visit_profiles  # Fetch every profile even when its result card had all the fields
+        self.profile_latencies = []  # Seconds per profile fetched over HTTP
+        self.driver = None
+        self.blocked = tuple(blocked)  # Resource groups the browser refuses to load (common.browser)
+        self.page_load = page_load  # 'eager' returns at DOMContentLoaded; each load waits for our selectors
+        self.meter = None  # Bytes per browser page, when metrics are on
+        self.use_daemon = use_daemon  # Attach to the browser daemon's warm Chrome when one is free
+        self.access_details = access_details or ACCESS_DETAILS
+        self.manual_login = manual_login  # Wait for someone to fill the access form instead of submitting it
+        # Login cookies are shared by every category and output, and reused until they expire
+        self.saved_session = SavedSession(os.path.join(os.getcwd(), 'axial_session.json'))
+        self.cookies = {}
+        self.user_agent = None
+        # Pages from earlier runs are served from disk or revalidated instead of re-downloaded
+        self.cache = ResponseCache(os.path.join(os.getcwd(), 'axial_http_cache')) if use_cache else None
+        # Paces browser loads and HTTP fetches to the site, backing off when it pushes back
+        self.rate = RateController(max_window=per_host_limit)
+
+        self.store = RecordStore(self.db_path, COLUMNS, key_column='Company Name')
+        if self.store.count() == 0 and os.path.exists(self.excel_path):
+            imported = self.store.import_xlsx(self.excel_path)
+            log.info(f"Imported {imported} companies from {self.excel_path}")
+        self.scraped_companies = DedupIndex(os.path.join(self.progress_dir, f'{output_name}.idx'),
+                                            self.store, ['Company Name'])
+        if len(self.scraped_companies):
+            log.info(f"Loaded {len(self.scraped_companies)} previously scraped companies")
+        else:
+            log.info('Starting fresh — no existing record store found')
+        SELECTORS.load(self.selector_stats_path)
+
+        # Listing cursors (one per category) and finished profiles, for resuming after a crash
+        self.checkpoint = Checkpoint(os.path.join(self.progress_dir, f'{output_name}_progress'))
+        # Profiles that failed, with their error and retry schedule; retried before a run finishes or on the next one
+        self.dead_letters = DeadLetterStore(os.path.join(os.getcwd(), f'{output_name}_dead_letters.db'),
+                                            breaker=CircuitBreaker())
+        self.retry_wait = retry_wait  # Seconds a run waits for scheduled retries before leaving them to the next run
+
+    def setup_driver(self, user_agent=None):
+        chrome_opts = Options()
+        if not self.debug:
+            chrome_opts.add_argument('--headless')
+        chrome_opts.add_argument('--no-sandbox')
+        chrome_opts.add_argument('--disable-dev-shm-usage')
+        chrome_opts.add_argument('--disable-gpu')
+        chrome_opts.add_argument('--window-size=1920,1080')
+        chrome_opts.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2
+        })
+        lean_options(chrome_opts, self.page_load, measure=METRICS.enabled)
+        chrome_opts.add_argument(f"--user-agent={user_agent or random.choice(USER_AGENTS)}")
+
+        with METRICS.timer('driver_start'):
+            # Attaches to a warm instance when the browser daemon is running (common.browser_daemon)
+            self.driver = start_chrome(chrome_opts, use_daemon=self.use_daemon)
+        if self.blocked:
+            block_resources(self.driver, self.blocked)
+        self.meter = TransferMeter(self.driver, bool(self.blocked)) if METRICS.enabled else None
+        # No implicit wait: a missing element would otherwise cost 10s before the fallback runs
+        self.driver.implicitly_wait(0)
+        log.info(f'WebDriver setup complete (headless={not self.debug})')
+
+    def handle_cookies(self):
+        # Only the first page waits for the banner; after that, probe without waiting
+        if self.cookies_checked:
+            for btn in self.driver.find_elements(By.XPATH, COOKIE_BUTTON_XPATH):
+                if btn.is_displayed():
+                    btn.click()
+                    METRICS.pause(0.5)
+                    break
+            return
+        self.cookies_checked = True
+        try:
+            btn = WebDriverWait(self.driver, 3).until(
+                EC.element_to_be_clickable((By.XPATH, COOKIE_BUTTON_XPATH))
+            )
+            btn.click()
+            METRICS.pause(0.5)
+        except TimeoutException:
+            pass
+
+    def remove_overlay(self):
+        self.driver.execute_script(
+            "document.querySelectorAll('.cky-overlay').forEach(el=>el.remove());"
+        )
+
+    def is_authenticated(self, timeout=10):
+        """True once the directory listing shows; False if the access form is shown instead"""
+        listing = SELECTORS.ordered('Listing Name')[0]
+        try:
+            WebDriverWait(self.driver, timeout).until(
+                lambda d: d.find_elements(By.XPATH, listing) or d.find_elements(By.XPATH, ACCESS_FORM_XPATH)
+            )
+        except TimeoutException:
+            return False
+        return bool(self.driver.find_elements(By.XPATH, listing))
+
+    def login(self):
+        """Get past the directory-access form: reuse saved cookies, else submit ACCESS_DETAILS"""
+        if self.saved_session.restore(self.driver, self.url) and self.is_authenticated():
+            log.info('Reusing saved Axial session')
+        else:
+            self.rate.wait(self.url)
+            with METRICS.timer('driver_get'):
+                self.driver.get(self.url)
+            self.handle_cookies()
+            if not self.is_authenticated(timeout=5):
+                if self.manual_login:
+                    log.info("🚧 Please complete the directory-access form in the browser now.")
+                    input("    When you’re done, press ENTER here to start scraping…")
+                else:
+                    self.remove_overlay()
+                    filled = fill_form(self.driver, self.access_details, ACCESS_FORM_XPATH)
+                    log.info(f"Submitted the directory-access form ({filled}/{len(self.access_details)} fields)")
+                if not self.is_authenticated():
+                    raise RuntimeError(f"Still at the directory-access form for {self.url}")
+            self.saved_session.save(self.driver)
+            log.info(f"Saved Axial session to {self.saved_session.path}")
+        self.cookies = {c['name']: c['value'] for c in self.driver.get_cookies()}
+        self.user_agent = self.driver.execute_script('return navigator.userAgent;')
+
+    def ensure_driver(self):
+        """Start the browser and log in on first use (runs on a saved session may never need it)"""
+        if self.driver is None:
+            self.setup_driver(self.saved_session.user_agent())
+            self.login()
+        return self.driver
+
+    def resume_session_over_http(self):
+        """Adopt the saved session without a browser if its cookies still get past the access form"""
+        session = self.saved_session.requests_session()
+        if session is None:
+            return False
+        try:
+            page_html = fetch_html(session, self.url, rate=self.rate)
+        finally:
+            session.close()
+        if not page_html or PageSnapshot(page_html, self.url).first(SELECTORS.chains['Listing Name']) is None:
+            log.warning('Saved Axial session no longer works over HTTP')
+            return False
+        self.cookies = self.saved_session.cookie_dict()
+        self.user_agent = self.saved_session.user_agent()
+        return True
+
+    def save_progress(self, force=False):
+        count = len(self.data)
+        if count == 0:
+            return
+        if not force and count < self.save_frequency:
+            return
+        with METRICS.timer('save'):
+            self.store.append_many(self.data)
+            self.scraped_companies.update(r['Company Name'] for r in self.data)
+            self.scraped_companies.commit()
+            self.checkpoint.mark_profiles_done(self.pending_urls)
+            self.dead_letters.resolve_many(self.pending_urls)
+            self.data.clear()
+            self.pending_urls.clear()
+        METRICS.count('records_saved', count)
+        log.info(f"→ Saved {len(self.scraped_companies)} companies", extra={'saved': len(self.scraped_companies)})
+
+    def export_excel(self):
+        with METRICS.timer('export'):
+            count = self.store.export_xlsx(self.excel_path)
+        log.info(f"Exported {count} companies to {self.excel_path}")
+
+    def industry_of(self, name):
+        entry = self.frontier.get(name)
+        return merge_industries(entry['fields'].get('Industry'), *entry['industries']) if entry else None
+
+    def fill_from_listing(self, record):
+        """Fill a profile's missing fields from what its result card carried"""
+        entry = self.frontier.get(record['Company Name'])
+        if entry:
+            for field in LISTING_FIELDS:
+                if record[field] in MISSING and entry['fields'].get(field):
+                    record[field] = entry['fields'][field]
+        return record
+
+    def save_listing_record(self, name, entry):
+        """Save a firm straight from its result card"""
+        fields = entry['fields']
+        record = {'Company Name': name, 'Industry': self.industry_of(name) or 'Not specified'}
+        record.update((field, fields[field]) for field in LISTING_FIELDS)
+        log.debug(f"→ {name} (from listing) | {record['Website']} | {record['Location']} | {record['Team Member']}")
+        self.data.append(record)
+        self.pending_urls.append(entry['url'])
+        self.save_progress()
+
+    def http_fetcher(self, concurrency, cache_ttl=None):
+        """AsyncFetcher carrying the logged-in cookies and User-Agent"""
+        return AsyncFetcher(
+            concurrency=concurrency, per_host=self.per_host_limit, cookies=self.cookies,
+            user_agent=self.user_agent, cache=self.cache, cache_ttl=cache_ttl, rate=self.rate
+        )
+
+    def fail_profile(self, name, url, error_class, error):
+        """Dead-letter a profile with what the retry needs to rebuild its frontier entry"""
+        entry = self.frontier.get(name) or {}
+        self.dead_letters.record(url, error_class, error, kind='profile', payload={
+            'name': name, 'industries': entry.get('industries', []), 'fields': entry.get('fields', {}),
+        })
+
+    def scrape_profile(self, name, url):
+        """Scrape one profile in the browser; one that fails to load goes to the dead letters, not the store"""
+        log.debug(f"→ {name} | {url}")
+        cached = self.cache.get_fresh('rendered:' + url) if self.cache else None
+        if cached is not None:
+            record = parse_profile_html(cached, name, url, self.industry_of(name))
+            if record:
+                self.fill_from_listing(record)
+                self.data.append(record)
+                self.pending_urls.append(url)
+                log.debug(f"   ✓ (cached) {record['Website']} | {record['Location']} | {record['Team Member']}")
+                self.save_progress()
+                return
+        self.ensure_driver()
+        self.rate.wait(url)
+        start = time.perf_counter()
+        try:
+            with METRICS.timer('driver_get'):
+                self.driver.get(url)
+            loaded = wait_for_any(self.driver, SELECTORS.chains['Website'])
+            if not loaded:
+                log.warning(f"timeout waiting for profile: {name}")
+            latency = time.perf_counter() - start
+            if self.meter:
+                self.meter.take(latency)
+            self.handle_cookies()
+            self.remove_overlay()
+            # One page_source round-trip; all fields and the regex fallbacks run on the snapshot
+            snapshot = PageSnapshot.capture(self.driver)
+        except Exception as e:
+            self.rate.record(url, error=True)
+            self.fail_profile(name, url, e.__class__.__name__, str(e))
+            return
+        self.rate.record(url, latency=latency, page_html=snapshot.html)
+        record = extract_profile(snapshot, name, self.industry_of(name))
+        if self.cache and record['Website'] != 'Not available':
+            self.cache.put('rendered:' + url, snapshot.html)
+        self.fill_from_listing(record)
+        if not loaded and all(record[field] in MISSING for field in LISTING_FIELDS):
+            # Only placeholders: retry the profile later rather than save them
+            self.fail_profile(name, url, 'ProfileTimeout', 'profile form never rendered')
+            return
+        self.data.append(record)
+        self.pending_urls.append(url)
+        log.debug(f"   ✓ {record['Website']} | {record['Location']} | {record['Team Member']}")
+        self.save_progress()
+
+    def fetch_profiles_concurrently(self, profiles):
+        """Fetch (name, href) profiles over HTTP with the browser's session; returns the ones that failed"""
+        fetcher = self.http_fetcher(self.concurrency)
+
+        def parse(page_html, profile):
+            name, url = profile
+            return parse_profile_html(page_html, name, url, self.industry_of(name))
+
+        def on_result(profile, record):
+            if record:
+                self.fill_from_listing(record)
+                log.debug(f"→ {profile[0]} | {profile[1]}")
+                log.debug(f"   ✓ {record['Website']} | {record['Location']} | {record['Team Member']}")
+                self.data.append(record)
+                self.pending_urls.append(profile[1])
+                self.save_progress()
+
+        failures = fetcher.run(profiles, parse, on_result)
+        self.profile_latencies.extend(fetcher.latencies)
+        log.info(f"Fetched {fetcher.fetched}/{len(profiles)} profiles at {fetcher.pages_per_second():.1f} pages/sec")
+        return failures
+
+    def listing_profiles(self, snapshot):
+        """(name, href, fields) for every firm on a result page.
+
+        fields are the profile columns the page's schema.org markup already
+        carries for the firm: its card's microdata item, plus any JSON-LD
+        object of the same name, read in one pass over the page.
+        """
+        structured = StructuredData(snapshot)
+        linked = {}
+        for data in structured.json_ld():
+            name = text_value(data.get('name'))
+            if name:
+                linked.setdefault(name, data)
+        profiles = []
+        for link in SELECTORS.find_all(snapshot, 'Listing Name'):
+            name = node_text(link)
+            if name:
+                fields = listing_fields(linked[name]) if name in linked else {}
+                item = structured.item_of(link)
+                if item:
+                    fields.update(listing_fields(item))
+                profiles.append((name, snapshot.link(link), fields))
+        return profiles
+
+    def add_listing_page(self, slug, page, snapshot, profiles):
+        """Add a result page's firms to a category's listing and checkpoint it; returns the next page's URL"""
+        seen = {profile[1] for profile in profiles}
+        new = [profile for profile in self.listing_profiles(snapshot) if profile[1] and profile[1] not in seen]
+        profiles.extend(new)
+        log.info(f"=== {slug} page {page}: found {len(new)} firms ===")
+        next_url = self.page_link(snapshot, page + 1)
+        self.checkpoint.save_page(category_url(slug), page, next_url, profiles)
+        return next_url
+
+    def next_page(self, page):
+        """Click through to result page `page + 1`; returns False on the last page"""
+        nxt = self.driver.find_elements(By.LINK_TEXT, str(page + 1))
+        if not nxt:
+            return False
+        current = self.driver.find_elements(By.XPATH, SELECTORS.ordered('Listing Name')[0])
+        url = self.driver.current_url
+        self.rate.wait(url)
+        start = time.perf_counter()
+        try:
+            nxt[0].click()
+        except:
+            return False
+        # Wait for the old results to be replaced before snapshotting the new page
+        try:
+            if current:
+                WebDriverWait(self.driver, 10).until(EC.staleness_of(current[0]))
+            WebDriverWait(self.driver, 10).until(
+                EC.presence_of_element_located((By.XPATH, SELECTORS.ordered('Listing Name')[0]))
+            )
+        except TimeoutException:
+            log.warning(f"timeout waiting for page {page + 1}")
+            self.rate.record(url, error=True)
+            return True
+        self.rate.record(url, latency=time.perf_counter() - start)
+        if self.meter:
+            self.meter.take(time.perf_counter() - start)
+        return True
+
+    def page_link(self, snapshot, page):
+        """URL behind the numbered pagination link, if the site exposes one"""
+        node = snapshot.first(f"//a[normalize-space()='{page}']")
+        return snapshot.link(node) if node is not None else None
+
+    def walk_categories_http(self, slugs):
+        """Walk several categories' result pages over HTTP, one page of each category per round.
+
+        Returns {slug: [(name, href, fields), ...]} for the categories whose pages
+        could be walked this way. A category whose first page has no
+        listings (e.g. it only renders in the browser) is left out so the
+        caller can walk it in the browser instead.
+        """
+        walks = {}
+        for slug in slugs:
+            resume = self.checkpoint.resume_point(category_url(slug))
+            if resume:
+                page, next_url, saved = resume
+                walks[slug] = {'page': page + 1, 'url': next_url, 'profiles': [listing_entry(p) for p in saved]}
+            else:
+                self.checkpoint.start_state(category_url(slug))
+                walks[slug] = {'page': 1, 'url': category_url(slug), 'profiles': []}
+
+        done, browser_only = {}, []
+
+        def on_result(item, snapshot):
+            slug = item[0]
+            walk = walks[slug]
+            if snapshot is None or (walk['page'] == 1 and not self.listing_profiles(snapshot)):
+                if snapshot is not None and self.cache:
+                    self.cache.discard(item[1])  # e.g. the access form served in place of the listing
+                if walk['profiles']:
+                    log.warning(f"{slug}: page {walk['page']} failed over HTTP; finishing in the browser")
+                browser_only.append(slug)
+                walk['url'] = None
+                return
+            walk['url'] = self.add_listing_page(slug, walk['page'], snapshot, walk['profiles'])
+            walk['page'] += 1
+            if walk['url'] and not is_navigable(walk['url']):
+                log.info(f"{slug}: pagination is script-driven; walking it in the browser")
+                browser_only.append(slug)
+                walk['url'] = None
+
+        fetcher = self.http_fetcher(len(slugs), cache_ttl=LISTING_TTL)
+        while walks:
+            fetcher.run([(slug, walk['url']) for slug, walk in walks.items()], parse_listing_html, on_result)
+            for slug in list(walks):
+                if walks[slug]['url'] is None:
+                    walk = walks.pop(slug)
+                    if slug not in browser_only:
+                        self.checkpoint.finish_listing(category_url(slug), walk['profiles'])
+                        done[slug] = walk['profiles']
+                        log.info(f"{slug}: {len(walk['profiles'])} firms across {walk['page'] - 1} pages")
+        return done
+
+    def walk_category(self, slug):
+        """Walk one category's result pages in the browser and collect its (name, href, fields) entries"""
+        url = category_url(slug)
+        self.ensure_driver()
+        self.checkpoint.start_state(url)
+        resume = self.checkpoint.resume_point(url)
+        if resume:
+            # Jump straight to the first unfinished result page
+            page, next_url, saved = resume
+            page += 1
+            profiles = [listing_entry(profile) for profile in saved]
+            log.info(f"Resuming {slug} at result page {page} with {len(profiles)} profiles collected")
+        else:
+            page, next_url, profiles = 1, url, []
+        self.rate.wait(next_url)
+        start = time.perf_counter()
+        with METRICS.timer('driver_get'):
+            self.driver.get(next_url)
+        if wait_for_any(self.driver, SELECTORS.chains['Listing Name']):
+            self.rate.record(next_url, latency=time.perf_counter() - start)
+        else:
+            log.warning(f"timeout waiting for page {page}")
+            self.rate.record(next_url, error=True)
+        if self.meter:
+            self.meter.take(time.perf_counter() - start)
+        while True:
+            self.handle_cookies()
+            self.remove_overlay()
+            self.add_listing_page(slug, page, PageSnapshot.capture(self.driver), profiles)
+            if not self.next_page(page):
+                break
+            page += 1
+        self.checkpoint.finish_listing(url, profiles)
+        log.info(f"{slug}: {len(profiles)} firms across {page} pages")
+        return profiles
+
+    def collect_frontier(self):
+        """Walk every category once and merge their listings into one frontier keyed by company name"""
+        listings = {}
+        for slug in self.categories:
+            saved = self.checkpoint.saved_listing(category_url(slug))
+            if saved is not None:
+                log.info(f"Using {len(saved)} checkpointed profiles for {slug}; skipping its result pages")
+                listings[slug] = [listing_entry(profile) for profile in saved]
+        pending = [slug for slug in self.categories if slug not in listings]
+        if pending and self.concurrency > 1:
+            listings.update(self.walk_categories_http(pending))
+        for slug in self.categories:
+            if slug not in listings:
+                listings[slug] = self.walk_category(slug)
+
+        self.frontier = {}
+        for slug in self.categories:
+            industry = category_industry(slug)
+            for name, url, fields in listings[slug]:
+                entry = self.frontier.setdefault(name, {'url': url, 'industries': [], 'fields': {}})
+                if industry not in entry['industries']:
+                    entry['industries'].append(industry)
+                for field, value in fields.items():
+                    entry['fields'].setdefault(field, value)
+        shared = sum(1 for entry in self.frontier.values() if len(entry['industries']) > 1)
+        log.info(f"Frontier: {len(self.frontier)} firms across {len(self.categories)} categories "
+                 f"({shared} listed in more than one)")
+        return self.frontier
+
+    def merge_saved_industries(self, name, industries):
+        """Add this run's category tags to a firm saved on an earlier run"""
+        record = self.store.get(name)
+        if record is None:
+            return
+        merged = merge_industries(record.get('Industry'), *industries)
+        if merged != record.get('Industry'):
+            self.store.update(name, {'Industry': merged})
+
+    def scrape_frontier(self, frontier):
+        """Save unsaved firms, visiting only the profiles whose result card lacked a field.
+
+        Saved firms only get their industry tags merged.
+        """
+        todo, from_listing = [], 0
+        for name, entry in frontier.items():
+            if name in self.scraped_companies:
+                self.merge_saved_industries(name, entry['industries'])
+            elif self.checkpoint.profile_done(entry['url']):
+                continue
+            elif not self.visit_profiles and all(entry['fields'].get(field) for field in LISTING_FIELDS):
+                self.save_listing_record(name, entry)
+                from_listing += 1
+            else:
+                todo.append((name, entry['url']))
+        METRICS.count('profiles_skipped', from_listing)
+        if from_listing or todo:
+            log.info(f"{from_listing} firms saved from their result cards; {len(todo)} profiles to visit")
+        if self.concurrency > 1 and todo:
+            todo = self.fetch_profiles_concurrently(todo)
+            METRICS.count('browser_fallbacks', len(todo))
+        for name, url in todo:
+            self.scrape_profile(name, url)
+
+    def retry_failed_profiles(self):
+        """Give failed profiles (this run's and earlier runs') their scheduled retries, waiting up to retry_wait"""
+        def retry(letters):
+            todo = []
+            for letter in letters:
+                name = (letter.payload or {}).get('name')
+                if not name or name in self.scraped_companies:
+                    self.dead_letters.resolve_many([letter.key])  # Saved since it failed
+                    continue
+                self.frontier.setdefault(name, {'url': letter.key, 'industries': letter.payload.get('industries', []),
+                                                'fields': letter.payload.get('fields', {})})
+                todo.append((name, letter.key))
+            if self.concurrency > 1 and todo:
+                todo = self.fetch_profiles_concurrently(todo)
+            for name, url in todo:
+                self.scrape_profile(name, url)
+            self.save_progress(force=True)
+
+        return RetryScheduler(self.dead_letters, retry, kind='profile', max_wait=self.retry_wait).run()
+
+    def category_listing(self, slug):
+        """One category's (name, href, fields) entries, from the checkpoint or by walking its result pages"""
+        saved = self.checkpoint.saved_listing(category_url(slug))
+        if saved is not None:
+            return [listing_entry(profile) for profile in saved]
+        walked = self.walk_categories_http([slug]) if self.concurrency > 1 else {}
+        return walked[slug] if slug in walked else self.walk_category(slug)
+
+    def handle_queue_task(self, task):
+        """Process one work-queue task and return the tasks it spawns.
+
+        'category' walks a category's result pages and queues its firms in
+        chunks; 'firms' saves a chunk, visiting the profiles its cards
+        don't cover. A firm another worker already saved from a different
+        category only gets this category's industry tag merged in.
+        """
+        if task.kind == 'category':
+            slug = task.payload['slug']
+            listing = self.category_listing(slug)
+            self.checkpoint.mark_state_done(category_url(slug))
+            return [('firms', f"{slug}:{idx}", {'slug': slug, 'firms': listing[idx:idx + self.firm_chunk_size]}, 1)
+                    for idx in range(0, len(listing), self.firm_chunk_size)]
+        industry = category_industry(task.payload['slug'])
+        self.frontier = {}
+        for name, url, fields in map(listing_entry, task.payload['firms']):
+            self.frontier[name] = {'url': url, 'industries': [industry], 'fields': fields}
+            if name not in self.scraped_companies and self.store.get(name) is not None:
+                self.scraped_companies.add(name)
+        self.scrape_frontier(self.frontier)
+        # The task only completes once its records are durable
+        self.save_progress(force=True)
+        # Two workers may have saved the same firm at once; the store kept one, so merge this tag into it
+        for name in self.frontier:
+            self.merge_saved_industries(name, [industry])
+        return []
+
+    def run_queue(self, queue):
+        """Pull category and firm tasks from a shared WorkQueue until every worker's share is done.
+
+        Any number of processes (on this machine or others sharing the
+        queue's database) can run this at once; each seeds the queue with
+        its categories, which are only queued once. A crawl that finishes
+        without failed tasks empties the queue, so the next run on the file
+        starts over.
+        """
+        if self.concurrency > 1 and self.resume_session_over_http():
+            log.info('Reusing saved Axial session over HTTP; the browser starts only if a page needs it')
+        else:
+            self.ensure_driver()
+        try:
+            queue.put_many([('category', slug, {'slug': slug}) for slug in self.categories])
+            run_worker(queue, self.handle_queue_task, self.worker)
+            self.retry_failed_profiles()
+            for kind, key, error in queue.failed_tasks():
+                log.warning(f"Gave up on task: {kind} {key} ({error})")
+        finally:
+            self.save_progress(force=True)
+            if queue.drained():
+                self.export_excel()
+                # The queue remembers what is done; this worker's own progress files aren't needed again
+                self.checkpoint.clear()
+                self.checkpoint.close()
+                self.scraped_companies.clear()
+                shutil.rmtree(self.progress_dir, ignore_errors=True)
+                if not queue.failed_tasks():
+                    # Failed tasks stay queued for --requeue-failed; a clean crawl leaves nothing to redo
+                    queue.clear()
+            SELECTORS.save(self.selector_stats_path)
+            log.info(SELECTORS.report())
+            log.info(self.rate.report())
+            log.info(self.dead_letters.breaker.report())
+            log.info(self.dead_letters.report())
+            if self.driver:
+                self.driver.quit()
+
+    def run(self):
+        """Crawl every category; whatever happens, records scraped so far are saved and the browser is closed"""
+        try:
+            if self.concurrency > 1 and self.resume_session_over_http():
+                log.info('Reusing saved Axial session over HTTP; the browser starts only if a page needs it')
+            else:
+                self.ensure_driver()
+
+            frontier = self.collect_frontier()
+            self.scrape_frontier(frontier)
+            self.retry_failed_profiles()
+
+            self.save_progress(force=True)
+            # Finished cleanly: the next run starts from the first result page
+            self.checkpoint.clear()
+            self.export_excel()
+            log.info("Done!")
+        finally:
+            self.save_progress(force=True)
+            SELECTORS.save(self.selector_stats_path)
+            log.info(SELECTORS.report())
+            if self.cache:
+                log.info(self.cache.report())
+            log.info(self.rate.report())
+            if self.meter:
+                log.info(self.meter.report())
+            log.info(self.dead_letters.breaker.report())
+            log.info(self.dead_letters.report())
+            if self.driver:
+                self.driver.quit()
+
+
+def main(categories=None, output_name=None):
+    parser = argparse.ArgumentParser(description='Scrape Axial directory categories into one record store')
+    parser.add_argument('categories', nargs='*', default=categories or list(CATEGORIES),
+                        help=f"category slugs under {BASE_URL} (default: {' '.join(categories or CATEGORIES)})")
+    parser.add_argument('--output', default=output_name,
+                        help='output file name without extension (default: derived from the categories)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='pages fetched over HTTP at once; 1 = browser only')
+    parser.add_argument('--access-details', metavar='JSON',
+                        help='JSON file of directory-access form values (default: ACCESS_DETAILS)')
+    parser.add_argument('--manual-login', action='store_true',
+                        help='wait for the access form to be filled in by hand instead of submitting it')
+    parser.add_argument('--headless', action='store_true', help='run the browser without a window')
+    parser.add_argument('--no-cache', action='store_true', help='bypass the on-disk HTTP response cache')
+    parser.add_argument('--block', default='default',
+                        help="resource groups the browser won't load: comma-separated from analytics, ads, fonts, "
+                             "embeds, maps, css, or 'default' (the first four) or 'none'")
+    parser.add_argument('--page-load', choices=('eager', 'normal'), default='eager',
+                        help='eager: stop at DOMContentLoaded and wait only for the extracted elements')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='never attach to the browser daemon; launch a fresh Chrome')
+    parser.add_argument('--visit-profiles', action='store_true',
+                        help="visit every profile, even for firms whose result card carried all the fields")
+    parser.add_argument('--retry-wait', type=float, default=120,
+                        help='seconds to wait for scheduled retries of failed profiles before leaving them to the '
+                             'next run (default: 120)')
+    parser.add_argument('--retry-exhausted', action='store_true',
+                        help='give profiles that used up their retries a fresh set before crawling')
+    parser.add_argument('--queue', metavar='DB',
+                        help='pull categories and firm chunks from a shared work queue (SQLite file); start as many '
+                             'processes as you like on the same file')
+    parser.add_argument('--new-crawl', action='store_true',
+                        help='with --queue, drop whatever the queue holds and start a new crawl')
+    parser.add_argument('--requeue-failed', action='store_true',
+                        help='with --queue, give tasks that used up their attempts a fresh set')
+    parser.add_argument('--export', action='store_true',
+                        help='only rewrite the .xlsx from the record store')
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='time each crawl stage and write <output>.prom and a JSON summary to DIR')
+    parser.add_argument('--log-json', action='store_true', help='log one JSON object per line')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG shows every profile (default: INFO)')
+    args = parser.parse_args()
+
+    setup_logging(json_lines=args.log_json, level=args.log_level)
+    try:
+        blocked = parse_block_list(args.block)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.metrics:
+        METRICS.enable(scraper='axial')
+
+    access_details = None
+    if args.access_details:
+        with open(args.access_details, encoding='utf-8') as f:
+            access_details = json.load(f)
+    scraper = AxialScraper(args.categories, args.output, debug=not args.headless, concurrency=args.concurrency,
+                           access_details=access_details, manual_login=args.manual_login,
+                           use_cache=not args.no_cache, blocked=blocked, page_load=args.page_load,
+                           use_daemon=not args.no_daemon, visit_profiles=args.visit_profiles,
+                           worker=worker_name() if args.queue else None, retry_wait=args.retry_wait)
+    if args.retry_exhausted:
+        log.info(f"Gave {scraper.dead_letters.requeue_exhausted()} exhausted profiles a fresh set of retries")
+    try:
+        if args.export:
+            scraper.export_excel()
+        elif args.queue:
+            queue = WorkQueue(args.queue)
+            if args.new_crawl:
+                queue.clear()
+                log.info(f"Cleared {args.queue} for a new crawl")
+            if args.requeue_failed:
+                log.info(f"Requeued {queue.requeue_failed()} failed tasks")
+            scraper.run_queue(queue)
+        else:
+            scraper.run()
+    finally:
+        if args.metrics:
+            if scraper.cache:
+                scraper.cache.count_metrics()
+            name = os.path.splitext(os.path.basename(scraper.excel_path))[0]
+            prom_path, summary_path = METRICS.write(args.metrics, name)
+            log.info(f"Wrote metrics to {prom_path} and {summary_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Measure AsyncFetcher throughput against the local fixture server.
+
+    python bench/async_fetch.py [pages] [latency_seconds]
+
+The stand-in server sleeps `latency` seconds per request to model network idle time.
+"""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'businessbroker'))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import serve
+from common.fetcher import AsyncFetcher
+from businessbroker import parse_broker_html
+
+LEVELS = (1, 4, 16, 64)
+
+
+def main(pages=256, latency=0.1):
+    server, base_url = serve(latency=latency)
+    # Distinct query strings so every request is a separate page
+    urls = [f"{base_url}/businessbroker/profile.html?id={i}" for i in range(pages)]
+    records = []
+    try:
+        for level in LEVELS:
+            records.clear()
+            fetcher = AsyncFetcher(concurrency=level, per_host=level)
+            failures = fetcher.run(urls, lambda page_html, url: parse_broker_html(page_html, url),
+                                   lambda url, record: records.append(record))
+            print(f"concurrency={level:>3}  {fetcher.pages_per_second():8.1f} pages/sec  "
+                  f"({len(records) - len(failures)} ok, {len(failures)} failed, {fetcher.elapsed:.2f}s)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 256, float(args[1]) if len(args) > 1 else 0.1)
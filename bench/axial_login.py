@@ -0,0 +1,106 @@
+"""Exercise the unattended Axial login against a local stand-in for the directory-access form.
+
+    python bench/axial_login.py
+
+The stand-in serves fixtures/axial/access_form.html in place of any
+directory page until the form is posted with every field filled in, then
+sets an access cookie and redirects back, like the real site. The field
+matching is checked offline first. The browser half (submit the form,
+persist the session, then crawl over HTTP with the saved cookies and no
+browser) runs when Chrome is available.
+"""
+import os
+import sys
+import tempfile
+from urllib.parse import parse_qs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import serve, FixtureHandler, FIXTURES_DIR
+from common.snapshot import PageSnapshot
+from common.forms import CONTROLS_XPATH, match_fields
+from common.http import make_session, fetch_html
+import axial.engine as engine
+
+ACCESS_COOKIE = 'axial_access=granted'
+FORM_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'company', 'company_type', 'visit_reason')
+
+
+class AxialStandIn(FixtureHandler):
+    """Directory pages only render with the access cookie; POST /access grants it"""
+
+    def do_GET(self):
+        if self.path.startswith('/forum/companies/'):
+            if ACCESS_COOKIE not in self.headers.get('Cookie', ''):
+                self.path = '/axial/access_form.html'
+            elif '/profile/' in self.path:
+                self.path = '/axial/profile.html'
+            else:
+                self.path = '/axial/listing.html'
+        super().do_GET()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        missing = [name for name in FORM_FIELDS if not form.get(name, [''])[0].strip()]
+        if missing:
+            self.send_error(400, f"Missing {', '.join(missing)}")
+            return
+        self.send_response(303)
+        self.send_header('Set-Cookie', f"{ACCESS_COOKIE}; Max-Age=3600; Path=/")
+        self.send_header('Location', form.get('next', ['/'])[0])
+        self.end_headers()
+
+
+def check_field_matching():
+    with open(os.path.join(FIXTURES_DIR, 'axial', 'access_form.html'), encoding='utf-8') as f:
+        snapshot = PageSnapshot(f.read())
+    form = snapshot.first(engine.ACCESS_FORM_XPATH)
+    controls = snapshot.find_all(CONTROLS_XPATH, form)
+    matches = match_fields(snapshot, controls, engine.ACCESS_DETAILS)
+    for field in engine.ACCESS_DETAILS:
+        target = controls[matches[field]].get('name') if field in matches else 'NOT FOUND'
+        print(f"  {field:<14} -> {target}")
+    assert len(matches) == len(engine.ACCESS_DETAILS), 'some access details have no form field'
+
+
+def check_browser_flow(base_url):
+    engine.BASE_URL = f"{base_url}/forum/companies/"
+    os.chdir(tempfile.mkdtemp())
+
+    first = engine.AxialScraper(['business-brokers'], debug=False)
+    try:
+        first.ensure_driver()
+    except Exception as e:
+        print(f"Skipping the browser half (no usable Chrome here): {e.__class__.__name__}")
+        return
+    first.driver.quit()
+    assert os.path.exists(first.saved_session.path), 'session was not persisted'
+    print(f"Logged in by form and saved {len(first.cookies)} cookies")
+
+    second = engine.AxialScraper(['business-brokers'], debug=False)
+    assert second.resume_session_over_http(), 'saved session was not accepted over HTTP'
+    second.scrape_frontier(second.collect_frontier())
+    second.save_progress(force=True)
+    assert second.driver is None, 'second run should not have needed a browser'
+    print(f"Second run: {second.store.count()} firms over HTTP with the saved session, no browser")
+
+
+def main():
+    print('Access form field matching:')
+    check_field_matching()
+
+    server, base_url = serve(handler_class=AxialStandIn)
+    try:
+        session = make_session()
+        page_html = fetch_html(session, f"{base_url}/forum/companies/business-brokers/")
+        assert 'directory' in page_html and 'itemprop' not in page_html, 'stand-in should gate the listing'
+        check_browser_flow(base_url)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Recovery check for the dead-letter store, retry scheduler and circuit breaker.
+
+    python bench/dead_letters.py [--items N] [--base-delay S] [--wait S]
+
+Simulates a profile crawl over three domains. On flaky.example every
+profile fails its first one or two visits (as a timing-out profile
+does), on steady.example every 20th fails once, and down.example fails
+everything. Failures are dead-lettered, then a RetryScheduler retries
+them with the store's backoff. The flaky and steady profiles must all be
+recovered within --wait seconds; down.example must trip its circuit, so
+it gets only a few attempts rather than one per profile, and its
+profiles must be left waiting, listed in the report. A second store
+opened on the same file (the next run) must see the same failures.
+Exits 1 on any mismatch.
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from common.dead_letter import DeadLetterStore, CircuitBreaker, RetryScheduler, WAITING, domain_of
+
+DOMAINS = ('flaky.example', 'steady.example', 'down.example')
+
+
+def failures_before_success(url, idx):
+    """How many visits a profile fails before it loads (None = never)"""
+    domain = domain_of(url)
+    if domain == 'down.example':
+        return None
+    if domain == 'flaky.example':
+        return 1 + idx % 2
+    return 1 if idx % 20 == 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dead-letter retries against simulated failures')
+    parser.add_argument('--items', type=int, default=300, help='profiles per domain')
+    parser.add_argument('--base-delay', type=float, default=0.2, help='seconds before the first retry')
+    parser.add_argument('--wait', type=float, default=10, help='seconds the scheduler may wait for retries')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='dead-letter-bench-')
+    db_path = os.path.join(workdir, 'dead_letters.db')
+    breaker = CircuitBreaker(threshold=5, cooldown=args.base_delay * 4)
+    store = DeadLetterStore(db_path, base_delay=args.base_delay, max_attempts=8, breaker=breaker)
+    visits = {}
+    saved = set()
+    profiles = {f"https://{domain}/profile/{idx}": idx for domain in DOMAINS for idx in range(args.items)}
+
+    def visit(url):
+        visits[url] = visits.get(url, 0) + 1
+        needed = failures_before_success(url, profiles[url])
+        if needed is None or visits[url] <= needed:
+            store.record(url, 'ProfileTimeout', 'profile form never rendered', kind='profile', payload={'idx': 1})
+            return
+        saved.add(url)
+
+    def retry(letters):
+        for letter in letters:
+            visit(letter.key)
+        store.resolve_many([letter.key for letter in letters if letter.key in saved])
+
+    failures = []
+    try:
+        start = time.perf_counter()
+        for url in profiles:
+            visit(url)
+        store.resolve_many(list(saved))
+        first_pass = len(store.remaining())
+        retried = RetryScheduler(store, retry, kind='profile', max_wait=args.wait).run()
+        seconds = time.perf_counter() - start
+        remaining = store.remaining()
+        down_visits = sum(count for url, count in visits.items() if domain_of(url) == 'down.example')
+        print(f"{len(profiles)} profiles, {first_pass} failed the first pass, {retried} retries in {seconds:.2f}s; "
+              f"{len(saved)} saved, {len(remaining)} still failing")
+        print(f"down.example: {down_visits} visits for {args.items} profiles")
+        print(breaker.report())
+        print(store.report(limit=3))
+
+        for url, idx in profiles.items():
+            if failures_before_success(url, idx) is not None and url not in saved:
+                failures.append(f"{url} was never recovered ({visits[url]} visits)")
+        leftover = {row[0] for row in remaining}
+        if leftover != {url for url in profiles if domain_of(url) == 'down.example'}:
+            failures.append(f"expected exactly the down.example profiles to remain, got {len(leftover)}")
+        if any(row[5] != WAITING for row in remaining):
+            failures.append('a down.example profile used up its retries despite the open circuit')
+        if down_visits > args.items + 5 * (args.wait / (args.base_delay * 4) + 1):
+            failures.append(f"down.example was visited {down_visits} times; its circuit didn't hold retries back")
+        if 'down.example' not in breaker.report():
+            failures.append("down.example's circuit isn't open")
+
+        store.close()
+        next_run = DeadLetterStore(db_path)
+        if len(next_run.remaining()) != len(remaining):
+            failures.append(f"the next run sees {len(next_run.remaining())} failures, expected {len(remaining)}")
+        next_run.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures[:20]:
+        print(f"FAIL: {failure}")
+    if len(failures) > 20:
+        print(f"... and {len(failures) - 20} more")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Compare scraper startup cost of the on-disk DedupIndex with loading every key into a set.
+
+    python bench/dedup_startup.py [max_keys]
+
+For each size a RecordStore is filled with that many broker records, then
+three startups are timed: the old approach (a set of every Profile URL and
+Website pulled from the store), the one-off DedupIndex build on first run,
+and a warm DedupIndex open as on every later run. Peak Python memory of the
+set load and the warm open, and the cost of a membership check, are printed
+too. Then a run appends 10% more records, committing the index after each
+batch as the scrapers do, and the next open is timed; it must not re-scan
+those rows, so it should cost about the same as the warm open. An open after
+the same appends without commits (a crash) shows the catch-up scan it saves. pd.read_excel of the same rows is timed at the smallest size only, since
+writing large workbooks just to read them back takes minutes.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from common.store import RecordStore
+from common.dedup import DedupIndex
+
+COLUMNS = ['Broker Number', 'Broker Name', 'Company Name', 'Website', 'Profile URL']
+KEY_COLUMNS = ['Profile URL', 'Website']
+
+
+def profile_url(i):
+    return f"https://www.businessbroker.net/broker/{i}.aspx"
+
+
+def fill_store(store, count, batch=10_000, first=0, index=None):
+    for start in range(first, first + count, batch):
+        store.append_many([{
+            'Broker Number': f"Broker #{i}",
+            'Broker Name': f"Broker {i}",
+            'Company Name': f"Company {i % 997}",
+            'Website': f"https://www.company{i % 997}.example/",
+            'Profile URL': profile_url(i),
+        } for i in range(start, min(start + batch, first + count))])
+        if index is not None:
+            index.commit()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def peak_mb(fn):
+    """Peak MB of Python allocations during a second, separately traced call (tracing skews timings)"""
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    if hasattr(result, 'close'):
+        result.close()
+    return peak
+
+
+def lookup_cost(container, count, probes=20_000):
+    """Mean microseconds per membership check, half hits and half misses"""
+    keys = [profile_url(random.randrange(count)) for _ in range(probes // 2)]
+    keys += [profile_url(count + i) for i in range(probes // 2)]
+    start = time.perf_counter()
+    found = sum(1 for key in keys if key in container)
+    elapsed = time.perf_counter() - start
+    assert found == probes // 2, f"expected {probes // 2} hits, got {found}"
+    return elapsed / probes * 1e6
+
+
+def bench_size(tmp, count):
+    db_path = os.path.join(tmp, f"bench_{count}.db")
+    idx_path = os.path.join(tmp, f"bench_{count}.idx")
+    store = RecordStore(db_path, COLUMNS, key_column='Profile URL')
+    fill_store(store, count)
+
+    load_set = lambda: store.keys() | store.column_values('Website')
+    open_index = lambda: DedupIndex(idx_path, store, KEY_COLUMNS)
+
+    secs, keys = timed(load_set)
+    print(f"{count:>9} keys  set from store   : {secs * 1000:9.1f} ms  {peak_mb(load_set):8.1f} MB  "
+          f"lookup {lookup_cost(keys, count):.2f} us")
+    del keys
+
+    secs, index = timed(open_index)
+    print(f"{count:>9} keys  index first build: {secs * 1000:9.1f} ms")
+    index.close()
+
+    secs, index = timed(open_index)
+    print(f"{count:>9} keys  index warm open  : {secs * 1000:9.1f} ms  {peak_mb(open_index):8.1f} MB  "
+          f"lookup {lookup_cost(index, count):.2f} us")
+
+    appended = count // 10
+    fill_store(store, appended, batch=100, first=count, index=index)
+    index.close()
+    secs, index = timed(open_index)
+    print(f"{count:>9} keys  reopen, committed: {secs * 1000:9.1f} ms  (+{appended} committed in batches of 100)")
+    assert index.synced_rowid == store.max_rowid(), 'committed rows left for catch-up'
+    assert profile_url(count + appended - 1) in index, 'appended key missing after reopen'
+    index.close()
+
+    fill_store(store, appended, first=count + appended)
+    secs, index = timed(open_index)
+    print(f"{count:>9} keys  reopen, crashed  : {secs * 1000:9.1f} ms  (+{appended} never committed)")
+    assert profile_url(count + 2 * appended - 1) in index, 'uncommitted key missing after catch-up'
+    index.close()
+    store.close()
+    return db_path
+
+
+def bench_excel(tmp, db_path, count):
+    try:
+        import pandas as pd
+    except ImportError:
+        return
+    store = RecordStore(db_path, COLUMNS, key_column='Profile URL')
+    xlsx_path = os.path.join(tmp, 'legacy.xlsx')
+    store.export_xlsx(xlsx_path)
+    store.close()
+
+    def legacy_startup():
+        df = pd.read_excel(xlsx_path)
+        return set(df['Profile URL'].dropna()) | set(df['Website'].dropna())
+
+    secs, _ = timed(legacy_startup)
+    print(f"{count:>9} keys  pd.read_excel    : {secs * 1000:9.1f} ms")
+
+
+def main(max_keys=1_000_000):
+    tmp = tempfile.mkdtemp()
+    sizes = [n for n in (10_000, 100_000, 1_000_000) if n <= max_keys]
+    for count in sizes:
+        db_path = bench_size(tmp, count)
+        if count == sizes[0]:
+            bench_excel(tmp, db_path, count)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,68 @@
+"""Time from nothing to a usable WebDriver: cold Chrome launch vs attaching to the browser daemon.
+
+    python -m common.browser_daemon start --detach    # once, for the attach numbers
+    python bench/driver_start.py [runs]
+
+cold-install   ChromeDriverManager().install() + launch (what every run used to do)
+cold-cached    cached chromedriver path + launch with a fresh profile
+attach         lease a warm daemon instance + attach over remote debugging
+
+Each run also loads about:blank so the session has done real work.
+Needs Chrome; the cold-install row also needs the network.
+"""
+import os
+import sys
+import time
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+from common.browser import BrowserLease, start_chrome, chromedriver_path
+
+
+def options():
+    chrome_opts = Options()
+    chrome_opts.add_argument('--headless')
+    chrome_opts.add_argument('--no-sandbox')
+    chrome_opts.add_argument('--disable-dev-shm-usage')
+    return chrome_opts
+
+
+def cold_install():
+    from webdriver_manager.chrome import ChromeDriverManager
+    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options())
+
+
+def cold_cached():
+    return start_chrome(options(), use_daemon=False)
+
+
+def attach():
+    return start_chrome(options(), use_daemon=True)
+
+
+def main(runs=5):
+    chromedriver_path()  # Populate the cache outside the timings
+    lease = BrowserLease.acquire()
+    if lease:
+        lease.release()
+    else:
+        print('No free browser daemon instance: the attach row will launch Chrome instead')
+    for name, start in (('cold-install', cold_install), ('cold-cached', cold_cached), ('attach', attach)):
+        times = []
+        for _ in range(runs):
+            begin = time.perf_counter()
+            driver = start()
+            driver.get('about:blank')
+            times.append(time.perf_counter() - begin)
+            driver.quit()
+        print(f"{name:<14} p50 {statistics.median(times) * 1000:7.0f} ms  max {max(times) * 1000:7.0f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,258 @@
+"""Throughput and extraction check for the website enrichment stage, against thousands of local stand-in sites.
+
+    python bench/enrich_sites.py [--sites N] [--latency S] [--concurrency N] [--timeout S]
+
+One server on 127.0.0.1 stands in for every broker website: requests
+are routed by their Host header (broker-N.example), and a CachingResolver
+pins those names to 127.0.0.1. Sites come in three styles, so each
+extractor has to pull its weight:
+
+    plain       home page links to /contact-us/, which lists the email,
+                phone and street address as text
+    links       mailto: and tel: links on the home page, the address as
+                schema.org PostalAddress microdata on /about/
+    scripted    a Cloudflare-obfuscated email on /contact/, phone and
+                address only in a JSON-LD LocalBusiness block
+
+Every 50th site is down (its name resolves to 127.0.0.2, where nothing
+listens), every 50th doesn't resolve at all, and every 100th answers
+slower than --timeout. Every 10th record shares the website of the one
+before it, as brokers of one firm do. Records are written to a fresh
+RecordStore, enriched, and read back: each reachable site's records must
+carry its email, phone and address, and each dead one 'Unreachable',
+including a row imported without a key. Re-saving an unchanged record
+the way a refresh crawl does must keep its enrichment columns.
+Prints the wall time, pages/sec and DNS lookups. Exits 1 on any mismatch.
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from common.enrich import WebsiteEnricher
+from common.fetcher import CachingResolver
+from common.store import RecordStore
+
+STYLES = ('plain', 'links', 'scripted')
+CITIES = [('Austin', 'TX'), ('Denver', 'CO'), ('Tampa', 'FL'), ('Columbus', 'OH'), ('Portland', 'OR')]
+FILLER = '<p>We help owners sell their businesses and buyers find the right one. ' * 20 + '</p>'
+
+
+def site_kind(idx):
+    if idx % 50 == 7:
+        return 'down'
+    if idx % 50 == 17:
+        return 'unresolvable'
+    if idx % 100 == 23:
+        return 'slow'
+    return STYLES[idx % len(STYLES)]
+
+
+def contact(idx):
+    """The email, phone and address site idx lists, as the enricher should report them"""
+    city, state = CITIES[idx % len(CITIES)]
+    return {
+        'email': f"info{idx}@broker-{idx}.example",
+        'phone': f"(512) {200 + idx // 10000:03d}-{idx % 10000:04d}",
+        'street': f"{100 + idx % 900} Main Street",
+        'city': city, 'state': state, 'zip': f"{10000 + idx:05d}"[-5:],
+    }
+
+
+def cfemail(email, key=0x5a):
+    return f"{key:02x}" + ''.join(f"{ord(char) ^ key:02x}" for char in email)
+
+
+def page(title, body):
+    return (f"<html><head><title>{title}</title><style>.x{{color:red}}</style></head><body>"
+            f"<nav><a href='/'>Home</a> <a href='/services/'>Services</a></nav>{body}{FILLER}"
+            f"<script>var tracking = 'noreply@tracker.example.com 555-555-5555';</script></body></html>")
+
+
+def render(idx, path):
+    """(status, html) of one page of stand-in site idx"""
+    info = contact(idx)
+    style = site_kind(idx)
+    address = f"{info['street']}, {info['city']}, {info['state']} {info['zip']}"
+    if style in ('plain', 'slow'):
+        if path == '/':
+            return 200, page('Home', "<h1>Broker</h1><a href='/contact-us/'>Contact Us</a>")
+        if path == '/contact-us/':
+            return 200, page('Contact', f"<p>Email {info['email']} or call {info['phone']}.</p><p>{address}</p>")
+    elif style == 'links':
+        if path == '/':
+            return 200, page('Home', f"<a href='mailto:{info['email']}?subject=Hello'>Email us</a> "
+                                     f"<a href='tel:+1{info['phone']}'>Call</a> <a href='/about/'>About</a>")
+        if path == '/about/':
+            return 200, page('About', (
+                "<div itemscope itemtype='https://schema.org/Organization'><span itemprop='name'>Broker</span>"
+                "<div itemprop='address' itemscope itemtype='https://schema.org/PostalAddress'>"
+                f"<span itemprop='streetAddress'>{info['street']}</span> "
+                f"<span itemprop='addressLocality'>{info['city']}</span> "
+                f"<span itemprop='addressRegion'>{info['state']}</span> "
+                f"<span itemprop='postalCode'>{info['zip']}</span></div></div>"))
+    elif style == 'scripted':
+        if path == '/':
+            return 200, page('Home', "<a href='/contact/'>Get in touch</a> <a href='/team/'>Our team</a>")
+        if path == '/contact/':
+            return 200, page('Contact', (
+                f"<a href='/cdn-cgi/l/email-protection' data-cfemail='{cfemail(info['email'])}'>"
+                "[email&#160;protected]</a>"
+                "<script type='application/ld+json'>{\"@context\": \"https://schema.org\", "
+                f"\"@type\": \"LocalBusiness\", \"telephone\": \"+1-{info['phone'][1:4]}-{info['phone'][6:]}\", "
+                f"\"address\": {{\"@type\": \"PostalAddress\", \"streetAddress\": \"{info['street']}\", "
+                f"\"addressLocality\": \"{info['city']}\", \"addressRegion\": \"{info['state']}\", "
+                f"\"postalCode\": \"{info['zip']}\"}}}}</script>"))
+        if path == '/team/':
+            return 200, page('Team', '<p>Our brokers.</p>')
+    return 404, page('Not found', '')
+
+
+class StandInSites:
+    def __init__(self, latency, slow):
+        self.latency = latency
+        self.slow = slow
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    sites = None
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def do_GET(self):
+        host = (self.headers.get('Host') or '').split(':')[0]
+        idx = int(host.split('.')[0].removeprefix('broker-')) if host.startswith('broker-') else -1
+        with self.sites.lock:
+            self.sites.requests += 1
+        time.sleep(self.sites.slow if site_kind(idx) == 'slow' else self.sites.latency)
+        status, page_html = render(idx, urlsplit(self.path).path) if idx >= 0 else (404, '')
+        body = page_html.encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # The enricher gave up on a slow site
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # listen() backlog; the default 5 drops connects once a hundred arrive at once
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Website enrichment against local stand-in sites')
+    parser.add_argument('--sites', type=int, default=2000, help='distinct stand-in websites')
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds each site sleeps per request')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight across all sites')
+    parser.add_argument('--timeout', type=float, default=2.0, help='seconds per request before giving up')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    sites = StandInSites(args.latency, slow=args.timeout * 2)
+    server = StandInServer(('127.0.0.1', 0), type('Handler', (StandInHandler,), {'sites': sites}))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    hosts = {}
+    for idx in range(args.sites):
+        if site_kind(idx) != 'unresolvable':
+            hosts[f"broker-{idx}.example"] = '127.0.0.2' if site_kind(idx) == 'down' else '127.0.0.1'
+    workdir = tempfile.mkdtemp(prefix='enrich-bench-')
+    store = RecordStore(os.path.join(workdir, 'brokers.db'), ['Broker Name', 'Website'], key_column='Broker Name')
+    failures = []
+    try:
+        idx = 0
+        records = []
+        for record_idx in range(args.sites + args.sites // 9):
+            # Every tenth broker works for the firm before it
+            website = f"broker-{idx}.example:{port}" if record_idx % 10 == 9 else f"http://broker-{idx}.example:{port}/"
+            records.append({'Broker Name': f"Broker {record_idx}", 'Website': website, 'site': idx})
+            if record_idx % 10 != 8:
+                idx += 1
+            if idx >= args.sites:
+                break
+        for record in records:
+            store.append({'Broker Name': record['Broker Name'], 'Website': record['Website']})
+        records.append({'Broker Name': 'No website', 'Website': 'Not found', 'site': None})
+        store.append({'Broker Name': 'No website', 'Website': 'Not found'})
+        # A row imported from an earlier workbook: no key column, only a website
+        store.append({'Website': f"http://broker-0.example:{port}/"})
+
+        enricher = WebsiteEnricher(store, concurrency=args.concurrency, timeout=args.timeout,
+                                   connect_timeout=args.timeout, resolver=CachingResolver(hosts=hosts))
+        start = time.perf_counter()
+        enriched = enricher.run()
+        seconds = time.perf_counter() - start
+        print(f"{enricher.stats['sites']} sites, {enriched} records enriched in {seconds:.2f}s  "
+              f"({sites.requests} requests served)")
+        print(enricher.report())
+
+        for record in records:
+            saved = store.get(record['Broker Name'])
+            if record['site'] is None:
+                if 'Website Checked' in saved:
+                    failures.append(f"{record['Broker Name']} has no website but was checked")
+                continue
+            kind = site_kind(record['site'])
+            info = contact(record['site'])
+            if kind in ('down', 'unresolvable', 'slow'):
+                expected = {'Website Checked': 'Unreachable'} if kind != 'slow' else {}
+            else:
+                expected = {'Website Emails': info['email'], 'Website Phones': info['phone'],
+                            'Website Address': f"{info['street']}, {info['city']}, {info['state']} {info['zip']}"}
+            # A slow site times out on its home page or its contact page; either way nothing else is on it
+            if kind == 'slow' and saved.get('Website Checked') not in ('Unreachable', time.strftime('%Y-%m-%d')):
+                failures.append(f"{record['Broker Name']} ({kind}) wasn't checked")
+            wrong = {field: saved.get(field) for field, value in expected.items() if saved.get(field) != value}
+            if wrong:
+                failures.append(f"{record['Broker Name']} ({kind}): expected {expected}, got {wrong}")
+
+        imported = next(record for _, record in store.iter_rows() if 'Broker Name' not in record)
+        if imported.get('Website Emails') != contact(0)['email']:
+            failures.append(f"the row imported without a key wasn't enriched: {imported}")
+        # A refresh crawl re-saving an unchanged broker neither counts it as changed nor drops its enrichment
+        name = records[0]['Broker Name']
+        if store.append_many([{'Broker Name': name, 'Website': records[0]['Website']}], replace=True):
+            failures.append('an unchanged broker was counted as changed by a refresh')
+        if 'Website Emails' not in store.get(name):
+            failures.append('a refresh dropped the enrichment columns')
+
+        rerun = WebsiteEnricher(store, resolver=CachingResolver(hosts=hosts))
+        if rerun.collect_sites():
+            failures.append(f"a rerun would fetch {len(rerun.sites)} sites that were already checked")
+    finally:
+        store.close()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures[:20]:
+        print(f"FAIL: {failure}")
+    if len(failures) > 20:
+        print(f"... and {len(failures) - 20} more")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
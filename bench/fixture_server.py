@@ -0,0 +1,40 @@
+import os
+import time
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Static file handler with optional artificial latency and quiet logging"""
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory=FIXTURES_DIR, port=0, latency=0.0, handler_class=FixtureHandler):
+    """Serve a fixture directory on localhost in a background thread; returns (server, base_url)"""
+    handler = partial(type('Handler', (handler_class,), {'latency': latency}), directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    server, base_url = serve(port=8765)
+    print(f"Serving {FIXTURES_DIR} at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
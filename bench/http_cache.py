@@ -0,0 +1,83 @@
+"""Measure what a re-crawl transfers with the on-disk ResponseCache in front of the async fetcher.
+
+    python bench/http_cache.py [profiles] [changed]
+
+Serves `profiles` copies of the BusinessBroker profile fixture and crawls
+them four times: cold, again within the TTL, again after the TTL has
+lapsed with nothing changed (every page revalidates with a 304), and once
+more after `changed` profiles were edited. Each run prints the cache
+report and the bytes actually received.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'businessbroker'))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import serve, FixtureHandler, FIXTURES_DIR
+from common.cache import ResponseCache
+from common.fetcher import AsyncFetcher
+from businessbroker import parse_broker_html
+
+
+SENT = {'bytes': 0}
+
+
+class CountingHandler(FixtureHandler):
+    """Fixture handler that tallies the response body bytes it sends"""
+
+    def copyfile(self, source, outputfile):
+        data = source.read()
+        SENT['bytes'] += len(data)
+        outputfile.write(data)
+
+
+def crawl(urls, cache, ttl=None):
+    SENT['bytes'] = 0
+    cache.hits = cache.revalidated = cache.misses = cache.bytes_saved = 0
+    fetcher = AsyncFetcher(concurrency=16, per_host=16, cache=cache, cache_ttl=ttl)
+    start = time.perf_counter()
+    fetcher.run(urls, lambda page_html, url: parse_broker_html(page_html, url), lambda url, record: None)
+    return time.perf_counter() - start
+
+
+def main(profiles=500, changed=25):
+    site = tempfile.mkdtemp()
+    with open(os.path.join(FIXTURES_DIR, 'businessbroker', 'profile.html'), encoding='utf-8') as f:
+        template = f.read()
+    for i in range(profiles):
+        with open(os.path.join(site, f"broker{i}.html"), 'w', encoding='utf-8') as f:
+            f.write(template.replace('</body>', f'<!-- broker {i} --></body>'))
+
+    server, base_url = serve(site, handler_class=CountingHandler)
+    cache_dir = tempfile.mkdtemp()
+    cache = ResponseCache(cache_dir)
+    urls = [f"{base_url}/broker{i}.html" for i in range(profiles)]
+    try:
+        runs = [('cold', None), ('within TTL', None), ('TTL lapsed', 0)]
+        for label, ttl in runs:
+            elapsed = crawl(urls, cache, ttl)
+            print(f"{label:<12} {elapsed:6.2f}s  {SENT['bytes'] / 1e3:8.1f} KB received  {cache.report()}")
+
+        time.sleep(1.1)  # Last-Modified has one-second resolution
+        for i in range(changed):
+            with open(os.path.join(site, f"broker{i}.html"), 'a', encoding='utf-8') as f:
+                f.write('<!-- updated -->')
+        elapsed = crawl(urls, cache, 0)
+        label = f"{changed} changed"
+        print(f"{label:<12} {elapsed:6.2f}s  {SENT['bytes'] / 1e3:8.1f} KB received  {cache.report()}")
+    finally:
+        server.shutdown()
+        cache.close()
+        shutil.rmtree(site)
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 500, int(args[1]) if len(args) > 1 else 25)
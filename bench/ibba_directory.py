@@ -0,0 +1,75 @@
+"""Regression check and timing for the IBBA scraper's static-HTML parsing, on the saved capture.
+
+    python bench/ibba_directory.py [repeat]
+
+995Axial/page_source_Alabama.html is the find-a-broker page the earlier
+crawl saved while its browser found no profile links (the broker panel
+is filled by JavaScript). The scraper works from the static parts:
+
+    states      the Brokers By State list must give 53 US states and
+                territories (Alabama first) and 11 Canadian entries
+    profiles    the page has no /broker-profile/ links, and the profile
+                parser must reject it instead of saving a bogus broker
+    progress    every URL in the earlier crawl's scraped_urls.txt must
+                parse as /broker-profile/<state>/<city>/<name>/ and
+                canonicalise to itself, so the scraper's resume hint
+                can match them against the record store
+
+Prints the parse time per page. Exits 1 if any check fails.
+"""
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'ibba'))
+sys.path.insert(0, ROOT)
+
+from common.snapshot import PageSnapshot
+from ibba import DIRECTORY_URL, LEGACY_PROGRESS_DIR, parse_states, collect_profile_links, parse_profile_html, parse_profile_url
+
+ALABAMA_PAGE = os.path.join(ROOT, '995Axial', 'page_source_Alabama.html')
+
+
+def main(repeat=20):
+    with open(ALABAMA_PAGE, encoding='utf-8') as f:
+        page_html = f.read()
+    failures = []
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        states = parse_states(page_html, DIRECTORY_URL)
+    elapsed = (time.perf_counter() - start) / repeat
+    us = [state for state in states if '/state/' in state['url']]
+    canada = [state for state in states if '/canadian-state/' in state['url']]
+    print(f"states: {len(us)} US, {len(canada)} Canadian in {elapsed * 1000:.2f} ms per page")
+    if len(us) != 53 or len(canada) != 11 or us[0]['name'] != 'Alabama':
+        failures.append(f"expected 53 US (Alabama first) and 11 Canadian states, got {len(us)} and {len(canada)}")
+    if any(not state['slug'] for state in states):
+        failures.append('a state link has no slug')
+
+    links = collect_profile_links(PageSnapshot(page_html, DIRECTORY_URL))
+    record = parse_profile_html(page_html, 'https://www.ibba.org/broker-profile/alabama/birmingham/nobody/')
+    print(f"profiles: {len(links)} links on the page, parsed as a profile: {record is not None}")
+    if links:
+        failures.append(f"found {len(links)} profile links on a page whose broker panel is empty")
+    if record is not None:
+        failures.append('the directory page was accepted as a profile')
+
+    urls_path = os.path.join(LEGACY_PROGRESS_DIR, 'scraped_urls.txt')
+    if os.path.exists(urls_path):
+        with open(urls_path, encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+        unparsed = [url for url in urls if (parse_profile_url(url) or (None,))[0] != url]
+        print(f"progress: {len(urls) - len(unparsed)}/{len(urls)} earlier profile URLs resume as-is")
+        if unparsed:
+            failures.append(f"earlier profile URLs that don't canonicalise to themselves: {unparsed[:3]}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,147 @@
+"""Cost of a weekly BusinessBroker refresh with listing fingerprints, and the delta report it writes.
+
+    python bench/listing_delta.py [--states N] [--pages N] [--per-page N] [--churn F] [--latency S]
+
+Three crawls of the synthetic site in one working directory, walked the
+way bench/suite.py walks them (listing pages over HTTP, profiles through
+fetch_brokers_concurrently):
+
+    cold      first crawl: every listing page and every profile
+    weekly    --refresh after a --churn share of the cards changed: half
+              of them replaced by new brokers, half with different text.
+              Only the new and changed profiles should be fetched, and
+              the delta report must name exactly those brokers as added,
+              changed and removed
+    again     the same refresh with nothing changed: no profiles, an
+              empty delta
+
+Then, in a fresh directory, a cold crawl, a normal (non-refresh) crawl
+after the churn, and a refresh. The normal crawl sees the edited cards
+but only visits new brokers, so the refresh must still fetch every
+edited profile.
+
+Prints requests, profiles fetched and seconds per crawl, and the weekly
+refresh's cost as a share of the cold crawl. Exits 1 if a delta report
+or a profile count is wrong.
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import logging
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from suite import run_businessbroker
+from synthetic_site import SiteConfig, serve_site
+
+
+def latest_delta(workdir):
+    paths = sorted(glob.glob(os.path.join(workdir, 'businessbroker', 'deltas', 'delta_*.json')))
+    if not paths:
+        return None
+    with open(paths[-1], encoding='utf-8') as f:
+        delta = json.load(f)
+    os.remove(paths[-1])  # Two crawls can finish within the same second
+    return delta
+
+
+def expected_churn(site, base_url):
+    """Profile URLs the churned listing adds, removes and edits"""
+    added, removed, changed = set(), set(), set()
+    for _, slug in site.states():
+        for page in range(1, site.config.pages + 1):
+            for i in range(site.config.per_page):
+                broker_id = f"{slug}-{page}-{i}"
+                churn = site.churned(broker_id)
+                if churn == 'replaced':
+                    removed.add(f"{base_url}/broker/{broker_id}.aspx")
+                    added.add(f"{base_url}/broker/{broker_id}-new.aspx")
+                elif churn == 'edited':
+                    changed.add(f"{base_url}/broker/{broker_id}.aspx")
+    return added, removed, changed
+
+
+def delta_urls(delta, kind):
+    return {entry['Profile URL'] for entry in delta[kind]} if delta else set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weekly refresh cost with listing fingerprints')
+    parser.add_argument('--states', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--per-page', type=int, default=25)
+    parser.add_argument('--churn', type=float, default=0.04, help='share of cards that change before the refresh')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the site sleeps per request')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    config = SiteConfig(states=args.states, pages=args.pages, per_page=args.per_page, latency=args.latency)
+    server, base_url, site = serve_site(config)
+    workdir = tempfile.mkdtemp(prefix='delta-bench-')
+    cwd = os.getcwd()
+    failures = []
+    logging.disable(logging.CRITICAL)
+    second_dir = tempfile.mkdtemp(prefix='delta-bench-')
+    try:
+        os.chdir(workdir)
+        runs = {}
+        for name, churn, refresh in (('cold', 0.0, False), ('weekly', args.churn, True), ('again', args.churn, True)):
+            site.config.churn = churn
+            site.reset_counters()
+            metrics = run_businessbroker(base_url, args.concurrency, refresh=refresh, refresh_all=False)
+            runs[name] = (site.requests, metrics, latest_delta(workdir))
+            print(f"{name:7s} {site.requests:5d} requests  {metrics['listing_pages']:4d} listing pages  "
+                  f"{metrics['profiles']:5d} profiles  {metrics['seconds']:6.2f}s")
+
+        added, removed, changed = expected_churn(site, base_url)
+        total = args.states * args.pages * args.per_page
+        _, _, cold_delta = runs['cold']
+        if len(delta_urls(cold_delta, 'added')) != total or delta_urls(cold_delta, 'removed'):
+            failures.append(f"the cold crawl's delta should add all {total} brokers and remove none")
+
+        requests, metrics, delta = runs['weekly']
+        got = {kind: delta_urls(delta, kind) for kind in ('added', 'removed', 'changed')}
+        print(f"weekly delta: {len(got['added'])} added, {len(got['changed'])} changed, {len(got['removed'])} removed "
+              f"(expected {len(added)}, {len(changed)}, {len(removed)})")
+        print(f"weekly refresh cost {requests / runs['cold'][0]:.1%} of the cold crawl's requests, "
+              f"{metrics['seconds'] / runs['cold'][1]['seconds']:.1%} of its time")
+        for kind, expected in (('added', added), ('removed', removed), ('changed', changed)):
+            if got[kind] != expected:
+                failures.append(f"weekly delta {kind}: {len(got[kind] - expected)} unexpected, "
+                                f"{len(expected - got[kind])} missing")
+        if metrics['profiles'] != len(added) + len(changed):
+            failures.append(f"weekly refresh fetched {metrics['profiles']} profiles, "
+                            f"expected {len(added) + len(changed)}")
+
+        _, metrics, delta = runs['again']
+        if metrics['profiles'] or any(delta_urls(delta, kind) for kind in ('added', 'removed', 'changed')):
+            failures.append(f"an unchanged refresh fetched {metrics['profiles']} profiles and reported {delta}")
+
+        os.chdir(second_dir)
+        for name, churn, refresh in (('cold', 0.0, False), ('normal', args.churn, False), ('refresh', args.churn, True)):
+            site.config.churn = churn
+            metrics = run_businessbroker(base_url, args.concurrency, refresh=refresh, refresh_all=False)
+            latest_delta(second_dir)
+        print(f"refresh after a normal crawl saw the edits: {metrics['profiles']} profiles "
+              f"(expected {len(changed)})")
+        if metrics['profiles'] != len(changed):
+            failures.append(f"the refresh after a normal crawl fetched {metrics['profiles']} profiles, "
+                            f"expected the {len(changed)} edited ones")
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(second_dir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Measure what the common.metrics calls cost in a hot path, disabled and enabled.
+
+    python bench/metrics_overhead.py [iterations]
+
+Times a bare loop, METRICS.timer() / count() on their own, and the
+BusinessBroker profile parse (which goes through the instrumented
+PageSnapshot and SelectorResolver) with metrics off and on.
+"""
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'businessbroker'))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import FIXTURES_DIR
+from common.metrics import METRICS
+from businessbroker import parse_broker_html
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - start) / iterations
+
+
+def bare(n):
+    for _ in range(n):
+        pass
+
+
+def timers(n):
+    for _ in range(n):
+        with METRICS.timer('bench'):
+            pass
+
+
+def counters(n):
+    for _ in range(n):
+        METRICS.count('bench_events', field='Website')
+
+
+def main(iterations=1_000_000):
+    with open(os.path.join(FIXTURES_DIR, 'businessbroker', 'profile.html'), encoding='utf-8') as f:
+        page_html = f.read()
+
+    def parses(n):
+        for _ in range(n):
+            parse_broker_html(page_html, 'https://www.businessbroker.net/broker/1.aspx')
+
+    loop = per_call(bare, iterations)
+    for enabled in (False, True):
+        METRICS.enabled = enabled
+        label = 'enabled ' if enabled else 'disabled'
+        timer_cost = per_call(timers, iterations) - loop
+        count_cost = per_call(counters, iterations) - loop
+        parse_cost = per_call(parses, iterations // 100)
+        print(f"metrics {label}: timer {timer_cost * 1e9:7.1f} ns  count {count_cost * 1e9:7.1f} ns  "
+              f"profile parse {parse_cost * 1e6:7.1f} us")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
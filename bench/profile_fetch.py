@@ -0,0 +1,40 @@
+"""Time the BusinessBrokerScraper HTTP fast path against the local profile fixtures.
+
+    python bench/profile_fetch.py [count] [latency_seconds]
+"""
+import os
+import sys
+import time
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'businessbroker'))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import serve
+from businessbroker import BusinessBrokerScraper
+
+
+def main(count=200, latency=0.0):
+    server, base_url = serve(latency=latency)
+    os.chdir(tempfile.mkdtemp())
+    scraper = BusinessBrokerScraper(debug=False, fast=True)
+    try:
+        info = scraper.fetch_broker_info(f"{base_url}/businessbroker/profile.html")
+        print(f"profile.html -> {info}")
+        info = scraper.fetch_broker_info(f"{base_url}/businessbroker/not_a_profile.html")
+        print(f"not_a_profile.html -> {info} (would fall back to Selenium)")
+
+        start = time.perf_counter()
+        for _ in range(count):
+            scraper.fetch_broker_info(f"{base_url}/businessbroker/profile.html")
+        elapsed = time.perf_counter() - start
+        print(f"{count} profiles in {elapsed:.2f}s ({count / elapsed:.1f} pages/sec, latency={latency}s)")
+    finally:
+        scraper.session.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200, float(args[1]) if len(args) > 1 else 0.0)
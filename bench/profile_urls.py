@@ -0,0 +1,250 @@
+"""Check the BusinessBroker profile-URL classifier against the links in the saved captures.
+
+    python bench/profile_urls.py [--brokers N]
+
+Every <a href> in the saved captures (the IBBA find-a-broker page, the
+BizBuySell directory and broker profile, the BusinessBroker and Axial
+fixtures) goes through the scraper's "any broker link" fallback, the path
+get_broker_listings takes when a page has no broker cards. None of them
+is a BusinessBroker profile, so none may be queued; the old rule
+(anything whose URL contains "broker") is printed alongside.
+
+Then two synthetic state pages go through the card path. Their cards link
+to each broker under several spellings (relative, query strings,
+fragments, trailing slashes, upper-case host, explicit :443, doubled
+slashes) and every fifth broker is listed in both states, among
+navigation and state-page links. Exactly one canonical URL per broker
+must be queued. A third page lists brokers told apart only by ?id= (so
+dropping the query would merge them), and a fourth labels profiles whose
+path no pattern knows; both must be queued one per broker.
+
+Listing pages captured from the live site (the scraper saves one as
+listing_<state>.html when its profile links don't match PROFILE_URLS;
+copy it to bench/fixtures/businessbroker/) must each queue profiles,
+all of them matching a pattern. Last, a store, card fingerprints and
+failed profiles saved under raw URLs must be moved to canonical ones
+when the scraper opens them. Prints links seen, profiles queued and
+fetches avoided, and exits 1 on any mismatch.
+"""
+import os
+import sys
+import time
+import glob
+import logging
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'businessbroker'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from common.snapshot import PageSnapshot
+from common.frontier import DUPLICATE, PROFILE
+from common.store import RecordStore
+from common.fingerprint import ListingFingerprints
+from common.dead_letter import DeadLetterStore
+from synthetic_site import read_capture
+from businessbroker import BusinessBrokerScraper
+
+CAPTURES = [
+    ('995Axial/page_source_Alabama.html', 'https://www.ibba.org/find-a-business-broker/'),
+    ('html_bizbuysell.rtf', 'https://www.bizbuysell.com/business-brokers/directory/'),
+    ('html_brokeronbbs.rtf', 'https://www.bizbuysell.com/business-broker/rebecca-walker-jones/old-inc-business-brokers/8792/'),
+    ('bench/fixtures/businessbroker/profile.html', 'https://www.businessbroker.net/broker/48213.aspx'),
+    ('bench/fixtures/businessbroker/not_a_profile.html', 'https://www.businessbroker.net/broker/1.aspx'),
+    ('bench/fixtures/axial/listing.html', 'https://network.axial.net/forum/companies/business-brokers/1/'),
+    ('bench/fixtures/axial/profile.html', 'https://network.axial.net/forum/companies/profile/acme/'),
+]
+BASE = 'https://www.businessbroker.net'
+NAV = ('<a href="/brokers/brokers.aspx">Find a Broker</a><a href="/brokers/{slug}.aspx?page=2">Next</a>'
+       '<a href="/business-brokers/">Business brokers</a><a href="/become-a-broker.aspx">Become a broker</a>'
+       '<a href="https://www.bizbuysell.com/business-broker/x/y/1/">BizBuySell broker</a>'
+       '<a href="mailto:brokers@businessbroker.net">Email a broker</a><a href="/images/broker.png">Logo</a>')
+
+
+def spellings(broker_id):
+    """Links to one profile as a listing page might write them"""
+    return [
+        f"/broker/{broker_id}.aspx",
+        f"/broker/{broker_id}.aspx?utm_source=listing&ref=card",
+        f"/broker/{broker_id}.aspx#contact",
+        f"HTTPS://WWW.BusinessBroker.NET/broker/{broker_id}.aspx/",
+        f"https://www.businessbroker.net:443//broker/{broker_id}.aspx",
+    ]
+
+
+def query_spellings(broker_id):
+    """Links to a profile told apart by its query string"""
+    return [
+        f"/broker/profile.aspx?id={broker_id}",
+        f"/broker/profile.aspx?utm_source=listing&id={broker_id}",
+        f"/broker/profile.aspx?id={broker_id}#contact",
+        f"https://www.businessbroker.net/broker/profile.aspx/?id={broker_id}&fbclid=abc",
+        f"/broker/profile.aspx?id={broker_id}&ref=card",
+    ]
+
+
+def unfamiliar_spellings(broker_id):
+    """Links to a profile under a path no pattern knows"""
+    return [f"/profiles/{broker_id}", f"/profiles/{broker_id}?utm_medium=web", f"/profiles/{broker_id}/"] * 2
+
+
+def state_page(slug, broker_ids, links=spellings):
+    cards = ''.join(
+        f'<div><div><h3>Broker {broker_id}</h3></div><div><p>Business Broker</p><p>{slug}</p><p>Contact</p>'
+        f'<p><a href="{links(broker_id)[n % 5]}"><span>View broker profile</span></a></p>'
+        f'<a href="{links(broker_id)[(n + 1) % 5]}">Broker {broker_id}</a></div></div>'
+        for n, broker_id in enumerate(broker_ids)
+    )
+    return (f'<html><body><nav>{NAV.format(slug=slug)}</nav><main><div></div><div></div><div></div>'
+            f'<div><div></div><div></div><div><div>{cards}</div></div></div></main></body></html>')
+
+
+def check_captures(scraper, failures):
+    """Every listing page captured from the live site must queue profiles, all matching a pattern"""
+    paths = sorted(glob.glob(os.path.join(ROOT, 'bench', 'fixtures', 'businessbroker', 'listing*.html')))
+    if not paths:
+        print('no captured BusinessBroker listing page in bench/fixtures/businessbroker/: live links NOT checked')
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            first, page_html = f.readline(), f.read()
+        url = first.strip().removeprefix('<!--').removesuffix('-->').strip()
+        unrecognised = scraper.frontier.unrecognised
+        queued = []
+        found = scraper.collect_profile_links(PageSnapshot(page_html, url), queued)
+        print(f"{os.path.basename(path):52} {found:>6} profile links, {len(queued)} queued")
+        if not queued:
+            failures.append(f"{path}: no profiles queued")
+        if scraper.frontier.unrecognised != unrecognised:
+            failures.append(f"{path}: {scraper.frontier.unrecognised - unrecognised} labelled profile links "
+                            f"match no PROFILE_URLS pattern")
+
+
+def check_migration(failures):
+    """Keys saved under raw URLs by an earlier version are moved to canonical ones on startup"""
+    workdir = tempfile.mkdtemp(prefix='profile-urls-migration-')
+    os.chdir(workdir)
+    output_dir = os.path.join(workdir, 'businessbroker')
+    os.makedirs(output_dir)
+    raw = {
+        f"{BASE}/broker/7.aspx?utm_source=listing": f"{BASE}/broker/7.aspx",
+        'HTTPS://WWW.BusinessBroker.NET/broker/8.aspx/': f"{BASE}/broker/8.aspx",
+        f"{BASE}/broker/profile.aspx?id=9#contact": f"{BASE}/broker/profile.aspx?id=9",
+    }
+    store = RecordStore(os.path.join(output_dir, 'business_brokers.db'), ['Profile URL'], key_column='Profile URL')
+    store.append_many([{'Broker Name': url, 'Profile URL': url} for url in raw])
+    store.append_many([{'Broker Name': 'canonical already', 'Profile URL': f"{BASE}/broker/10.aspx"}])
+    store.close()
+    fingerprints = ListingFingerprints(os.path.join(output_dir, 'listing_fingerprints.db'))
+    fingerprints.check_page('Alabama', 1, [(url, 'card') for url in raw])
+    fingerprints.close()
+    dead_letters = DeadLetterStore(os.path.join(output_dir, 'dead_letters.db'))
+    dead_letters.record(next(iter(raw)), 'ProfileTimeout', kind='profile')
+    dead_letters.close()
+
+    for run in ('first', 'second'):
+        scraper = BusinessBrokerScraper(debug=False)
+        keys = scraper.store.keys()
+        if keys != set(raw.values()) | {f"{BASE}/broker/10.aspx"}:
+            failures.append(f"{run} open: store keys {sorted(keys)}")
+        missing = [url for url in raw.values() if url not in scraper.processed_urls]
+        if missing:
+            failures.append(f"{run} open: dedup index is missing {missing}")
+        if scraper.fingerprints.urls() != set(raw.values()):
+            failures.append(f"{run} open: card URLs {sorted(scraper.fingerprints.urls())}")
+        if [row[0] for row in scraper.dead_letters.remaining()] != [raw[next(iter(raw))]]:
+            failures.append(f"{run} open: failed profiles {scraper.dead_letters.remaining()}")
+        if scraper.store.count() != len(raw) + 1:
+            failures.append(f"{run} open: {scraper.store.count()} records, expected {len(raw) + 1}")
+    print(f"migration: {len(raw)} raw profile URLs moved to canonical ones in the store, cards and failures")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile-URL classifier against the saved captures')
+    parser.add_argument('--brokers', type=int, default=200, help='brokers per synthetic state page')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    os.chdir(tempfile.mkdtemp(prefix='profile-urls-bench-'))
+    scraper = BusinessBrokerScraper(debug=False)
+    frontier = scraper.frontier
+    failures = []
+
+    print(f"{'capture':52} {'links':>6} {'old rule':>9} {'queued':>7}")
+    for path, url in CAPTURES:
+        try:
+            snapshot = PageSnapshot(read_capture(os.path.join(ROOT, path)), url)
+        except OSError:
+            print(f"{path:52} missing")
+            continue
+        links = [snapshot.link(node) for node in snapshot.find_all(['//a[@href]'])]
+        old_rule = [link for link in links if link and 'broker' in link]
+        queued = []
+        scraper.collect_any_profile_links(snapshot, queued)
+        print(f"{path:52} {len(links):>6} {len(old_rule):>9} {len(queued):>7}")
+        if queued:
+            failures.append(f"{path}: queued {queued[:3]}")
+
+    states = {'alabama': [f"al-{i}" for i in range(args.brokers)],
+              'alaska': [f"ak-{i}" for i in range(args.brokers)]}
+    # Every fifth Alabama broker is listed in Alaska too
+    states['alaska'] += states['alabama'][::5]
+    expected = {f"{BASE}/broker/{broker_id}.aspx" for ids in states.values() for broker_id in ids}
+    queued = []
+    links = 0
+    start = time.perf_counter()
+    for slug, broker_ids in states.items():
+        page_html = state_page(slug, broker_ids)
+        snapshot = PageSnapshot(page_html, f"{BASE}/brokers/{slug}.aspx")
+        links += len(snapshot.find_all(['//a[@href]']))
+        scraper.collect_profile_links(snapshot, queued, 1, slug.title())
+        # The same page again, as a listing walk that hit it twice would
+        scraper.collect_profile_links(snapshot, queued, 1, slug.title())
+        scraper.collect_any_profile_links(snapshot, queued, slug.title())
+    seconds = time.perf_counter() - start
+    print(f"synthetic state pages: {links} links, {len(queued)} profiles queued, "
+          f"{frontier.verdicts.get(DUPLICATE, 0)} repeats dropped in {seconds * 1000:.1f} ms")
+    print(frontier.report())
+
+    if len(queued) != len(set(queued)):
+        failures.append(f"{len(queued) - len(set(queued))} profiles queued twice")
+    if set(queued) != expected:
+        failures.append(f"queued {len(set(queued) - expected)} unexpected and missed {len(expected - set(queued))} "
+                        f"profiles, e.g. {sorted(set(queued) ^ expected)[:3]}")
+    if frontier.verdicts.get(PROFILE, 0) != len(expected):
+        failures.append(f"frontier counted {frontier.verdicts.get(PROFILE, 0)} profiles, expected {len(expected)}")
+
+    # Profiles told apart by their query, and profiles whose path no pattern knows
+    unrecognised = frontier.unrecognised
+    for slug, links, expect in (('arizona', query_spellings, lambda i: f"{BASE}/broker/profile.aspx?id={i}"),
+                                ('arkansas', unfamiliar_spellings, lambda i: f"{BASE}/profiles/{i}")):
+        broker_ids = list(range(args.brokers))
+        queued = []
+        scraper.collect_profile_links(PageSnapshot(state_page(slug, broker_ids, links), f"{BASE}/brokers/{slug}.aspx"),
+                                      queued, 1, slug.title())
+        if sorted(queued) != sorted(expect(i) for i in broker_ids):
+            failures.append(f"{slug}: queued {len(queued)} profiles, expected {args.brokers}, e.g. {queued[:3]}")
+    if frontier.unrecognised - unrecognised != args.brokers:
+        failures.append(f"{frontier.unrecognised - unrecognised} unfamiliar profile links, expected {args.brokers}")
+
+    check_captures(scraper, failures)
+
+    # A state walked again after a failure gets its own profiles back
+    frontier.forget('Alaska')
+    again = []
+    scraper.collect_profile_links(PageSnapshot(state_page('alaska', states['alaska']), f"{BASE}/brokers/alaska.aspx"),
+                                  again, 1, 'Alaska')
+    if len(again) != args.brokers:
+        failures.append(f"re-walking Alaska queued {len(again)} profiles, expected {args.brokers}")
+
+    check_migration(failures)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
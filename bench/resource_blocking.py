@@ -0,0 +1,114 @@
+"""Bytes transferred and page time per page in Chrome, with the resource-blocking layer off and on.
+
+    python bench/resource_blocking.py [--loads N] [--block GROUPS] [--ready XPATH] [--headed] [URL ...]
+
+Without URLs it loads the saved IBBA capture (995Axial/page_source_Alabama.html)
+from a local server; the capture still references Clarity, Google Tag Manager,
+the Facebook pixel, LinkedIn, Typekit and Google fonts, so those third-party
+requests go out to the network exactly as they do on the live page. Pass live
+profile URLs to measure the real sites. Each URL is loaded N times per profile:
+
+    normal          page_load_strategy 'normal', nothing blocked (the old setup)
+    eager           'eager', nothing blocked, wait for --ready
+    eager+blocking  'eager', the --block groups refused via Network.setBlockedURLs
+
+Needs Chrome and network access.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+from fixture_server import serve
+from common.browser import parse_block_list, lean_options, block_resources, wait_for_any, TransferMeter, chromedriver_path
+
+CAPTURE_PATH = '/995Axial/page_source_Alabama.html'
+
+
+def start_driver(page_load, blocked, headless):
+    chrome_opts = Options()
+    if headless:
+        chrome_opts.add_argument('--headless')
+    chrome_opts.add_argument('--no-sandbox')
+    chrome_opts.add_argument('--disable-dev-shm-usage')
+    chrome_opts.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    lean_options(chrome_opts, page_load, measure=True)
+    driver = webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_opts)
+    if blocked:
+        block_resources(driver, blocked)
+    return driver
+
+
+def measure(urls, loads, page_load, blocked, ready, headless):
+    """[(kb, requests, blocked, ms)] per page load"""
+    driver = start_driver(page_load, blocked, headless)
+    meter = TransferMeter(driver, bool(blocked))
+    rows = []
+    try:
+        for url in urls:
+            for _ in range(loads):
+                # Start every load cold so cached fonts and scripts don't hide what blocking saves
+                driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+                driver.get('about:blank')
+                meter.take()
+                start = time.perf_counter()
+                driver.get(url)
+                if page_load == 'eager':
+                    wait_for_any(driver, ready)
+                seconds = time.perf_counter() - start
+                # Let late analytics beacons land in this page's byte count
+                time.sleep(1)
+                transferred, requests, refused = meter.take(seconds)
+                rows.append((transferred / 1024, requests, refused, seconds * 1000))
+    finally:
+        driver.quit()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page transfer and load time with resource blocking off and on')
+    parser.add_argument('urls', nargs='*', help='pages to load (default: the saved IBBA capture)')
+    parser.add_argument('--loads', type=int, default=5, help='loads per URL and profile')
+    parser.add_argument('--block', default='default', help="resource groups to block (see common.browser)")
+    parser.add_argument('--ready', default='//body//a', help='XPath an eager load waits for')
+    parser.add_argument('--headed', action='store_true', help='show the browser')
+    args = parser.parse_args()
+
+    server = None
+    urls = args.urls
+    if not urls:
+        server, base_url = serve(directory=REPO_DIR)
+        urls = [base_url + CAPTURE_PATH]
+    profiles = [
+        ('normal', 'normal', ()),
+        ('eager', 'eager', ()),
+        ('eager+blocking', 'eager', parse_block_list(args.block)),
+    ]
+    try:
+        print(f"{len(urls)} URL(s) x {args.loads} loads; blocking {args.block}")
+        baseline = None
+        for name, page_load, blocked in profiles:
+            rows = measure(urls, args.loads, page_load, blocked, [args.ready], not args.headed)
+            kb = statistics.mean(row[0] for row in rows)
+            ms = statistics.median(row[3] for row in rows)
+            baseline = baseline or (max(kb, 1e-9), max(ms, 1e-9))
+            print(f"{name:<16} {kb:8.0f} KB/page  {statistics.mean(row[1] for row in rows):5.0f} requests  "
+                  f"{statistics.mean(row[2] for row in rows):4.0f} blocked  p50 {ms:7.0f} ms  "
+                  f"({kb / baseline[0] - 1:+.0%} bytes, {ms / baseline[1] - 1:+.0%} time)")
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
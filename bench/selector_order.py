@@ -0,0 +1,100 @@
+"""Check that learned selector order never promotes a loose fallback over the exact selectors.
+
+    python bench/selector_order.py [--sparse N]
+
+The resolvers reorder each field's chain by hit counts. A run of profiles
+missing a field (no website, no broker heading) lets only the field's
+loose fallback XPath hit, and those hits must not move it ahead of the
+exact selector: the next full profile still has to read its own website
+and name, not a social link or the site header's title. Each
+scraper's parser is run over --sparse such profiles and then a full one,
+first from fresh counts and then from a selector_stats.json in which the
+fallback already has every hit (as saved by a build that promoted it).
+Exits 1 on any wrong field.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'businessbroker'))
+sys.path.insert(0, ROOT)
+
+import businessbroker
+from ibba import ibba
+
+BB_URL = 'https://www.businessbroker.net/broker/48213.aspx'
+IBBA_URL = 'https://www.ibba.org/broker-profile/alabama/birmingham/jane-roe/'
+HEADER = '<header><a href="https://www.facebook.com/businessbroker">Facebook</a><h1>Site header</h1></header>'
+
+
+def bb_profile(website=True):
+    site = '<div><a href="https://www.acme-advisors.example/">Visit Website</a></div>' if website else ''
+    return (f'<html><body>{HEADER}<main><div><div><div><div><h2>Acme Business Advisors</h2></div>'
+            f'<div><div><p>Broker #48213</p></div>{site}</div>'
+            '<table><tbody><tr><td><h1>Jane Doe</h1></td></tr></tbody></table></div></div></div></main></body></html>')
+
+
+def ibba_profile(full=True):
+    heading = '<h1>Jane Roe</h1>' if full else ''
+    site = '<a class="website" href="https://firm.example/">Website</a>' if full else ''
+    return (f'<html><body>{HEADER}<div id="content"><div class="broker-profile">{heading}'
+            '<h2 class="broker-company">Roe Advisors</h2>'
+            '<p><a href="tel:555-0100">Call</a> <a href="mailto:jane@firm.example">Email</a> '
+            f'<a href="https://www.linkedin.com/in/jr">LinkedIn</a> {site}</p>'
+            '</div></div></body></html>')
+
+
+SITES = [
+    # (name, resolver, parse(html), sparse page, full page, fields the full page must read)
+    ('businessbroker', businessbroker.SELECTORS, lambda html: businessbroker.parse_broker_html(html, BB_URL),
+     bb_profile(website=False), bb_profile(), {'Website': 'https://www.acme-advisors.example/'}),
+    ('ibba', ibba.SELECTORS, lambda html: ibba.parse_profile_html(html, IBBA_URL),
+     ibba_profile(full=False), ibba_profile(), {'Website': 'https://firm.example/', 'Broker Name': 'Jane Roe'}),
+]
+
+
+def promoted_stats(resolver, fields):
+    """selector_stats.json as left by a build that promoted each field's loose fallback"""
+    stats = resolver.stats()
+    for field in fields:
+        hits = stats['fields'][field]['hits']
+        for xpath in hits:
+            hits[xpath] = 0
+        hits[resolver.chains[field][-1]] = 1000
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learned selector order against sparse profiles')
+    parser.add_argument('--sparse', type=int, default=5, help='profiles without the field before the full one')
+    args = parser.parse_args()
+
+    failures = []
+    workdir = tempfile.mkdtemp(prefix='selector-order-bench-')
+    for name, resolver, parse, sparse, full, expected in SITES:
+        stats_path = os.path.join(workdir, f"{name}_selector_stats.json")
+        with open(stats_path, 'w', encoding='utf-8') as f:
+            json.dump(promoted_stats(resolver, expected), f)
+        for start in ('fresh counts', 'promoted stats'):
+            if start == 'promoted stats':
+                resolver.load(stats_path)
+            for _ in range(args.sparse):
+                parse(sparse)
+            record = parse(full) or {}
+            wrong = {field: record.get(field) for field, value in expected.items() if record.get(field) != value}
+            print(f"{name:15} {start:15} after {args.sparse} sparse profiles: "
+                  + ', '.join(f"{field}={record.get(field)}" for field in expected))
+            if wrong:
+                failures.append(f"{name} ({start}): read {wrong}, expected {expected}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Measure local snapshot extraction on listing pages.
+
+    python bench/snapshot_extract.py [brokers_per_page]
+
+Runs the BusinessBroker listing extractor over a synthetic state page and
+over the saved IBBA page_source_Alabama.html capture. Reports parse and
+extraction time, plus how many XPath probes ran locally. Each of those
+probes used to be a separate WebDriver find_element(s) round-trip.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'businessbroker'))
+sys.path.insert(0, ROOT)
+
+from common.snapshot import PageSnapshot
+from businessbroker import BusinessBrokerScraper
+
+ALABAMA_PAGE = os.path.join(ROOT, '995Axial', 'page_source_Alabama.html')
+
+
+class CountingSnapshot(PageSnapshot):
+    probes = 0
+
+    def find_all(self, xpaths, context=None):
+        CountingSnapshot.probes += 1
+        return super().find_all(xpaths, context)
+
+
+def state_page(brokers):
+    """A listing page shaped like the BusinessBroker.net state pages"""
+    cards = ''.join(
+        f'<div><div><h3>Broker {i}</h3></div><div><p>Company {i}</p><p>City</p><p>555-0{i:03d}</p>'
+        f'<p><a href="/broker/{i}/broker-{i}.aspx"><span>View broker profile</span></a></p></div></div>'
+        for i in range(brokers)
+    )
+    return (f'<html><body><main><div></div><div></div><div></div><div><div></div><div></div>'
+            f'<div><div>{cards}</div></div></div></main></body></html>')
+
+
+def measure(scraper, label, page_html, url, repeat=50):
+    CountingSnapshot.probes = 0
+    start = time.perf_counter()
+    # collect_profile_links prints every link it finds
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            listings = []
+            scraper.frontier.forget(None)  # Each repeat queues the page's profiles afresh
+            snapshot = CountingSnapshot(page_html, url)
+            scraper.collect_profile_links(snapshot, listings)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label}: {len(listings)} profile links, {CountingSnapshot.probes // repeat} local XPath probes "
+          f"(1 page_source round-trip), {elapsed * 1000:.2f} ms per page")
+
+
+def main(brokers=50):
+    os.chdir(tempfile.mkdtemp())
+    scraper = BusinessBrokerScraper(debug=False)
+    measure(scraper, f"synthetic state page ({brokers} brokers)", state_page(brokers),
+            'https://www.businessbroker.net/brokers/alabama.aspx')
+    with open(ALABAMA_PAGE, encoding='utf-8') as f:
+        measure(scraper, "page_source_Alabama.html", f.read(), 'https://www.ibba.org/state/alabama/')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,80 @@
+"""Compare per-save cost of the SQLite RecordStore with the old whole-workbook rewrite.
+
+    python bench/store_save.py [max_records]
+
+Records are saved in batches of 5 (the scrapers' save_frequency). The store
+is timed at every checkpoint up to max_records; the old pd.concat + to_excel
+path is only timed up to a few thousand records because it is quadratic.
+"""
+import os
+import sys
+import time
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from common.store import RecordStore
+
+BATCH = 5
+COLUMNS = ['Broker Number', 'Broker Name', 'Company Name', 'Website', 'Profile URL']
+
+
+def make_batch(start):
+    return [{
+        'Broker Number': f"Broker #{i}",
+        'Broker Name': f"Broker {i}",
+        'Company Name': f"Company {i % 997}",
+        'Website': f"https://www.company{i % 997}.example/",
+        'Profile URL': f"https://www.businessbroker.net/broker/{i}.aspx",
+    } for i in range(start, start + BATCH)]
+
+
+def time_saves(save, total, checkpoints, window=200):
+    """Average save() latency over `window` saves ending at each checkpoint"""
+    results = {}
+    n = 0
+    while n < total:
+        near = any(cp - window * BATCH <= n < cp for cp in checkpoints)
+        start = time.perf_counter()
+        save(make_batch(n))
+        elapsed = time.perf_counter() - start
+        if near:
+            cp = min(cp for cp in checkpoints if n < cp)
+            results.setdefault(cp, []).append(elapsed)
+        n += BATCH
+    return {cp: sum(v) / len(v) for cp, v in results.items()}
+
+
+def main(max_records=100_000):
+    tmp = tempfile.mkdtemp()
+    checkpoints = [cp for cp in (1_000, 10_000, 100_000) if cp <= max_records]
+
+    store = RecordStore(os.path.join(tmp, 'bench.db'), COLUMNS, key_column='Profile URL')
+    costs = time_saves(store.append_many, max_records, checkpoints)
+    for cp in checkpoints:
+        print(f"RecordStore     at {cp:>7} records: {costs[cp] * 1000:8.3f} ms/save")
+    start = time.perf_counter()
+    count = store.export_xlsx(os.path.join(tmp, 'bench.xlsx'))
+    print(f"export_xlsx of {count} records: {time.perf_counter() - start:.2f}s")
+    store.close()
+
+    try:
+        import pandas as pd
+    except ImportError:
+        return
+    state = {'df': pd.DataFrame(columns=COLUMNS)}
+    excel_path = os.path.join(tmp, 'legacy.xlsx')
+
+    def legacy_save(batch):
+        combined = pd.concat([state['df'], pd.DataFrame(batch)], ignore_index=True)
+        combined.to_excel(excel_path, index=False)
+        state['df'] = combined
+
+    legacy = time_saves(legacy_save, 2_000, [500, 1_000, 2_000], window=10)
+    for cp, cost in sorted(legacy.items()):
+        print(f"pd.concat+xlsx  at {cp:>7} records: {cost * 1000:8.3f} ms/save")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,401 @@
+"""Offline end-to-end benchmark of the BusinessBroker and Axial scrapers against the synthetic site.
+
+    python bench/suite.py [--states N] [--pages N] [--per-page N] [--latency S] [--error-rate F] [--rate-limit N]
+                          [--concurrency N] [--scenarios a,b] [--light] [--output FILE] [--compare FILE]
+
+Scenarios (each runs in its own process, so peak RSS is per scenario):
+
+    businessbroker          cold crawl: state index, every state's listing
+                            pages, then every profile through
+                            fetch_brokers_concurrently and save_progress
+    businessbroker-refresh  --refresh-all over the previous scenario's
+                            output, so profiles come from the warm HTTP cache
+    axial                   both categories over HTTP with a saved session:
+                            AxialScraper.run() end to end
+    ibba                    IbbaScraper.run() end to end over HTTP: the saved
+                            find-a-broker page (995Axial/page_source_Alabama.html)
+                            for the state list, then state shards on a
+                            4-worker pool; only --states states list brokers
+    bizbuysell              BizBuySellScraper.run() end to end: page 1 from
+                            the directory page's transfer state, the rest
+                            from the JSON endpoint; its "profiles" are those
+                            API pages, each carrying --per-page brokers
+
+BusinessBroker walks its listings in the browser; here they are fetched
+over HTTP and parsed by the scraper's own collect_profile_links /
+next_page_url, with the same checkpoint calls as run(). Profiles that a
+real run would retry in Chrome (the injected 500s) are counted as
+browser_fallbacks instead of starting a browser. --rate-limit makes the
+site answer 429 above that many requests per second, to see how fast the
+rate controller settles under it.
+
+Results (pages/sec, p50/p95 per-profile latency, peak RSS, per-save cost
+as the store grows, and the per-stage timings from common.metrics) are
+written as JSON to bench/results/. Pass
+--compare with an earlier results file to print the change per metric;
+the exit status is 1 if any metric regressed by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import traceback
+import subprocess
+import contextlib
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'businessbroker'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'bizbuysell'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'ibba'))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_site import SiteConfig, serve_site, AXIAL_CATEGORIES
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+SCENARIOS = ('businessbroker', 'businessbroker-refresh', 'axial', 'ibba', 'bizbuysell')
+STATES_XPATH = "//h3[contains(text(), 'United States of America')]/following-sibling::ul[1]/li/a"
+# Metric -> True if higher is better; these are the ones --compare checks
+COMPARED = {
+    'pages_per_sec': True,
+    'seconds': False,
+    'profile_p50_ms': False,
+    'profile_p95_ms': False,
+    'peak_rss_mb': False,
+    'save_mean_ms': False,
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def save_curve(saves, points=10):
+    """(records in store, seconds) per save, averaged into at most `points` steps"""
+    if not saves:
+        return []
+    step = max(1, len(saves) // points)
+    curve = []
+    for i in range(0, len(saves), step):
+        chunk = saves[i:i + step]
+        curve.append({'records': chunk[-1][0], 'ms': round(sum(s for _, s in chunk) / len(chunk) * 1000, 3)})
+    return curve
+
+
+def instrument(scraper, saves, timings):
+    """Time the scraper's save_progress and export_excel calls without changing what they do"""
+    save_progress, export_excel = scraper.save_progress, scraper.export_excel
+
+    def timed_save(force=False):
+        pending = len(scraper.data)
+        start = time.perf_counter()
+        save_progress(force)
+        elapsed = time.perf_counter() - start
+        if pending and not scraper.data:
+            saves.append((scraper.store.count(), elapsed))
+
+    def timed_export():
+        start = time.perf_counter()
+        export_excel()
+        timings['export_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    scraper.save_progress = timed_save
+    scraper.export_excel = timed_export
+
+
+def walk_state_http(scraper, session, state, counts):
+    """A state's unprocessed profile URLs, walking its listing pages over HTTP with the scraper's parsing"""
+    from common.http import fetch_html
+    from common.snapshot import PageSnapshot
+
+    listings = scraper.checkpoint.saved_listing(state['name'])
+    if listings is None:
+        listings, page, url = [], 1, state['url']
+        while url:
+            page_html = fetch_html(session, url, rate=scraper.rate)
+            if page_html is None:
+                break
+            counts['listing_pages'] += 1
+            snapshot = PageSnapshot(page_html, url)
+            scraper.collect_profile_links(snapshot, listings, page, state['name'])
+            url = scraper.next_page_url(snapshot)
+            scraper.checkpoint.save_page(state['name'], page, url, listings)
+            page += 1
+        scraper.checkpoint.finish_listing(state['name'], listings)
+    return [url for url in listings if url not in scraper.processed_urls]
+
+
+def run_businessbroker(base_url, concurrency, refresh=False, refresh_all=True):
+    from businessbroker import BusinessBrokerScraper
+    from common.http import make_session
+    from common.snapshot import PageSnapshot
+
+    start = time.perf_counter()
+    # Refresh scenarios re-visit every profile by default, so they keep measuring fetches from the warm cache
+    scraper = BusinessBrokerScraper(debug=False, concurrency=concurrency, per_host_limit=concurrency,
+                                    refresh=refresh, refresh_all=refresh and refresh_all)
+    scraper.base_url = f"{base_url}/brokers/brokers.aspx"
+    saves, timings, fallbacks = [], {}, []
+    counts = {'listing_pages': 0}
+    instrument(scraper, saves, timings)
+    # Chrome isn't part of the benchmark: count the profiles a real run would retry in the browser
+    scraper.process_listings = lambda listings, state_name, allow_http=True: fallbacks.extend(listings)
+
+    session = make_session(pool_size=concurrency)
+    scraper.fingerprints.begin_run()
+    index = PageSnapshot(session.get(scraper.base_url).text, scraper.base_url)
+    states = [{'name': link.text.strip(), 'url': index.link(link)} for link in index.find_all(STATES_XPATH)]
+    counts['listing_pages'] += 1
+    for state in states:
+        if scraper.checkpoint.state_done(state['name']):
+            continue
+        scraper.checkpoint.start_state(state['name'])
+        todo = walk_state_http(scraper, session, state, counts)
+        if todo:
+            scraper.fetch_brokers_concurrently(todo, state['name'])
+        scraper.save_progress(force=True)
+        scraper.checkpoint.mark_state_done(state['name'])
+    scraper.finish_crawl(report_delta=scraper.listing_complete(states))
+    scraper.export_excel()
+    scraper.save_selector_stats()
+    session.close()
+    seconds = time.perf_counter() - start
+    saved = scraper.changed_count if refresh else scraper.store.count()
+    return summarize(seconds, counts['listing_pages'], scraper.profile_latencies, saved, fallbacks,
+                     saves, timings, scraper.cache)
+
+
+def run_axial(base_url, concurrency, pages):
+    import axial.engine as engine
+    from common.checkpoint import atomic_write
+
+    start = time.perf_counter()
+    engine.BASE_URL = f"{base_url}/forum/companies/"
+    # A saved session lets run() skip the browser login and walk everything over HTTP
+    atomic_write(os.path.join(os.getcwd(), 'axial_session.json'), json.dumps({
+        'user_agent': engine.USER_AGENTS[0],
+        'saved_at': time.time(),
+        'cookies': [{'name': 'axial_access', 'value': 'granted', 'path': '/', 'domain': '127.0.0.1'}],
+    }))
+    scraper = engine.AxialScraper(list(AXIAL_CATEGORIES), output_name='axial_bench', debug=False,
+                                  concurrency=concurrency, per_host_limit=concurrency)
+    saves, timings, fallbacks = [], {}, []
+    instrument(scraper, saves, timings)
+    scraper.scrape_profile = lambda name, url: fallbacks.append(url)
+    scraper.run()
+    seconds = time.perf_counter() - start
+    listing_pages = len(AXIAL_CATEGORIES) * pages + 1  # +1: the session check fetches page 1
+    return summarize(seconds, listing_pages, scraper.profile_latencies, scraper.store.count(), fallbacks,
+                     saves, timings, scraper.cache)
+
+
+def run_ibba(base_url, concurrency, states, pages):
+    from ibba import IbbaScraper
+
+    start = time.perf_counter()
+    scraper = IbbaScraper(concurrency=concurrency, per_host_limit=concurrency,
+                          progress_dir=os.path.join(os.getcwd(), 'ibba_progress'))
+    scraper.base_url = f"{base_url}/find-a-business-broker/"
+    saves, timings = [], {}
+    instrument(scraper, saves, timings)
+    scraper.run(workers=4)
+    seconds = time.perf_counter() - start
+    # The directory page, one page per listed state or province, and the extra pages of the populated ones
+    listing_pages = 1 + len(scraper.state_names) + states * (pages - 1)
+    return summarize(seconds, listing_pages, scraper.profile_latencies, scraper.store.count(), [], saves, timings,
+                     scraper.cache)
+
+
+def run_bizbuysell(base_url, concurrency):
+    from bizbuysell import BizBuySellScraper
+
+    start = time.perf_counter()
+    scraper = BizBuySellScraper(concurrency=concurrency, site_url=base_url, api_url=f"{base_url}/bff/v2/brokerSearch")
+    saves, timings, latencies = [], {}, []
+    instrument(scraper, saves, timings)
+    fetch_page = scraper.fetch_page
+
+    def timed_fetch(page):
+        began = time.perf_counter()
+        results = fetch_page(page)
+        latencies.append(time.perf_counter() - began)
+        return results
+
+    scraper.fetch_page = timed_fetch
+    scraper.run()
+    seconds = time.perf_counter() - start
+    # Pages the API failed on were read from their HTML instead; count those like browser fallbacks
+    fallbacks = [None] * (scraper.html_pages - 1)
+    return summarize(seconds, 1, latencies, scraper.store.count(), fallbacks, saves, timings, None)
+
+
+def summarize(seconds, listing_pages, latencies, saved, fallbacks, saves, timings, cache):
+    profiles = len(latencies)
+    save_times = [elapsed for _, elapsed in saves]
+    return dict(timings, **{
+        'seconds': round(seconds, 3),
+        'listing_pages': listing_pages,
+        'profiles': profiles,
+        'records_saved': saved,
+        'browser_fallbacks': len(fallbacks),
+        'pages_per_sec': round((listing_pages + profiles) / seconds, 1) if seconds else 0.0,
+        'profile_p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'profile_p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'save_mean_ms': round(sum(save_times) / len(save_times) * 1000, 3) if save_times else 0.0,
+        'save_cost': save_curve(saves),
+        'cache_hit_rate': round(cache.hit_rate(), 3) if cache else None,
+    })
+
+
+def scenario_process(name, base_url, workdir, options, results):
+    """Child process entry point: run one scenario quietly in its own working directory"""
+    from common.metrics import METRICS
+    os.chdir(workdir)
+    logging.disable(logging.CRITICAL)
+    METRICS.enable(scraper=name)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if name == 'axial':
+                metrics = run_axial(base_url, options['concurrency'], options['pages'])
+            elif name == 'ibba':
+                metrics = run_ibba(base_url, options['concurrency'], options['states'], options['pages'])
+            elif name == 'bizbuysell':
+                metrics = run_bizbuysell(base_url, options['concurrency'])
+            else:
+                metrics = run_businessbroker(base_url, options['concurrency'], refresh=name.endswith('-refresh'))
+        metrics['stages'] = METRICS.summary()['stages']
+        results.put((name, metrics, None))
+    except BaseException:
+        results.put((name, None, traceback.format_exc()))
+
+
+def run_scenario(name, base_url, workdir, options, site):
+    site.reset_counters()
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=scenario_process, args=(name, base_url, workdir, options, results))
+    process.start()
+    _, metrics, error = results.get()
+    process.join()
+    if error:
+        print(f"{name} failed:\n{error}")
+        return None
+    metrics.update(requests=site.requests, not_modified=site.not_modified, server_errors=site.errors,
+                   throttled=site.throttled, mb_received=round(site.bytes_sent / 1e6, 2))
+    return metrics
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline_path, tolerance):
+    """Print each compared metric against an earlier results file; returns the number of regressions"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}, {baseline.get('timestamp')}):")
+    if baseline.get('site') != results['site'] or baseline.get('concurrency') != results['concurrency']:
+        print('  Warning: the site shape or concurrency differs, so these numbers are not like for like')
+    regressions = 0
+    for name, metrics in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not metrics:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > tolerance else ''
+            regressions += bool(flag)
+            print(f"  {name:<24} {metric:<16} {old:>10} -> {new:<10} {change:+7.1%} {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end scraper benchmarks')
+    parser.add_argument('--states', type=int, default=10, help='BusinessBroker states (at most 50)')
+    parser.add_argument('--pages', type=int, default=3, help='listing pages per state and per Axial category')
+    parser.add_argument('--per-page', type=int, default=25, help='profiles per listing page')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the site sleeps per request')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='share of profile URLs that answer 500')
+    parser.add_argument('--rate-limit', type=int, default=0, help='requests/sec before the site answers 429 (0: none)')
+    parser.add_argument('--listing-detail', type=float, default=0.9,
+                        help='share of Axial result cards whose microdata has every profile field')
+    parser.add_argument('--light', action='store_true',
+                        help="don't pad pages to the size of the saved captures")
+    parser.add_argument('--concurrency', type=int, default=8, help='profiles in flight at once')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument('--output', help='results file (default: bench/results/<commit>-<time>.json)')
+    parser.add_argument('--compare', metavar='FILE', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative change counted as a regression')
+    args = parser.parse_args()
+
+    config = SiteConfig(states=args.states, pages=args.pages, per_page=args.per_page, latency=args.latency,
+                        error_rate=args.error_rate, rate_limit=args.rate_limit, realistic_weight=not args.light,
+                        listing_detail=args.listing_detail)
+    options = {'concurrency': args.concurrency, 'pages': args.pages, 'states': args.states}
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'site': config.as_dict(),
+        'concurrency': args.concurrency,
+        'scenarios': {},
+    }
+    server, base_url, site = serve_site(config)
+    workdir = tempfile.mkdtemp(prefix='scraper-bench-')
+    try:
+        for name in names:
+            metrics = run_scenario(name, base_url, workdir, options, site)
+            results['scenarios'][name] = metrics
+            if metrics:
+                print(f"{name:<24} {metrics['seconds']:7.2f}s  {metrics['pages_per_sec']:7.1f} pages/s  "
+                      f"p50 {metrics['profile_p50_ms']:6.1f} ms  p95 {metrics['profile_p95_ms']:6.1f} ms  "
+                      f"RSS {metrics['peak_rss_mb']:6.1f} MB  save {metrics['save_mean_ms']:.2f} ms  "
+                      f"{metrics['records_saved']} saved, {metrics['browser_fallbacks']} to browser, "
+                      f"{metrics['requests']} requests ({metrics['not_modified']} 304, {metrics['throttled']} 429)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
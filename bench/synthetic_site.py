@@ -0,0 +1,454 @@
+"""Synthetic broker directory for the offline benchmarks.
+
+Serves generated BusinessBroker.net pages (state index, paginated state
+listings, broker profiles), Axial pages (paginated category results,
+company profiles) with the markup both scrapers' selectors expect, IBBA
+(the saved find-a-broker page itself with its links made local, then
+generated state pages and /broker-profile/<state>/<city>/<name>/ pages),
+and
+the BizBuySell broker directory: pages carrying their brokerSearch
+response in the Angular transfer state, plus the JSON endpoint itself
+(POST, bearer token), built from the brokers in
+fixtures/bizbuysell/brokerSearch.json (page 1 of the saved capture). Every
+page carries the <head> of the matching saved capture and is padded to
+that capture's size, so parse and transfer costs look like the real sites:
+
+    state index      html_bizbuysell.rtf (directory landing page)
+    listing pages    995Axial/page_source_Alabama.html
+    profile pages    html_brokeronbbs.rtf (broker profile)
+
+A `churn` share of BusinessBroker listing cards differs from the base
+listing: half are replaced by a new broker, half carry different text,
+as a later crawl of the real directory would find.
+
+A `listing_detail` share of Axial result cards carries the firm's website,
+address and a team member as schema.org microdata, as the real result
+pages do for most firms; the rest only link to their profile.
+
+Latency is slept per request. A deterministic `error_rate` share of
+profile URLs and BizBuySell API pages answers 500, so repeated runs fail on the same pages. With
+a `rate_limit`, requests beyond that many in the last second answer 429
+with Retry-After: 1, to exercise the scrapers' back-off. Pages carry an
+ETag and answer If-None-Match with a 304.
+"""
+import os
+import re
+import json
+import zlib
+import time
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAPTURES = {
+    'directory': os.path.join(REPO_DIR, 'html_bizbuysell.rtf'),
+    'listing': os.path.join(REPO_DIR, '995Axial', 'page_source_Alabama.html'),
+    'profile': os.path.join(REPO_DIR, 'html_brokeronbbs.rtf'),
+}
+STATE_NAMES = [
+    'Alabama', 'Alaska', 'Arizona', 'Arkansas', 'California', 'Colorado', 'Connecticut', 'Delaware',
+    'Florida', 'Georgia', 'Hawaii', 'Idaho', 'Illinois', 'Indiana', 'Iowa', 'Kansas', 'Kentucky',
+    'Louisiana', 'Maine', 'Maryland', 'Massachusetts', 'Michigan', 'Minnesota', 'Mississippi',
+    'Missouri', 'Montana', 'Nebraska', 'Nevada', 'New Hampshire', 'New Jersey', 'New Mexico', 'New York',
+    'North Carolina', 'North Dakota', 'Ohio', 'Oklahoma', 'Oregon', 'Pennsylvania', 'Rhode Island',
+    'South Carolina', 'South Dakota', 'Tennessee', 'Texas', 'Utah', 'Vermont', 'Virginia', 'Washington',
+    'West Virginia', 'Wisconsin', 'Wyoming',
+]
+AXIAL_CATEGORIES = ('business-brokers', 'm-a-advisory-firms')
+BBS_FIXTURE = os.path.join(REPO_DIR, 'bench', 'fixtures', 'bizbuysell', 'brokerSearch.json')
+BBS_SEARCH_KEY = ('api/bff/v2/brokerSearch{"siteId":20,"languageId":10,"queryString":"",'
+                  '"seoName":"/business-brokers/directory/"}')
+BBS_TOKEN = 'synthetic-jwt'
+
+# Filler that no scraper selector matches: no links, no headings, no numbered text
+FILLER_BLOCK = ('<div class="card"><div class="card-body"><p class="summary">Confidential listing summary '
+                'with seller financing available.</p><span class="tag">Services</span>'
+                '<span class="tag">Established</span></div></div>\n')
+
+
+def slug_title(slug):
+    return ' '.join(word.capitalize() for word in slug.split('-'))
+
+
+def read_capture(path):
+    """HTML of a saved capture, unwrapped from RTF if it was saved through TextEdit"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    if not text.startswith('{\\rtf'):
+        return text
+    text = text[text.find('<html'):].rstrip().rstrip('}')
+    text = re.sub(r"\\'([0-9a-f]{2})", lambda m: bytes([int(m.group(1), 16)]).decode('cp1252', 'replace'), text)
+    text = re.sub(r'\\uc0\\u(\d+) ?', lambda m: chr(int(m.group(1))), text)
+    return text.replace('\\\n', '\n').replace('\\{', '{').replace('\\}', '}').replace('\\\\', '\\')
+
+
+def capture_shell(kind):
+    """(<head> markup, total size) of the capture a page type is modelled on; empty if it is missing"""
+    try:
+        page_html = read_capture(CAPTURES[kind])
+    except OSError:
+        return '<meta charset="utf-8">', 0
+    start, end = page_html.find('<head'), page_html.find('</head>')
+    head = page_html[page_html.find('>', start) + 1:end] if 0 <= start < end else ''
+    # The scrapers only look at the body; drop <base> so relative links resolve against the page
+    head = re.sub(r'<base\b[^>]*>', '', head)
+    return head, len(page_html)
+
+
+class SiteConfig:
+    """Shape of the synthetic site"""
+
+    def __init__(self, states=10, pages=3, per_page=25, latency=0.0, error_rate=0.0, rate_limit=0,
+                 realistic_weight=True, listing_detail=0.9, churn=0.0):
+        self.states = states  # BusinessBroker states (at most 50)
+        self.pages = pages  # Listing pages per state and per Axial category
+        self.per_page = per_page  # Profiles per listing page
+        self.latency = latency  # Seconds slept before answering each request
+        self.error_rate = error_rate  # Share of profile URLs that answer 500
+        self.rate_limit = rate_limit  # Requests per second answered before 429s start; 0 = no limit
+        self.realistic_weight = realistic_weight  # Pad pages to the size of the saved captures
+        self.listing_detail = listing_detail  # Share of Axial result cards whose microdata has every profile field
+        self.churn = churn  # Share of BusinessBroker cards that differ from the base listing (half new brokers)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class SyntheticSite:
+    """Page generator plus request counters"""
+
+    def __init__(self, config):
+        self.config = config
+        self.shells = {}
+        for kind in CAPTURES:
+            head, size = capture_shell(kind) if config.realistic_weight else ('', 0)
+            self.shells[kind] = (head, size)
+        self.lock = threading.Lock()
+        self.recent = deque()  # Arrival times within the last second, for rate_limit
+        with open(BBS_FIXTURE, encoding='utf-8') as f:
+            self.bbs_template = json.load(f)
+        try:
+            # Absolute links on the capture point at ibba.org; make them resolve against this server
+            self.ibba_directory = read_capture(CAPTURES['listing']).replace('https://www.ibba.org/', '/')
+        except OSError:
+            self.ibba_directory = ''
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.not_modified = 0
+            self.errors = 0
+            self.throttled = 0
+            self.bytes_sent = 0
+
+    def count(self, status, size):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += size
+            if status == 304:
+                self.not_modified += 1
+            elif status == 429:
+                self.throttled += 1
+            elif status >= 500:
+                self.errors += 1
+
+    def wrap(self, kind, title, body):
+        head, size = self.shells[kind]
+        page = f'<!DOCTYPE html>\n<html lang="en"><head>{head}<title>{title}</title></head><body>{body}'
+        footer = []
+        if size:
+            missing = size - len(page) - 30
+            footer.append('<footer>')
+            footer.append(FILLER_BLOCK * max(0, missing // len(FILLER_BLOCK)))
+            footer.append('</footer>')
+        return page + ''.join(footer) + '</body></html>'
+
+    def over_limit(self):
+        """Book one arrival; True if it is beyond the site's per-second limit"""
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and self.recent[0] <= now - 1:
+                self.recent.popleft()
+            self.recent.append(now)
+            return len(self.recent) > self.config.rate_limit
+
+    def failing(self, path):
+        return zlib.crc32(path.encode('utf-8')) % 10_000 < self.config.error_rate * 10_000
+
+    @staticmethod
+    def slug(name):
+        return name.lower().replace(' ', '-')
+
+    def states(self):
+        names = STATE_NAMES[:self.config.states]
+        return [(name, self.slug(name)) for name in names]
+
+    def page_number(self, query):
+        try:
+            return max(1, int(parse_qs(query).get('page', ['1'])[0]))
+        except ValueError:
+            return 1
+
+    # BusinessBroker.net
+
+    def bb_index(self):
+        items = ''.join(f'<li><a href="/brokers/{slug}.aspx">{name}</a></li>' for name, slug in self.states())
+        body = (f'<main><h3>United States of America</h3><ul class="states">{items}</ul>'
+                f'<h3>Canada</h3><ul><li><a href="/brokers/ontario.aspx">Ontario</a></li></ul></main>')
+        return self.wrap('directory', 'Business Brokers Directory', body)
+
+    def churned(self, broker_id):
+        """None, 'replaced' or 'edited' for a BusinessBroker card, stable for a given churn"""
+        share = (zlib.crc32(f"churn:{broker_id}".encode('utf-8')) % 10000) / 10000
+        if share < self.config.churn / 2:
+            return 'replaced'
+        return 'edited' if share < self.config.churn else None
+
+    def bb_listing(self, slug, page):
+        containers = []
+        for i in range(self.config.per_page):
+            broker_id = f"{slug}-{page}-{i}"
+            churn = self.churned(broker_id)
+            if churn == 'replaced':
+                broker_id += '-new'
+            blurb = 'Now representing 3 listings' if churn == 'edited' else 'Contact for details'
+            containers.append(
+                f'<div><div><h3>Broker {broker_id}</h3></div><div><p>Business Broker</p><p>{slug}</p>'
+                f'<p>{blurb}</p><p><a href="/broker/{broker_id}.aspx">'
+                f'<span>View broker profile</span></a></p></div></div>'
+            )
+        next_link = f'<a href="/brokers/{slug}.aspx?page={page + 1}">Next</a>' if page < self.config.pages else ''
+        body = (f'<main><div></div><div></div><div></div><div><div></div><div></div>'
+                f'<div><div>{"".join(containers)}</div></div></div>{next_link}</main>')
+        return self.wrap('listing', f'{slug} Business Brokers', body)
+
+    def bb_profile(self, broker_id):
+        body = (
+            '<header><a href="https://www.businessbroker.net/">BusinessBroker.net</a></header>'
+            '<main><div class="profile"><div><div>'
+            f'<div><h2>{broker_id.title()} Advisors</h2></div>'
+            f'<div><div><p>Broker #{zlib.crc32(broker_id.encode("utf-8"))}</p></div>'
+            f'<div><a href="https://www.{broker_id}.example/">Visit Website</a></div></div>'
+            f'<table><tr><td><h1>Broker {broker_id}</h1></td></tr></table>'
+            '</div></div></div></main>'
+        )
+        return self.wrap('profile', f'Broker {broker_id} - Business Broker', body)
+
+    # Axial
+
+    def axial_firm(self, category, page, i):
+        """Every tenth firm is listed in both categories"""
+        return f"firm-{page}-{i}" if i % 10 == 0 else f"{category}-{page}-{i}"
+
+    def axial_card_detail(self, firm):
+        """Website, address and team member microdata for a `listing_detail` share of firms"""
+        if zlib.crc32(firm.encode('utf-8')) % 10_000 >= self.config.listing_detail * 10_000:
+            return ''
+        return (f'<link itemprop="url" href="https://www.{firm}.example/">'
+                '<p itemprop="address" itemscope itemtype="https://schema.org/PostalAddress">'
+                '<span itemprop="addressLocality">Denver</span>, <span itemprop="addressRegion">CO</span></p>'
+                '<p itemprop="employee" itemscope itemtype="https://schema.org/Person">'
+                f'<span itemprop="name">Partner of {firm}</span></p>')
+
+    def axial_listing(self, category, page):
+        items = []
+        for i in range(self.config.per_page):
+            firm = self.axial_firm(category, page, i)
+            items.append(f'<li itemscope itemtype="https://schema.org/Organization">'
+                         f'<a itemprop="name" href="/forum/companies/profile/{firm}/">{firm.title()}</a>'
+                         f'{self.axial_card_detail(firm)}</li>')
+        pager = ''.join(f'<a href="/forum/companies/{category}/?page={n}">{n}</a>'
+                        for n in range(1, self.config.pages + 1) if n != page)
+        body = f'<main><ul class="results">{"".join(items)}</ul><nav class="pager">{pager}</nav></main>'
+        return self.wrap('listing', f'{category} | Axial', body)
+
+    def axial_profile(self, firm):
+        body = (
+            '<main><form><div><h1>Company Profile</h1></div>'
+            '<div><p><span>Denver, CO</span><span>United States</span></p></div>'
+            f'<div><p><a href="https://www.{firm}.example/">www.{firm}.example</a></p></div></form>'
+            f'<axl-account-profile-member><div><p>Partner of {firm}</p><p>Managing Director</p></div>'
+            '</axl-account-profile-member></main>'
+        )
+        return self.wrap('profile', 'Company Profile | Axial', body)
+
+    # BizBuySell
+
+    def bbs_total(self):
+        """Same number of brokers as the BusinessBroker directory"""
+        return self.config.states * self.config.pages * self.config.per_page
+
+    def bbs_search(self, page):
+        """brokerSearch response for a directory page, cycling the fixture's brokers under new profile IDs"""
+        template = self.bbs_template['value']
+        fixture_brokers = template['brokerSearchResult']['value']
+        per_page, total = self.config.per_page, self.bbs_total()
+        brokers = []
+        for n in range((page - 1) * per_page, min(page * per_page, total)):
+            broker = dict(fixture_brokers[n % len(fixture_brokers)])
+            broker['brokerProfileId'] = 100_000 + n
+            broker['url'] = re.sub(r'/\d+/$', f'/{broker["brokerProfileId"]}/', broker['url'])
+            brokers.append(broker)
+        criteria = dict(template['criteria'], pageNumber=page, offset=(page - 1) * per_page, howMany=per_page)
+        result = dict(template['brokerSearchResult'], count=len(brokers), total=total, value=brokers)
+        value = dict(template, jwtToken=BBS_TOKEN, criteria=criteria, brokerSearchResult=result)
+        return dict(self.bbs_template, value=value)
+
+    def bbs_directory(self, page):
+        state = json.dumps({'bbs_ipgeo': {'countryCode': 'US'}, BBS_SEARCH_KEY: self.bbs_search(page)})
+        body = f'<app-root></app-root><script id="BBS-state" type="application/json">{state}</script>'
+        return self.wrap('directory', 'Business Brokers - BizBuySell', body)
+
+    def bbs_api(self, headers, payload):
+        """(status, JSON text) for a POST to the brokerSearch endpoint"""
+        if headers.get('Authorization') != f"Bearer {BBS_TOKEN}":
+            return 401, json.dumps({'message': 'Unauthorized'})
+        match = re.fullmatch(r'/business-brokers/directory/(?:(\d+)/)?', str(payload.get('seoName')))
+        if not match:
+            return 400, json.dumps({'message': 'Unknown seoName'})
+        page = int(match.group(1) or 1)
+        if self.failing(f"/bff/v2/brokerSearch/{page}"):
+            return 500, json.dumps({'message': 'Internal Server Error'})
+        return 200, json.dumps(self.bbs_search(page))
+
+    # IBBA
+
+    def ibba_listing(self, slug, page):
+        """A state's brokers; only the first `states` states have any. Every tenth one is the previous state's"""
+        slugs = [state_slug for _, state_slug in self.states()]
+        items = []
+        if slug in slugs:
+            index = slugs.index(slug)
+            for i in range(self.config.per_page):
+                home = slugs[index - 1] if i % 10 == 0 and index > 0 else slug
+                items.append(f'<li><a href="/broker-profile/{home}/city-{page}/broker-{page}-{i}/">'
+                             f'Broker {page}-{i}</a></li>')
+        next_link = (f'<a class="next page-numbers" href="/state/{slug}/page/{page + 1}/">Next</a>'
+                     if items and page < self.config.pages else '')
+        body = (f'<div id="content"><h1>{slug_title(slug)} Business Brokers</h1>'
+                f'<ul class="brokers">{"".join(items)}</ul>{next_link}</div>')
+        return self.wrap('listing', f'{slug_title(slug)} Business Brokers - IBBA', body)
+
+    def ibba_profile(self, state, city, name):
+        broker_id = f"{state}-{name}"
+        body = (
+            '<header><a href="https://www.ibba.org/find-a-business-broker/">Find a Broker</a>'
+            '<a href="mailto:info@ibba.org">Contact</a></header>'
+            '<div id="content"><div class="broker-profile">'
+            f'<h1>{slug_title(name)}</h1><h2 class="broker-company">{slug_title(state)} Business Advisors</h2>'
+            '<span class="cbi">CBI</span>'
+            f'<p><a href="tel:555-{zlib.crc32(broker_id.encode("utf-8")) % 10_000:04d}">Call</a> '
+            f'<a href="mailto:{name}@{broker_id}.example">Email</a> '
+            f'<a class="website" href="https://www.{broker_id}.example/">Website</a></p>'
+            f'<p>{slug_title(city)}, {slug_title(state)}</p></div></div>'
+        )
+        return self.wrap('profile', f'{slug_title(name)} - IBBA', body)
+
+    def render(self, path, query):
+        """(status, html) for a request path"""
+        parts = [part for part in path.split('/') if part]
+        if path == '/brokers/brokers.aspx':
+            return 200, self.bb_index()
+        if len(parts) == 2 and parts[0] == 'brokers' and parts[1].endswith('.aspx'):
+            return 200, self.bb_listing(parts[1][:-5], self.page_number(query))
+        if len(parts) == 2 and parts[0] == 'broker' and parts[1].endswith('.aspx'):
+            return (500, 'Internal Server Error') if self.failing(path) else (200, self.bb_profile(parts[1][:-5]))
+        if parts[:2] == ['forum', 'companies'] and len(parts) == 4 and parts[2] == 'profile':
+            return (500, 'Internal Server Error') if self.failing(path) else (200, self.axial_profile(parts[3]))
+        if parts[:2] == ['forum', 'companies'] and len(parts) == 3 and parts[2] in AXIAL_CATEGORIES:
+            return 200, self.axial_listing(parts[2], self.page_number(query))
+        if path == '/find-a-business-broker/' and self.ibba_directory:
+            return 200, self.ibba_directory
+        if parts[:1] in (['state'], ['canadian-state']) and len(parts) in (2, 4):
+            page = int(parts[3]) if len(parts) == 4 and parts[3].isdigit() else 1
+            return 200, self.ibba_listing(parts[1], page)
+        if parts[:1] == ['broker-profile'] and len(parts) == 4:
+            return (500, 'Internal Server Error') if self.failing(path) else (200, self.ibba_profile(*parts[1:]))
+        if parts[:2] == ['business-brokers', 'directory'] and len(parts) <= 3:
+            page = int(parts[2]) if len(parts) == 3 and parts[2].isdigit() else 1
+            return 200, self.bbs_directory(page)
+        return 404, 'Not Found'
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    """Answers GETs (and the BizBuySell API's POSTs) from a SyntheticSite"""
+    site = None
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # Client closed a keep-alive connection
+
+    def do_GET(self):
+        if self.site.config.latency:
+            time.sleep(self.site.config.latency)
+        url = urlsplit(self.path)
+        if self.site.over_limit():
+            status, page_html = 429, 'Too Many Requests'
+        else:
+            status, page_html = self.site.render(url.path, url.query)
+        body = page_html.encode('utf-8')
+        etag = f'"{zlib.crc32(body):08x}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        self.send(status, body, 'text/html; charset=utf-8', etag)
+
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.site.config.latency:
+            time.sleep(self.site.config.latency)
+        if self.site.over_limit():
+            status, text = 429, 'Too Many Requests'
+        elif urlsplit(self.path).path != '/bff/v2/brokerSearch':
+            status, text = 404, 'Not Found'
+        else:
+            try:
+                status, text = self.site.bbs_api(self.headers, json.loads(payload or b'{}'))
+            except ValueError:
+                status, text = 400, 'Bad Request'
+        self.send(status, text.encode('utf-8'), 'application/json; charset=utf-8')
+
+    def send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+        if etag and status in (200, 304):
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.site.count(status, len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_site(config, port=0):
+    """Serve a synthetic site on localhost in a background thread; returns (server, base_url, site)"""
+    site = SyntheticSite(config)
+    handler = type('Handler', (SyntheticHandler,), {'site': site})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", site
+
+
+if __name__ == '__main__':
+    server, base_url, site = serve_site(SiteConfig(), port=8766)
+    print(f"Serving a synthetic broker directory at {base_url}/brokers/brokers.aspx "
+          f"and {base_url}/forum/companies/business-brokers/, BizBuySell at {base_url}/business-brokers/directory/ "
+          f"(Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,171 @@
+"""Scaling and crash recovery of the shared work queue, with Axial workers against the synthetic site.
+
+    python bench/work_queue.py [--workers 1,2,4] [--pages N] [--per-page N] [--latency S] [--concurrency N]
+
+scaling   for each worker count, a fresh queue and output directory and
+          that many AxialScraper.run_queue() processes on the same queue
+          file; prints the wall time, firms saved and speed-up over the
+          first worker count. Result cards carry no microdata here, so
+          every firm costs a profile fetch.
+crash     one worker claims a task and dies without releasing it
+          (os._exit), then a healthy worker runs the crawl: the dead
+          worker's task must come back once its lease expires, and every
+          firm must still be saved exactly once.
+rerun     one worker crawls, then another runs on the same queue file:
+          the clean first crawl must have emptied the queue, so the second
+          walks the listings again instead of finding nothing to do.
+
+Each worker fetches --concurrency pages at a time, so N workers put N
+times that load on the site. Parsing is CPU-bound, so the speed-up
+flattens once every core is busy (the site shares them too). Exits 1 if a run saves the wrong number of
+firms or the crashed task is never finished.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_site import SiteConfig, serve_site, AXIAL_CATEGORIES
+
+LEASE_SECONDS = 3
+
+
+def axial_worker(base_url, workdir, queue_path, concurrency, worker):
+    """Child process: one AxialScraper pulling from the shared queue"""
+    import axial.engine as engine
+    from common.work_queue import WorkQueue
+
+    os.chdir(workdir)
+    logging.disable(logging.CRITICAL)
+    engine.BASE_URL = f"{base_url}/forum/companies/"
+    scraper = engine.AxialScraper(list(AXIAL_CATEGORIES), output_name='axial_queue', debug=False,
+                                  concurrency=concurrency, per_host_limit=concurrency, worker=worker)
+    scraper.scrape_profile = lambda name, url: None  # The injected 500s would go to Chrome
+    scraper.run_queue(WorkQueue(queue_path, lease_seconds=LEASE_SECONDS))
+
+
+def dying_worker(queue_path):
+    """Child process: claim one task and die holding its lease"""
+    from common.work_queue import WorkQueue
+    queue = WorkQueue(queue_path, lease_seconds=LEASE_SECONDS)
+    queue.put_many([('category', slug, {'slug': slug}) for slug in AXIAL_CATEGORIES])
+    queue.claim('dead-worker')
+    os._exit(1)
+
+
+def saved_firms(workdir):
+    from common.store import RecordStore
+    from axial.engine import COLUMNS
+    store = RecordStore(os.path.join(workdir, 'axial_queue.db'), COLUMNS, key_column='Company Name')
+    try:
+        return store.count()
+    finally:
+        store.close()
+
+
+def run_workers(base_url, workers, concurrency, before=None, runs=1):
+    """Seconds for `workers` processes to drain a fresh queue (`runs` times over), the firms saved, the queue
+    counts and how many tasks were ever queued on the file"""
+    from axial.engine import USER_AGENTS
+    from common.checkpoint import atomic_write
+    from common.work_queue import WorkQueue
+
+    context = multiprocessing.get_context('spawn')
+    workdir = tempfile.mkdtemp(prefix='queue-bench-')
+    queue_path = os.path.join(workdir, 'queue.db')
+    try:
+        # A saved session lets every worker skip the browser login
+        atomic_write(os.path.join(workdir, 'axial_session.json'), json.dumps({
+            'user_agent': USER_AGENTS[0],
+            'saved_at': time.time(),
+            'cookies': [{'name': 'axial_access', 'value': 'granted', 'path': '/', 'domain': '127.0.0.1'}],
+        }))
+        if before:
+            process = context.Process(target=before, args=(queue_path,))
+            process.start()
+            process.join()
+        start = time.perf_counter()
+        for _ in range(runs):
+            processes = [context.Process(target=axial_worker, args=(base_url, workdir, queue_path, concurrency,
+                                                                    f"worker-{idx}"))
+                         for idx in range(workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        seconds = time.perf_counter() - start
+        queue = WorkQueue(queue_path)
+        counts = queue.counts()
+        queued = queue.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'tasks'").fetchone()[0]
+        queue.close()
+        return seconds, saved_firms(workdir), counts, queued
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work queue scaling and crash recovery')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--pages', type=int, default=4, help='result pages per Axial category')
+    parser.add_argument('--per-page', type=int, default=50, help='firms per result page')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the site sleeps per request')
+    parser.add_argument('--concurrency', type=int, default=2, help='pages each worker fetches at once')
+    parser.add_argument('--heavy', action='store_true',
+                        help='pad pages to the size of the saved captures (the site then limits scaling)')
+    args = parser.parse_args()
+
+    config = SiteConfig(pages=args.pages, per_page=args.per_page, latency=args.latency, error_rate=0.0,
+                        listing_detail=0.0, realistic_weight=args.heavy)
+    # Every tenth firm is listed in both categories
+    expected = len(AXIAL_CATEGORIES) * args.pages * args.per_page - args.pages * ((args.per_page + 9) // 10)
+    server, base_url, site = serve_site(config)
+    failures = []
+    try:
+        baseline = None
+        single_queued = None
+        for workers in [int(n) for n in args.workers.split(',')]:
+            site.reset_counters()
+            seconds, saved, counts, queued = run_workers(base_url, workers, args.concurrency)
+            baseline = baseline or seconds
+            single_queued = single_queued or queued
+            print(f"{workers} workers  {seconds:6.2f}s  {saved} firms saved  {site.requests} requests  "
+                  f"speed-up {baseline / seconds:4.2f}x  ({sum(counts.values())} tasks left in the queue)")
+            if saved != expected:
+                failures.append(f"{workers} workers saved {saved} firms, expected {expected}")
+            if any(counts.values()):
+                failures.append(f"a clean crawl with {workers} workers left the queue at {counts}")
+
+        site.reset_counters()
+        seconds, saved, counts, _ = run_workers(base_url, 1, args.concurrency, before=dying_worker)
+        print(f"crash     {seconds:6.2f}s  {saved} firms saved after a worker died holding a "
+              f"{LEASE_SECONDS}s lease  ({counts['done']} done, {counts['leased']} leased, {counts['failed']} failed)")
+        if saved != expected or counts['leased'] or counts['pending'] or counts['failed']:
+            failures.append(f"after the crash: {saved} firms saved, queue {counts}")
+
+        seconds, saved, counts, queued = run_workers(base_url, 1, args.concurrency, runs=2)
+        # The second crawl finds every firm saved, but it still has to walk the categories again
+        print(f"rerun     {seconds:6.2f}s  {saved} firms saved, {queued} tasks queued over two crawls "
+              f"(one crawl queues {single_queued})")
+        if saved != expected or queued <= single_queued:
+            failures.append(f"the second crawl on a finished queue queued {queued - single_queued} tasks")
+    finally:
+        server.shutdown()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
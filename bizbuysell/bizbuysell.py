@@ -0,0 +1,307 @@
+import os
+import re
+import sys
+import json
+import math
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.http import make_session, fetch_html, post_json
+from common.throttle import RateController, THROTTLE_STATUSES
+from common.store import RecordStore
+from common.dedup import DedupIndex
+from common.metrics import METRICS
+from common.log import setup_logging
+from common.checkpoint import Checkpoint
+
+log = logging.getLogger('bizbuysell')
+
+SITE_URL = 'https://www.bizbuysell.com'
+DIRECTORY_PATH = '/business-brokers/directory/'
+# The directory is an Angular app: the server renders page 1 with the brokerSearch response embedded
+# in its transfer state (<script id="BBS-state">), and the app calls the same endpoint for other pages
+API_URL = 'https://api.bizbuysell.com/bff/v2/brokerSearch'
+SEARCH_KEY = 'api/bff/v2/brokerSearch'
+STATE_SCRIPT = re.compile(r'<script id="BBS-state" type="application/json">(.*?)</script>', re.S)
+SITE_ID = 20
+LANGUAGE_ID = 10
+
+COLUMNS = ['Broker ID', 'Broker Name', 'Company Name', 'Phone', 'Location', 'License Number', 'Website',
+           'Profile URL']
+
+
+def search_request(page):
+    """brokerSearch request body for a directory page; pages after the first have their number in the path"""
+    seo_name = DIRECTORY_PATH if page == 1 else f"{DIRECTORY_PATH}{page}/"
+    return {'siteId': SITE_ID, 'languageId': LANGUAGE_ID, 'queryString': '', 'seoName': seo_name}
+
+
+def read_transfer_state(page_html):
+    """The brokerSearch response embedded in a server-rendered directory page, or None"""
+    match = STATE_SCRIPT.search(page_html or '')
+    if not match:
+        return None
+    try:
+        state = json.loads(match.group(1))
+    except ValueError:
+        return None
+    for key, entry in state.items():
+        if key.startswith(SEARCH_KEY) and isinstance(entry, dict):
+            return entry
+    return None
+
+
+def search_results(response):
+    """(jwt, brokers, total, page size) from a brokerSearch response; None if it carries no results"""
+    value = (response or {}).get('value') or {}
+    result = value.get('brokerSearchResult') or {}
+    brokers = result.get('value')
+    if not isinstance(brokers, list):
+        return None
+    page_size = (value.get('criteria') or {}).get('howMany') or len(brokers)
+    return value.get('jwtToken'), brokers, result.get('total') or len(brokers), page_size
+
+
+def broker_record(broker, site_url=SITE_URL):
+    """One spreadsheet row from a brokerSearch result, using 'Not found' for anything missing"""
+    name = ' '.join(part for part in (broker.get('firstName'), broker.get('lastName')) if part)
+    profile = broker.get('url') or ''
+    return {
+        'Broker ID': str(broker.get('brokerProfileId') or 'Not found'),
+        'Broker Name': name or 'Not found',
+        'Company Name': (broker.get('companyName') or '').strip() or 'Not found',
+        'Phone': broker.get('telephone') or 'Not found',
+        'Location': broker.get('locationDescription') or 'Not found',
+        'License Number': broker.get('licenseNumber') or 'Not found',
+        'Website': broker.get('companyUrl') or 'Not found',
+        'Profile URL': site_url + profile if profile.startswith('/') else profile,
+    }
+
+
+class BizBuySellScraper:
+    """Broker directory from the JSON behind the Angular app, 30 brokers per request instead of a render per card"""
+
+    def __init__(self, concurrency=4, refresh=False, site_url=SITE_URL, api_url=API_URL):
+        self.concurrency = concurrency  # Directory pages requested at once
+        self.refresh = refresh  # Re-read every page and update changed records in place
+        self.site_url = site_url
+        self.api_url = api_url
+        self.output_dir = os.path.join(os.getcwd(), 'bizbuysell')
+        self.excel_path = os.path.join(self.output_dir, 'bizbuysell_brokers.xlsx')
+        self.db_path = os.path.join(self.output_dir, 'bizbuysell_brokers.db')
+        self.save_frequency = 30
+        self.data = []
+        self.session = None
+        self.token = None  # JWT the page hands the app for its API calls
+        self.rate = RateController(max_window=concurrency)
+        self.api_pages = 0
+        self.html_pages = 0  # Pages read from the server-rendered HTML because the API refused
+        self.lock = threading.RLock()
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+            log.info(f"Created output directory: {self.output_dir}")
+
+        self.store = RecordStore(self.db_path, COLUMNS, key_column='Profile URL')
+        if self.store.count() == 0 and os.path.exists(self.excel_path):
+            imported = self.store.import_xlsx(self.excel_path)
+            log.info(f"Imported {imported} brokers from {self.excel_path}")
+        self.saved_count = self.store.count()
+        self.changed_count = 0
+        if self.refresh:
+            self.processed_urls = DedupIndex(os.path.join(self.output_dir, 'refresh_urls.idx'))
+        else:
+            self.processed_urls = DedupIndex(os.path.join(self.output_dir, 'processed_urls.idx'),
+                                             self.store, ['Profile URL'])
+        if self.saved_count:
+            log.info(f"Loaded {self.saved_count} previously scraped brokers")
+        else:
+            log.info('Starting fresh — no existing record store found')
+
+        # Finished directory pages are checkpointed like states, so a restart skips them
+        self.checkpoint = Checkpoint(os.path.join(self.output_dir, 'refresh_progress' if refresh else 'progress'))
+        self.processed_urls.update(self.checkpoint.done_urls)
+        if self.checkpoint.has_progress():
+            log.info(f"Resuming crawl: {len(self.checkpoint.cursor['completed_states'])} pages already done")
+
+    def setup_session(self):
+        self.session = make_session(pool_size=self.concurrency)
+
+    def page_url(self, page):
+        return self.site_url + search_request(page)['seoName']
+
+    def save_progress(self, force=False):
+        count = len(self.data)
+        if count == 0:
+            return
+        if not force and count < self.save_frequency:
+            return
+
+        with self.lock, METRICS.timer('save'):
+            if self.refresh:
+                self.changed_count += self.store.append_many(self.data, replace=True)
+            else:
+                self.saved_count += self.store.append_many(self.data)
+            self.processed_urls.commit()
+            self.checkpoint.mark_profiles_done([record['Profile URL'] for record in self.data])
+            self.data.clear()
+        METRICS.count('records_saved', count)
+        if self.refresh:
+            log.info(f"→ Refreshed brokers, {self.changed_count} new or changed so far",
+                     extra={'changed': self.changed_count})
+        else:
+            log.info(f"→ Saved {self.saved_count} brokers", extra={'saved': self.saved_count})
+
+    def export_excel(self):
+        """Write the deliverable .xlsx from the record store in one streaming pass"""
+        with METRICS.timer('export'):
+            count = self.store.export_xlsx(self.excel_path)
+        log.info(f"Exported {count} brokers to {self.excel_path}")
+
+    def report(self):
+        log.info(f"Directory pages: {self.api_pages} from the API, {self.html_pages} from page HTML")
+        log.info(self.rate.report())
+
+    def finish_crawl(self):
+        """Forget crawl progress after a clean finish so the next run starts from the top"""
+        self.checkpoint.clear()
+        if self.refresh:
+            self.processed_urls.clear()
+
+    def read_page_html(self, page):
+        """A directory page's results from its server-rendered transfer state (also hands out a fresh JWT)"""
+        url = self.page_url(page)
+        with METRICS.timer('directory_page'):
+            page_html = fetch_html(self.session, url, rate=self.rate)
+        results = search_results(read_transfer_state(page_html))
+        if results is None:
+            log.warning(f"No broker search results embedded in {url}")
+            return None
+        with self.lock:
+            self.html_pages += 1
+            if results[0]:
+                self.token = results[0]
+        return results
+
+    def renew_token(self, stale):
+        """Fetch the first directory page for a new JWT, unless another thread already replaced `stale`"""
+        with self.lock:
+            if self.token == stale:
+                log.info('API token rejected; reading a new one from the directory page')
+                self.token = None
+                self.read_page_html(1)
+            return self.token
+
+    def fetch_page(self, page, attempts=3):
+        """(jwt, brokers, total, page size) for a directory page from the API, else from its HTML"""
+        token = self.token
+        for _ in range(attempts):
+            headers = {'Authorization': f"Bearer {token}", 'Origin': self.site_url,
+                       'Referer': self.page_url(page)} if token else None
+            with METRICS.timer('api_page'):
+                status, response = post_json(self.session, self.api_url, search_request(page), headers=headers,
+                                             rate=self.rate)
+            results = search_results(response)
+            if results is not None:
+                with self.lock:
+                    self.api_pages += 1
+                return results
+            if status in (401, 403):
+                renewed = self.renew_token(token)
+                if not renewed or renewed == token:
+                    break
+                token = renewed
+            elif status is not None and status not in THROTTLE_STATUSES:
+                break  # Not something a retry fixes: read the page itself instead
+        return self.read_page_html(page)
+
+    def record_page(self, page, brokers):
+        """Queue a page's brokers for saving, skipping ones already processed, then checkpoint the page"""
+        new = 0
+        with self.lock:
+            for broker in brokers:
+                record = broker_record(broker, self.site_url)
+                url = record['Profile URL']
+                if not url or url in self.processed_urls:
+                    continue
+                self.data.append(record)
+                self.processed_urls.add(url)
+                new += 1
+            self.save_progress(force=True)
+            self.checkpoint.mark_state_done(f"page {page}")
+        log.debug(f"Page {page}: {len(brokers)} brokers, {new} new")
+
+    def run(self):
+        """Main method to run the scraper"""
+        failed = []
+        try:
+            self.setup_session()
+
+            # Page 1 comes embedded in the directory page along with the JWT for the API
+            first = self.read_page_html(1)
+            if first is None:
+                log.warning("Couldn't read the broker directory. Exiting.")
+                return
+            _, brokers, total, page_size = first
+            pages = math.ceil(total / page_size) if page_size else 1
+            log.info(f"Directory lists {total} brokers on {pages} pages of {page_size}")
+            if not self.checkpoint.state_done('page 1'):
+                self.record_page(1, brokers)
+
+            todo = [page for page in range(2, pages + 1) if not self.checkpoint.state_done(f"page {page}")]
+            if pages > 1 and len(todo) < pages - 1:
+                log.info(f"{pages - 1 - len(todo)} pages already done, {len(todo)} to go")
+            # Pages are fetched in parallel and saved in order as they come back
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+                for page, results in zip(todo, pool.map(self.fetch_page, todo)):
+                    if results is None:
+                        failed.append(page)
+                        continue
+                    self.record_page(page, results[1])
+                    if page % 20 == 0:
+                        log.info(f"Finished page {page}/{pages}")
+
+            if failed:
+                log.warning(f"Gave up on {len(failed)} pages: {failed[:20]}; the next run retries them")
+            else:
+                self.finish_crawl()
+                log.info("Scraping completed!")
+        except Exception as e:
+            log.exception(f"Error running scraper: {str(e)}")
+        finally:
+            self.save_progress(force=True)
+            self.export_excel()
+            self.report()
+            if self.session:
+                self.session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape the BizBuySell broker directory')
+    parser.add_argument('--concurrency', type=int, default=4, help='Directory pages requested at once')
+    parser.add_argument('--refresh', action='store_true', help='Re-read every page and update changed brokers')
+    parser.add_argument('--site-url', default=SITE_URL, help='Site the directory pages are read from')
+    parser.add_argument('--api-url', default=API_URL, help='brokerSearch endpoint')
+    parser.add_argument('--export', action='store_true', help='Only export the record store to Excel')
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='Time each crawl stage and write bizbuysell.prom and a JSON summary to DIR')
+    parser.add_argument('--log-json', action='store_true', help='Log one JSON object per line')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG shows every page (default: INFO)')
+    args = parser.parse_args()
+
+    setup_logging(json_lines=args.log_json, level=args.log_level)
+    if args.metrics:
+        METRICS.enable(scraper='bizbuysell')
+    scraper = BizBuySellScraper(concurrency=args.concurrency, refresh=args.refresh, site_url=args.site_url,
+                                api_url=args.api_url)
+    try:
+        if args.export:
+            scraper.export_excel()
+        else:
+            scraper.run()
+    finally:
+        if args.metrics:
+            prom_path, summary_path = METRICS.write(args.metrics, 'bizbuysell')
+            log.info(f"Wrote metrics to {prom_path} and {summary_path}")
@@ -1,16 +1,41 @@
 import os
+import json
 import time
+import shutil
+import logging
+import sys
+import copy
 import random
-import pandas as pd
-from selenium import webdriver
+import argparse
+import threading
+from lxml import etree
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.http import make_session, copy_driver_cookies, fetch_html
+from common.throttle import RateController
+from common.browser import DEFAULT_BLOCKED, parse_block_list, lean_options, block_resources, wait_for_any, TransferMeter, start_chrome
+from common.fetcher import AsyncFetcher
+from common.worker_pool import WorkStealingPool
+from common.work_queue import WorkQueue, run_worker, worker_name
+from common.store import RecordStore
+from common.dedup import DedupIndex
+from common.cache import ResponseCache
+from common.metrics import METRICS
+from common.log import setup_logging
+from common.snapshot import PageSnapshot, node_text
+from common.checkpoint import Checkpoint, atomic_write
+from common.fingerprint import ListingFingerprints, card_digest, UNCHANGED
+from common.dead_letter import DeadLetterStore, CircuitBreaker, RetryScheduler
+from common.frontier import ProfileClassifier, ProfileFrontier
+from common.selector_resolver import SelectorResolver
+
+log = logging.getLogger('businessbroker')
 
 # Rotate through User-Agents for better scraping reliability
 USER_AGENTS = [
@@ -21,36 +46,187 @@ USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/112.0'
 ]
 
+COLUMNS = ['Broker Number', 'Broker Name', 'Company Name', 'Website', 'Profile URL']
+
+# XPath fallback chains per field. The resolver tries whichever selector has matched most
+# often on this site first. Static HTML has no browser-inserted <tbody>, so the name chain
+# carries a tbody-free variant for the HTTP fast path.
+SELECTORS = SelectorResolver('businessbroker.net')
+SELECTORS.register('Broker Number', [
+    "/html/body/main/div[1]/div/div/div[2]/div[1]/p",
+    "//div[contains(@class, 'broker-number')]/p",
+])
+SELECTORS.register('Broker Name', [
+    "/html/body/main/div[1]/div/div/table/tbody/tr/td/h1",
+    "/html/body/main/div[1]/div/div/table/tr/td/h1",
+    "//h1[contains(@class, 'broker-name')]",
+])
+SELECTORS.register('Company Name', [
+    "/html/body/main/div[1]/div/div/div[1]/h2",
+    "//h2[contains(@class, 'company-name')]",
+])
+SELECTORS.register('Website', ["/html/body/main/div[1]/div/div/div[2]/div[2]/a"], fallbacks=[
+    # Any outside link, header social links included: only for profiles the exact path misses
+    "//a[contains(@href, 'http') and not(contains(@href, 'businessbroker.net'))]",
+])
+# Listing pages: broker containers, then the "View broker profile" link inside each
+SELECTORS.register('Broker Container', ["//main/div[4]/div[3]/div/div"])
+SELECTORS.register('Profile Button', [
+    # Based on the example XPath /html/body/main/div[4]/div[3]/div/div[34]/div[2]/p[4]/a/span
+    ".//div[2]/p[4]/a/span[contains(text(), 'View broker profile')]",
+    ".//a[contains(., 'View broker profile')]",
+], fallbacks=[".//a[contains(@href, 'broker')]"])
+SELECTORS.register('Any Broker Link', ["//a[contains(@href, 'broker')]"])
+SELECTORS.register('Next Page', ["//a[contains(text(), 'Next')]"])
+# Profiles are /broker/<id>.aspx (or /broker/<id>/<slug>.aspx); state pages, navigation and
+# everything else that merely mentions "broker" never reaches the crawl frontier. Only tracking
+# query parameters are dropped, so profiles told apart by ?id= (or similar) stay apart
+PROFILE_URLS = ProfileClassifier(['businessbroker.net'], [r'/broker/[^/]+(?:/[^/]+)*\.aspx'], keep_query=None,
+                                 trailing_slash=False)
+PROFILE_KEYS_VERSION = 1  # Store version from which saved profile URLs are canonical
+PROFILE_FIELDS = ['Broker Number', 'Broker Name', 'Company Name']
+USA_HEADER_XPATH = "//h3[contains(text(), 'United States of America')]"
+
+
+def renamed(urls):
+    """(saved URL, canonical URL) for the URLs saved under another spelling"""
+    return [(url, PROFILE_URLS.canonical(url)) for url in urls if url and PROFILE_URLS.canonical(url) != url]
+
+
+def extract_broker_fields(snapshot, url):
+    """Read the profile fields from a page snapshot, using 'Not found' for anything missing"""
+    broker_info = {
+        'Broker Number': 'Not found',
+        'Broker Name': 'Not found',
+        'Company Name': 'Not found',
+        'Website': url  # Store the URL as the website
+    }
+    for field in PROFILE_FIELDS:
+        broker_info[field] = SELECTORS.text(snapshot, field, 'Not found')
+    website = SELECTORS.first(snapshot, 'Website')
+    if website is not None:
+        broker_info['Website'] = snapshot.link(website) or url
+    return broker_info
+
+
+def parse_broker_html(page_html, url):
+    """Parse a server-rendered profile page; returns None if the page doesn't look like a profile"""
+    try:
+        snapshot = PageSnapshot(page_html, url)
+    except (etree.ParserError, ValueError):
+        return None
+    broker_info = extract_broker_fields(snapshot, url)
+
+    # Without a name or company the page didn't render as a profile (captcha, JS shell, error page)
+    if broker_info['Broker Name'] == 'Not found' and broker_info['Company Name'] == 'Not found':
+        return None
+    return broker_info
+
 class BusinessBrokerScraper:
-    def __init__(self, debug=True):
+    def __init__(self, debug=True, fast=True, concurrency=8, per_host_limit=4, refresh=False, use_cache=True,
+                 blocked=DEFAULT_BLOCKED, page_load='eager', use_daemon=True, worker=None, refresh_all=False,
+                 retry_wait=120):
         self.debug = debug
+        self.fast = fast  # Fetch profiles over plain HTTP, falling back to Selenium
+        self.concurrency = concurrency  # Profiles in flight at once on the fast path
+        self.per_host_limit = per_host_limit  # Cap on simultaneous connections to one host
+        self.refresh = refresh  # Re-visit profiles and update changed records in place
+        self.refresh_all = refresh_all  # Refresh even the brokers whose listing card hasn't changed
         self.base_url = 'https://www.businessbroker.net/brokers/brokers.aspx'
         self.output_dir = os.path.join(os.getcwd(), 'businessbroker')
         self.excel_path = os.path.join(self.output_dir, 'business_brokers.xlsx')
+        self.db_path = os.path.join(self.output_dir, 'business_brokers.db')
+        self.selector_stats_path = os.path.join(self.output_dir, 'selector_stats.json')
+        self.deltas_dir = os.path.join(self.output_dir, 'deltas')
         self.save_frequency = 5
         self.data = []
         self.scraped_brokers = set()
         self.driver = None
-        self.processed_urls = set()  # Track processed URLs to avoid duplicates
+        self.session = None
+        self.blocked = tuple(blocked)  # Resource groups the browser refuses to load (common.browser)
+        self.page_load = page_load  # 'eager' returns at DOMContentLoaded; load_page waits for our selectors
+        self.meter = None  # Bytes per browser page, when metrics are on
+        self.use_daemon = use_daemon  # Attach to the browser daemon's warm Chrome when one is free
+        self.processed_urls = None  # On-disk index of processed URLs, opened with the store
+        # Paces browser loads and HTTP fetches per domain; shared with pool workers through copy.copy
+        self.rate = RateController(max_window=per_host_limit)
+        self.profile_latencies = []  # Seconds per profile fetched on the fast path
+        self.profile_chunk_size = 10  # Profiles per stealable task in the parallel pool
+        self.parent = None  # Set on pool workers; records are funnelled into the parent
+        self.lock = threading.RLock()
+        # Name in a shared work queue; each queue worker keeps its own progress and dedup index
+        self.worker = worker
+        self.progress_dir = self.output_dir
+        if worker:
+            self.progress_dir = os.path.join(self.output_dir, 'workers', worker.replace(':', '-'))
 
         # Create output directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
-            print(f"Created output directory: {self.output_dir}")
-
-        # Load existing data if available
-        if os.path.exists(self.excel_path):
-            df = pd.read_excel(self.excel_path)
-            # Track scraped brokers by their URL to avoid duplicates
-            if 'Website' in df.columns:
-                self.processed_urls = set(df['Website'].dropna().tolist())
-            self.existing_df = df
-            print(f"Loaded {len(df)} previously scraped brokers")
+            log.info(f"Created output directory: {self.output_dir}")
+        os.makedirs(self.progress_dir, exist_ok=True)
+
+        # Start from the selector order that worked on earlier runs
+        SELECTORS.load(self.selector_stats_path)
+
+        # Unchanged profiles are served from disk or revalidated with a 304 instead of re-downloaded
+        self.cache = ResponseCache(os.path.join(self.output_dir, 'http_cache')) if use_cache else None
+
+        # Records are appended to a SQLite store; the Excel file is exported from it
+        self.store = RecordStore(self.db_path, COLUMNS, key_column='Profile URL')
+        if self.store.count() == 0 and os.path.exists(self.excel_path):
+            imported = self.store.import_xlsx(self.excel_path)
+            log.info(f"Imported {imported} brokers from {self.excel_path}")
+        self.saved_count = self.store.count()
+        self.changed_count = 0
+        if self.refresh:
+            # A refresh re-visits everything, so only this refresh's own progress counts as processed
+            self.processed_urls = DedupIndex(os.path.join(self.progress_dir, 'refresh_urls.idx'))
+        else:
+            # Track scraped brokers by their URL to avoid duplicates, without loading every key
+            # (rows from older workbooks have no 'Profile URL', only 'Website')
+            self.processed_urls = DedupIndex(os.path.join(self.progress_dir, 'processed_urls.idx'),
+                                             self.store, ['Profile URL', 'Website'])
+        if self.saved_count:
+            log.info(f"Loaded {self.saved_count} previously scraped brokers")
         else:
-            self.existing_df = pd.DataFrame(columns=[
-                'Broker Number', 'Broker Name', 'Company Name', 'Website'
-            ])
-            print('Starting fresh — no existing Excel file found')
+            log.info('Starting fresh — no existing record store found')
+
+        # Digests of every listing page and card, shared by all workers: a refresh only re-visits
+        # brokers whose card changed, and each finished crawl reports who was added or removed
+        self.fingerprints = ListingFingerprints(os.path.join(self.output_dir, 'listing_fingerprints.db'))
+        # Canonical profile URLs queued this run, so nav links and repeats of a broker cost no page load
+        self.frontier = ProfileFrontier(PROFILE_URLS)
+
+        # Profiles that failed, with their error and retry schedule; retried before a run finishes or on the next one
+        self.dead_letters = DeadLetterStore(os.path.join(self.output_dir, 'dead_letters.db'), breaker=CircuitBreaker())
+        self.retry_wait = retry_wait  # Seconds a run waits for scheduled retries before leaving them to the next run
+
+        # Crawl position (state, page cursor, finished profiles) for resuming after a crash
+        self.checkpoint = Checkpoint(os.path.join(self.progress_dir, 'refresh_progress' if refresh else 'progress'))
+        self.canonicalize_saved_urls()
+        self.processed_urls.update(PROFILE_URLS.canonical(url) for url in self.checkpoint.done_urls)
+        if self.checkpoint.has_progress():
+            log.info(f"Resuming crawl: {len(self.checkpoint.cursor['completed_states'])} states already done")
+        self.pending_chunks = {}  # Parallel mode: profile chunks left per state
+
+    def canonicalize_saved_urls(self):
+        """Move profile URLs saved before links were canonicalized to their canonical spelling, once per store.
+
+        Covers the record store, the card fingerprints and the failed
+        profiles, so a crawl's canonical links find them; moved records get
+        new row ids, which every dedup index picks up on its next commit.
+        Checkpoints and queued tasks are canonicalized as they are read.
+        """
+        if self.store.version() >= PROFILE_KEYS_VERSION:
+            return
+        moved = self.store.rekey(renamed(self.store.keys()))
+        self.fingerprints.rekey(renamed(self.fingerprints.urls()))
+        self.dead_letters.rekey(renamed(row[0] for row in self.dead_letters.remaining()))
+        self.store.set_version(PROFILE_KEYS_VERSION)
+        if moved:
+            log.info(f"Moved {moved} saved brokers to their canonical profile URLs")
+            self.processed_urls.commit()
 
     def setup_driver(self):
         chrome_opts = Options()
@@ -63,18 +239,31 @@ class BusinessBrokerScraper:
         chrome_opts.add_experimental_option('prefs', {
             'profile.managed_default_content_settings.images': 2  # Don't load images
         })
-        chrome_opts.page_load_strategy = 'normal'
+        lean_options(chrome_opts, self.page_load, measure=METRICS.enabled)
         chrome_opts.add_argument(f"--user-agent={random.choice(USER_AGENTS)}")
 
-        svc = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=svc, options=chrome_opts)
+        with METRICS.timer('driver_start'):
+            # Attaches to a warm instance when the browser daemon is running (common.browser_daemon)
+            self.driver = start_chrome(chrome_opts, use_daemon=self.use_daemon)
+        if self.blocked:
+            block_resources(self.driver, self.blocked)
+        self.meter = TransferMeter(self.driver, bool(self.blocked)) if METRICS.enabled else None
         self.wait = WebDriverWait(self.driver, 10)
-        print(f'WebDriver setup complete (headless={not self.debug})')
+        log.info(f'WebDriver setup complete (headless={not self.debug})')
+
+    def setup_session(self):
+        """Create the pooled keep-alive HTTP session used by the fast path"""
+        self.session = make_session()
+        # Reuse the browser's cookies (consent, load balancer) when a driver is running
+        if self.driver:
+            self.session.headers['User-Agent'] = self.driver.execute_script('return navigator.userAgent;')
+            copy_driver_cookies(self.driver, self.session)
+        log.info('HTTP session setup complete')
 
     def scroll_to_element(self, element):
         """Scroll element into view using JavaScript"""
         self.driver.execute_script("arguments[0].scrollIntoView(true);", element)
-        time.sleep(0.5)  # Give time for any animations to complete
+        METRICS.pause(0.5)  # Give time for any animations to complete
 
     def click_with_retry(self, element, max_attempts=3):
         """Attempt to click an element with multiple retry strategies"""
@@ -92,8 +281,8 @@ class BusinessBrokerScraper:
                     self.driver.execute_script("arguments[0].click();", element)
                 return True
             except Exception as e:
-                print(f"Click attempt {attempt + 1} failed: {str(e)}")
-                time.sleep(1)
+                log.debug(f"Click attempt {attempt + 1} failed: {str(e)}")
+                METRICS.pause(1)
         return False
 
     def handle_cookies(self):
@@ -103,9 +292,9 @@ class BusinessBrokerScraper:
                 EC.element_to_be_clickable((By.XPATH, "//button[text()='Allow']"))
             )
             cookie_btn.click()
-            time.sleep(1)
+            METRICS.pause(1)
         except TimeoutException:
-            print("No cookie consent dialog found or already accepted")
+            log.debug("No cookie consent dialog found or already accepted")
             pass
 
     def save_progress(self, force=False):
@@ -115,12 +304,110 @@ class BusinessBrokerScraper:
         if not force and count < self.save_frequency:
             return
         
-        df_new = pd.DataFrame(self.data)
-        combined = pd.concat([self.existing_df, df_new], ignore_index=True)
-        combined.to_excel(self.excel_path, index=False)
-        self.existing_df = combined
-        self.data.clear()
-        print(f"→ Saved {len(combined)} brokers")
+        with self.lock, METRICS.timer('save'):
+            if self.refresh:
+                self.changed_count += self.store.append_many(self.data, replace=True)
+            else:
+                self.saved_count += self.store.append_many(self.data)
+                self.processed_urls.update(record['Website'] for record in self.data if record.get('Website'))
+            self.processed_urls.commit()
+            # Only mark profiles done once their records are durable
+            urls = [record.get('Profile URL') for record in self.data]
+            self.checkpoint.mark_profiles_done(urls)
+            self.dead_letters.resolve_many(urls)
+            # Their cards now match what was saved, so the next refresh can skip them while they stay the same
+            self.fingerprints.mark_visited(urls)
+            self.data.clear()
+        METRICS.count('records_saved', count)
+        if self.refresh:
+            log.info(f"→ Refreshed brokers, {self.changed_count} new or changed so far",
+                     extra={'changed': self.changed_count})
+        else:
+            log.info(f"→ Saved {self.saved_count} brokers", extra={'saved': self.saved_count})
+
+    def export_excel(self):
+        """Write the deliverable .xlsx from the record store in one streaming pass"""
+        with METRICS.timer('export'):
+            count = self.store.export_xlsx(self.excel_path)
+        log.info(f"Exported {count} brokers to {self.excel_path}")
+
+    def save_selector_stats(self):
+        """Persist the learned selector order and log this run's selector, cache and rate-control reports"""
+        SELECTORS.save(self.selector_stats_path)
+        log.info(SELECTORS.report())
+        if self.cache:
+            log.info(self.cache.report())
+        log.info(self.rate.report())
+        if self.meter:
+            log.info(self.meter.report())
+        log.info(self.frontier.report())
+        log.info(self.dead_letters.breaker.report())
+        log.info(self.dead_letters.report())
+
+    def finish_crawl(self, report_delta=True):
+        """Forget crawl progress after a clean finish so the next run starts from the top"""
+        if report_delta:
+            self.report_delta()
+        self.checkpoint.clear()
+        if self.refresh:
+            self.processed_urls.clear()
+
+    def delta_entry(self, url):
+        record = self.store.get(url) or {}
+        return {'Profile URL': url, 'Broker Name': record.get('Broker Name'), 'Company Name': record.get('Company Name')}
+
+    def listing_complete(self, states):
+        """True if every state's listing was walked, so a broker missing from all of them really left"""
+        unlisted = [state['name'] for state in states if not self.checkpoint.state_done(state['name'])]
+        if unlisted:
+            log.warning(f"Not reporting the listing delta yet: {len(unlisted)} states weren't listed "
+                        f"({', '.join(unlisted[:5])})")
+        return not unlisted
+
+    def report_delta(self):
+        """Write who was added, changed or removed in the listings since the last finished crawl to deltas/"""
+        delta = self.fingerprints.finish_run()
+        if delta is None:
+            return  # Another queue worker closed the run
+        for kind in ('added', 'changed', 'removed'):
+            delta[kind] = [self.delta_entry(url) for url in delta[kind]]
+        os.makedirs(self.deltas_dir, exist_ok=True)
+        path = os.path.join(self.deltas_dir, time.strftime('delta_%Y%m%d_%H%M%S.json', time.localtime(delta['finished'])))
+        atomic_write(path, json.dumps(delta, indent=1))
+        log.info(f"Listing delta since the last crawl: {len(delta['added'])} brokers added, {len(delta['changed'])} "
+                 f"changed, {len(delta['removed'])} removed; {delta['pages_seen'] - delta['pages_changed']}/"
+                 f"{delta['pages_seen']} listing pages unchanged. Wrote {path}")
+
+    def load_page(self, url, ready=None):
+        """Load url in the browser at the domain's pace, snapshot it and feed the outcome to the rate controller.
+
+        `ready` is a list of XPaths; the snapshot is taken once any of them
+        matches (or after 10 s), which is all an eager page load waits for.
+        """
+        self.rate.wait(url)
+        start = time.perf_counter()
+        try:
+            with METRICS.timer('driver_get'):
+                self.driver.get(url)
+        except TimeoutException:
+            self.rate.record(url, error=True)
+            raise
+        if ready and not wait_for_any(self.driver, ready):
+            log.debug(f"None of the expected elements appeared on {url}")
+        latency = time.perf_counter() - start
+        snapshot = PageSnapshot.capture(self.driver)
+        self.rate.record(url, latency=latency, page_html=snapshot.html)
+        if self.meter:
+            self.meter.take(latency)
+        return snapshot
+
+    @staticmethod
+    def listing_ready():
+        return SELECTORS.chains['Broker Container'] + SELECTORS.chains['Next Page']
+
+    @staticmethod
+    def profile_ready():
+        return SELECTORS.chains['Broker Name'] + SELECTORS.chains['Company Name']
 
     def get_states(self):
         """Get list of all states with retry mechanism"""
@@ -128,21 +415,20 @@ class BusinessBrokerScraper:
         for attempt in range(max_attempts):
             try:
                 # Navigate to the base URL
-                self.driver.get(self.base_url)
-                time.sleep(random.uniform(2, 5))
+                self.load_page(self.base_url, ready=[USA_HEADER_XPATH])
                 
                 # Handle any cookie consent dialogs
                 self.handle_cookies()
                 
                 # Wait for the USA section header
                 usa_header = self.wait.until(
-                    EC.presence_of_element_located((By.XPATH, "//h3[contains(text(), 'United States of America')]"))
+                    EC.presence_of_element_located((By.XPATH, USA_HEADER_XPATH))
                 )
                 self.scroll_to_element(usa_header)
                 
                 # Wait for state links to be present
                 state_links = self.wait.until(
-                    EC.presence_of_all_elements_located((By.XPATH, "//h3[contains(text(), 'United States of America')]/following-sibling::ul[1]/li/a"))
+                    EC.presence_of_all_elements_located((By.XPATH, f"{USA_HEADER_XPATH}/following-sibling::ul[1]/li/a"))
                 )
                 
                 # Store state names and URLs
@@ -153,291 +439,662 @@ class BusinessBrokerScraper:
                         url = link.get_attribute('href')
                         if name and url:
                             states.append({'name': name, 'url': url})
-                            print(f"Found state: {name}")
+                            log.debug(f"Found state: {name}")
                     except StaleElementReferenceException:
                         continue
                 
-                print(f"Found {len(states)} states")
+                log.info(f"Found {len(states)} states")
                 return states
             except Exception as e:
-                print(f"Attempt {attempt + 1} to get states failed: {str(e)}")
+                log.warning(f"Attempt {attempt + 1} to get states failed: {str(e)}")
                 if attempt < max_attempts - 1:
-                    print("Refreshing page and retrying...")
-                    self.driver.refresh()
-                    time.sleep(random.uniform(2, 5))
+                    # Missing elements may mean a block page: slow down before loading it again
+                    log.info("Reloading page and retrying...")
+                    self.rate.record(self.base_url, error=True)
         return []
 
-    def get_broker_listings(self, state_url):
-        """Get all broker listings from a state page"""
+    def collect_profile_links(self, snapshot, broker_listings, page=1, state_name=None):
+        """Append the profile URLs in a listing page snapshot that need a visit to broker_listings.
+
+        With a state_name the page's cards are fingerprinted, and a refresh
+        skips saved brokers whose card is the same as on the last crawl.
+        Returns how many profile links the page had, visited or not.
+        """
+        on_page = f" on page {page}" if page > 1 else ""
+        broker_containers = SELECTORS.find_all(snapshot, 'Broker Container')
+        log.debug(f"Found {len(broker_containers)} potential broker containers{on_page}")
+        
+        # For each container, look for the "View broker profile" button
+        cards = {}  # Canonical profile URL -> digest of its card
+        skipped = 0
+        unrecognised = self.frontier.unrecognised
+        for idx, container in enumerate(broker_containers):
+            try:
+                for button in SELECTORS.find_all(snapshot, 'Profile Button', context=container):
+                    # Get the parent <a> tag that contains the href
+                    parent_a = button if button.tag == 'a' else next(button.iterancestors('a'), None)
+                    href = snapshot.link(parent_a) if parent_a is not None else None
+                    if not href:
+                        continue
+                    # A link labelled as the profile is one, whatever its path looks like
+                    url = self.frontier.classify(href, snapshot.url, 'View broker profile' in node_text(parent_a))
+                    if url:
+                        cards.setdefault(url, card_digest(container))
+                        log.debug(f"Found broker profile #{idx}{on_page}: {url}")
+                    else:
+                        skipped += 1
+            except Exception as e:
+                log.warning(f"Error processing broker container {idx}{on_page}: {str(e)}")
+        if skipped and not cards:
+            log.warning(f"None of the {skipped} profile buttons{on_page} link to a /broker/ profile URL; "
+                        f"check PROFILE_URLS against the site")
+        if skipped or self.frontier.unrecognised != unrecognised:
+            self.save_capture(snapshot, state_name)
+
+        statuses = {}
+        if state_name and cards:
+            page_changed, statuses = self.fingerprints.check_page(state_name, page, list(cards.items()))
+            if not page_changed:
+                log.debug(f"{state_name} listing page {page} is unchanged since the last crawl")
+        for url in cards:
+            if url in self.processed_urls:
+                continue
+            if (self.refresh and not self.refresh_all and statuses.get(url) == UNCHANGED
+                    and self.store.get(url) is not None):
+                METRICS.count('profiles_unchanged')
+                continue
+            if self.frontier.add(url, state_name):
+                broker_listings.append(url)
+        return len(cards)
+
+    def save_capture(self, snapshot, state_name=None):
+        """Keep one listing page whose profile links PROFILE_URLS doesn't know, to fix it against"""
+        path = os.path.join(self.output_dir, f"listing_{(state_name or 'page').replace(' ', '_')}.html")
+        if os.path.exists(path):
+            return
+        # bench/profile_urls.py reads the page's URL back from the first line
+        atomic_write(path, f"<!-- {snapshot.url} -->\n{snapshot.html}")
+        log.warning(f"Saved the listing page to {path}; copy it to bench/fixtures/businessbroker/ as a capture")
+
+    def collect_any_profile_links(self, snapshot, broker_listings, state_name=None):
+        """Fallback for pages without broker cards: any link mentioning "broker" that is a profile URL"""
+        for link in SELECTORS.find_all(snapshot, 'Any Broker Link'):
+            url = self.frontier.classify(snapshot.link(link), snapshot.url)
+            if url and url not in self.processed_urls and self.frontier.add(url, state_name):
+                broker_listings.append(url)
+                log.debug(f"Found broker profile (alt method): {url}")
+
+    def next_page_url(self, snapshot):
+        """href of the Next link if it is a real URL (lets a resumed crawl jump straight to it)"""
+        node = snapshot.first(SELECTORS.chains['Next Page'])
+        return snapshot.link(node) if node is not None else None
+
+    def get_broker_listings(self, state_url, state_name=None):
+        """Get all broker listings from a state page, resuming after the last checkpointed page"""
+        resume = self.checkpoint.resume_point(state_name) if state_name else None
         try:
-            # Navigate to state URL
-            self.driver.get(state_url)
-            time.sleep(random.uniform(2, 5))
-            
-            # Find all broker listings
-            broker_listings = []
+            if resume:
+                # Jump straight to the first unfinished page
+                page, next_url, saved = resume
+                saved = [PROFILE_URLS.canonical(url) for url in saved]
+                page += 1
+                self.frontier.mark(saved, state_name)
+                log.info(f"Resuming {state_name} at page {page}")
+                snapshot = self.load_page(next_url, ready=self.listing_ready())
+                broker_listings = list(saved)
+            else:
+                # A walk from the top (again, after a failure) re-queues whatever the last one did
+                self.frontier.forget(state_name)
+                # Navigate to state URL
+                snapshot = self.load_page(state_url, ready=self.listing_ready())
+                page = 1
+                broker_listings = []
             
-            # Using a more general XPath pattern based on the provided example
-            # The pattern looks for all div elements that might contain broker listings
             try:
-                # First, find all potential broker container divs
-                broker_containers = self.driver.find_elements(By.XPATH, "//main/div[4]/div[3]/div/div")
-                print(f"Found {len(broker_containers)} potential broker containers")
-                
-                # For each container, look for the "View broker profile" button
-                for idx, container in enumerate(broker_containers):
-                    try:
-                        # Try to find the view profile button using a more specific XPath
-                        # This is based on the example XPath: /html/body/main/div[4]/div[3]/div/div[34]/div[2]/p[4]/a/span
-                        # But generalized to work with any div index
-                        profile_buttons = container.find_elements(By.XPATH, ".//div[2]/p[4]/a/span[contains(text(), 'View broker profile')]")
-                        
-                        # If that doesn't work, try a more general approach
-                        if not profile_buttons:
-                            profile_buttons = container.find_elements(By.XPATH, ".//a[contains(., 'View broker profile')]")
-                        
-                        # If that still doesn't work, try an even more general approach
-                        if not profile_buttons:
-                            profile_buttons = container.find_elements(By.XPATH, ".//a[contains(@href, 'broker')]")
-                        
-                        for button in profile_buttons:
-                            # Get the parent <a> tag that contains the href
-                            parent_a = button
-                            if button.tag_name != 'a':
-                                parent_a = button.find_element(By.XPATH, "./ancestor::a")
-                            
-                            url = parent_a.get_attribute('href')
-                            if url and url not in self.processed_urls:
-                                broker_listings.append(url)
-                                print(f"Found broker profile #{idx}: {url}")
-                    except Exception as e:
-                        print(f"Error processing broker container {idx}: {str(e)}")
+                # One page_source round-trip; every container and fallback XPath then runs locally
+                found = self.collect_profile_links(snapshot, broker_listings, page, state_name)
                 
                 # If we still haven't found any listings, try a completely different approach
-                if not broker_listings:
-                    print("Trying alternative approach to find broker listings...")
-                    # Look for any links that might be broker profile links
-                    all_links = self.driver.find_elements(By.XPATH, "//a[contains(@href, 'broker')]")
-                    for link in all_links:
-                        url = link.get_attribute('href')
-                        if url and 'broker' in url and url not in self.processed_urls:
-                            broker_listings.append(url)
-                            print(f"Found broker profile (alt method): {url}")
+                if not found and not broker_listings:
+                    log.info("Trying alternative approach to find broker listings...")
+                    self.collect_any_profile_links(snapshot, broker_listings, state_name)
+                if state_name:
+                    self.checkpoint.save_page(state_name, page, self.next_page_url(snapshot), broker_listings)
                 
                 # Handle pagination
-                self.process_pagination(broker_listings)
+                self.process_pagination(broker_listings, state_name, page)
                 
                 return broker_listings
                 
             except Exception as e:
-                print(f"Error finding broker listings: {str(e)}")
+                log.warning(f"Error finding broker listings: {str(e)}")
                 return []
                 
         except Exception as e:
-            print(f"Error getting broker listings: {str(e)}")
+            log.warning(f"Error getting broker listings: {str(e)}")
             return []
 
-    def process_pagination(self, broker_listings):
+    def process_pagination(self, broker_listings, state_name=None, page=1):
         """Process pagination to get all broker listings"""
-        page = 1
         while True:
             try:
-                # Look for the next page button
-                next_button = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Next')]")
+                # Look for the next page button (find_elements returns at once if there is none)
+                next_buttons = SELECTORS.find_live(self.driver, 'Next Page')
+                if not next_buttons:
+                    log.debug("No more pages")
+                    break
+                next_button = next_buttons[0]
                 if not next_button.is_displayed() or not next_button.is_enabled():
                     break
                 
                 page += 1
-                print(f"Moving to page {page}")
+                log.debug(f"Moving to page {page}")
                 
                 # Click the next button
+                url = self.driver.current_url
+                self.rate.wait(url)
+                start = time.perf_counter()
                 if not self.click_with_retry(next_button):
-                    print(f"Failed to click next button for page {page}")
+                    log.warning(f"Failed to click next button for page {page}")
                     break
                 
-                # Wait for the page to load
-                time.sleep(random.uniform(2, 5))
+                # Wait for the page to load: the old Next button goes stale once the new page replaces it
+                try:
+                    self.wait.until(EC.staleness_of(next_button))
+                except TimeoutException:
+                    self.rate.record(url, error=True)
+                    log.warning(f"Page {page} did not load")
+                    break
+                wait_for_any(self.driver, self.listing_ready())
                 
                 # Find broker elements on the new page using the same approach as before
                 try:
-                    broker_containers = self.driver.find_elements(By.XPATH, "//main/div[4]/div[3]/div/div")
-                    print(f"Found {len(broker_containers)} potential broker containers on page {page}")
-                    
-                    for idx, container in enumerate(broker_containers):
-                        try:
-                            # Try specific XPath first
-                            profile_buttons = container.find_elements(By.XPATH, ".//div[2]/p[4]/a/span[contains(text(), 'View broker profile')]")
-                            
-                            # If that doesn't work, try more general approaches
-                            if not profile_buttons:
-                                profile_buttons = container.find_elements(By.XPATH, ".//a[contains(., 'View broker profile')]")
-                            
-                            if not profile_buttons:
-                                profile_buttons = container.find_elements(By.XPATH, ".//a[contains(@href, 'broker')]")
-                            
-                            for button in profile_buttons:
-                                # Get the parent <a> tag that contains the href
-                                parent_a = button
-                                if button.tag_name != 'a':
-                                    parent_a = button.find_element(By.XPATH, "./ancestor::a")
-                                
-                                url = parent_a.get_attribute('href')
-                                if url and url not in self.processed_urls:
-                                    broker_listings.append(url)
-                                    print(f"Found broker profile #{idx} on page {page}: {url}")
-                        except Exception as e:
-                            print(f"Error processing broker container {idx} on page {page}: {str(e)}")
-                    
+                    snapshot = PageSnapshot.capture(self.driver)
+                    self.rate.record(url, latency=time.perf_counter() - start, page_html=snapshot.html)
+                    if self.meter:
+                        self.meter.take(time.perf_counter() - start)
+                    self.collect_profile_links(snapshot, broker_listings, page, state_name)
+                    if state_name:
+                        self.checkpoint.save_page(state_name, page, self.next_page_url(snapshot), broker_listings)
                 except Exception as e:
-                    print(f"Error finding broker listings on page {page}: {str(e)}")
+                    log.warning(f"Error finding broker listings on page {page}: {str(e)}")
                     break
                 
-            except NoSuchElementException:
-                print("No more pages")
-                break
             except Exception as e:
-                print(f"Error processing pagination: {str(e)}")
+                log.warning(f"Error processing pagination: {str(e)}")
                 break
 
-    def extract_broker_info(self, url):
-        """Extract information from a broker profile page"""
+    def state_listings(self, state):
+        """Profile URLs still to visit for a state, from the checkpoint if its listing was already walked"""
+        broker_listings = self.checkpoint.saved_listing(state['name'])
+        if broker_listings is None:
+            broker_listings = self.get_broker_listings(state['url'], state['name'])
+            # A walk that found broker cards is complete even if none of them needs a visit
+            if broker_listings or self.fingerprints.listed(state['name']):
+                self.checkpoint.finish_listing(state['name'], broker_listings)
+        else:
+            broker_listings = [PROFILE_URLS.canonical(url) for url in broker_listings]
+            self.frontier.mark(broker_listings, state['name'])
+            log.info(f"Using {len(broker_listings)} checkpointed listings for {state['name']}")
+        return [url for url in broker_listings if url not in self.processed_urls]
+
+    def fetch_broker_info(self, url):
+        """Extract broker information over plain HTTP; returns None if the page can't be parsed"""
+        if self.session is None:
+            self.setup_session()
+        page_html = fetch_html(self.session, url, cache=self.cache, rate=self.rate)
+        if page_html is None:
+            return None
+        broker_info = parse_broker_html(page_html, url)
+        if broker_info is None and self.cache:
+            self.cache.discard(url)
+        return broker_info
+
+    def extract_broker_info(self, url, allow_http=True):
+        """Extract information from a broker profile page, preferring the HTTP fast path"""
+        if self.fast and allow_http:
+            broker_info = self.fetch_broker_info(url)
+            if broker_info:
+                log.debug(f"Extracted broker info (http): {broker_info}")
+                return broker_info
+            log.warning(f"HTTP parse failed, falling back to browser: {url}")
+        if self.driver is None:
+            self.setup_driver()
+        return self.extract_broker_info_browser(url)
+
+    def extract_broker_info_browser(self, url):
+        """Extract information from a broker profile page using Selenium"""
         try:
-            # Navigate to the broker profile page
-            self.driver.get(url)
-            time.sleep(random.uniform(2, 5))
-            
-            # Initialize broker info dictionary
-            broker_info = {
-                'Broker Number': 'Not found',
-                'Broker Name': 'Not found',
-                'Company Name': 'Not found',
-                'Website': url  # Store the URL as the website
-            }
-            
-            # Extract broker number using the provided XPath
-            try:
-                broker_number_element = self.driver.find_element(By.XPATH, "/html/body/main/div[1]/div/div/div[2]/div[1]/p")
-                broker_info['Broker Number'] = broker_number_element.text.strip()
-            except NoSuchElementException:
-                # Try alternative XPath
-                try:
-                    broker_number_element = self.driver.find_element(By.XPATH, "//div[contains(@class, 'broker-number')]/p")
-                    broker_info['Broker Number'] = broker_number_element.text.strip()
-                except:
-                    print("Broker number not found")
-            
-            # Extract broker name using the provided XPath
-            try:
-                broker_name_element = self.driver.find_element(By.XPATH, "/html/body/main/div[1]/div/div/table/tbody/tr/td/h1")
-                broker_info['Broker Name'] = broker_name_element.text.strip()
-            except NoSuchElementException:
-                # Try alternative XPath
-                try:
-                    broker_name_element = self.driver.find_element(By.XPATH, "//h1[contains(@class, 'broker-name')]")
-                    broker_info['Broker Name'] = broker_name_element.text.strip()
-                except:
-                    print("Broker name not found")
-            
-            # Extract company name using the provided XPath
-            try:
-                company_name_element = self.driver.find_element(By.XPATH, "/html/body/main/div[1]/div/div/div[1]/h2")
-                broker_info['Company Name'] = company_name_element.text.strip()
-            except NoSuchElementException:
-                # Try alternative XPath
-                try:
-                    company_name_element = self.driver.find_element(By.XPATH, "//h2[contains(@class, 'company-name')]")
-                    broker_info['Company Name'] = company_name_element.text.strip()
-                except:
-                    print("Company name not found")
-            
-            # Extract website using the provided XPath
-            try:
-                website_element = self.driver.find_element(By.XPATH, "/html/body/main/div[1]/div/div/div[2]/div[2]/a")
-                website_url = website_element.get_attribute('href')
-                if website_url:
-                    broker_info['Website'] = website_url
-            except NoSuchElementException:
-                # Try alternative XPath
-                try:
-                    website_element = self.driver.find_element(By.XPATH, "//a[contains(@href, 'http') and not(contains(@href, 'businessbroker.net'))]")
-                    website_url = website_element.get_attribute('href')
-                    if website_url:
-                        broker_info['Website'] = website_url
-                except:
-                    print("Website not found")
+            # A page rendered recently enough is re-parsed from the cache instead of reloaded
+            cached = self.cache.get_fresh('rendered:' + url) if self.cache else None
+            if cached is not None:
+                broker_info = parse_broker_html(cached, url)
+                if broker_info:
+                    log.debug(f"Extracted broker info (cached): {broker_info}")
+                    return broker_info
+
+            # Navigate to the broker profile page and snapshot the DOM once;
+            # all the XPath fallback chains then run locally
+            snapshot = self.load_page(url, ready=self.profile_ready())
+            broker_info = extract_broker_fields(snapshot, url)
+            missing = [field for field, value in broker_info.items() if value == 'Not found']
+            if broker_info['Broker Name'] == 'Not found' and broker_info['Company Name'] == 'Not found':
+                # Not a profile (block page, error page, still loading): retry it later rather than save junk
+                self.dead_letters.record(url, 'EmptyProfile', 'no broker or company name', kind='profile')
+                return None
+            if missing:
+                log.warning(f"Not found: {', '.join(missing)}")
+            elif self.cache:
+                self.cache.put('rendered:' + url, snapshot.html)
             
-            print(f"Extracted broker info: {broker_info}")
+            log.debug(f"Extracted broker info: {broker_info}")
             return broker_info
             
         except Exception as e:
-            print(f"Error extracting broker info: {str(e)}")
+            log.warning(f"Error extracting broker info: {str(e)}")
+            self.dead_letters.record(url, e.__class__.__name__, str(e), kind='profile')
             return None
 
+    def record_broker(self, listing_url, broker_info):
+        """Queue an extracted broker for saving and mark its profile URL as processed"""
+        if self.parent:
+            return self.parent.record_broker(listing_url, broker_info)
+        with self.lock:
+            # Brokers listed under several states are only kept once
+            if listing_url in self.processed_urls:
+                return
+            self.data.append(dict(broker_info, **{'Profile URL': listing_url}))
+            self.processed_urls.add(listing_url)
+            if len(self.data) >= self.save_frequency:
+                self.save_progress()
+
+    def process_listings(self, broker_listings, state_name, allow_http=True):
+        """Visit broker profiles one at a time"""
+        for listing_idx, listing_url in enumerate(broker_listings, 1):
+            log.debug(f"Processing broker {listing_idx}/{len(broker_listings)} from {state_name}")
+            
+            # Extract broker information
+            broker_info = self.extract_broker_info(listing_url, allow_http=allow_http)
+            if broker_info:
+                self.record_broker(listing_url, broker_info)
+
+    def fetch_brokers_concurrently(self, broker_listings, state_name):
+        """Fetch broker profiles over HTTP in parallel, retrying unparseable ones in the browser"""
+        cookies = {}
+        if self.driver:
+            cookies = {c['name']: c['value'] for c in self.driver.get_cookies()}
+        fetcher = AsyncFetcher(concurrency=self.concurrency, per_host=self.per_host_limit, cookies=cookies,
+                               cache=self.cache, rate=self.rate)
+
+        def on_result(listing_url, broker_info):
+            if broker_info:
+                log.debug(f"Extracted broker info (async): {broker_info}")
+                self.record_broker(listing_url, broker_info)
+
+        failures = fetcher.run(broker_listings, lambda page_html, url: parse_broker_html(page_html, url), on_result)
+        self.profile_latencies.extend(fetcher.latencies)
+        log.info(f"Fetched {fetcher.fetched}/{len(broker_listings)} brokers from {state_name} "
+                 f"at {fetcher.pages_per_second():.1f} pages/sec")
+        if failures:
+            METRICS.count('browser_fallbacks', len(failures))
+            log.info(f"Retrying {len(failures)} brokers in the browser")
+            self.process_listings(failures, state_name, allow_http=False)
+
+    def retry_failed_profiles(self):
+        """Give failed profiles (this run's and earlier runs') their scheduled retries, waiting up to retry_wait"""
+        def retry(letters):
+            urls = [letter.key for letter in letters if letter.key not in self.processed_urls]
+            # Saved since they failed (e.g. listed again under another state)
+            self.dead_letters.resolve_many([letter.key for letter in letters if letter.key in self.processed_urls])
+            if self.fast and self.concurrency > 1:
+                self.fetch_brokers_concurrently(urls, 'earlier failures')
+            else:
+                self.process_listings(urls, 'earlier failures')
+            self.save_progress(force=True)
+
+        return RetryScheduler(self.dead_letters, retry, kind='profile', max_wait=self.retry_wait).run()
+
+    def make_worker(self):
+        """Clone this scraper for a pool worker: own headless driver and session, shared output"""
+        worker = copy.copy(self)
+        worker.debug = False
+        worker.driver = None
+        worker.session = None
+        worker.parent = self
+        worker.setup_driver()
+        return worker
+
+    def stop_worker(self, worker):
+        """Tear down a pool worker's driver and session"""
+        try:
+            if worker.driver:
+                worker.driver.quit()
+        finally:
+            if worker.session:
+                worker.session.close()
+
+    def driver_alive(self):
+        """True if the WebDriver session still responds"""
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def handle_pool_task(self, worker, task, spawn):
+        """Process one pool task: ('state', state) or ('profiles', state_name, urls)"""
+        if task[0] == 'state':
+            state = task[1]
+            log.info(f"[{threading.current_thread().name}] Processing state: {state['name']}")
+            self.checkpoint.start_state(state['name'])
+            broker_listings = worker.state_listings(state)
+            if not broker_listings:
+                # get_broker_listings swallows errors, so check whether the browser died under it
+                if not worker.driver_alive():
+                    raise WebDriverException(f"Driver died while listing {state['name']}")
+                if self.checkpoint.saved_listing(state['name']) is not None:
+                    log.info(f"No new or changed brokers in {state['name']}")
+                    self.checkpoint.mark_state_done(state['name'])
+                else:
+                    log.warning(f"No broker listings found for {state['name']}")
+                return
+            log.info(f"Found {len(broker_listings)} broker listings for {state['name']}")
+            # Split the state into chunks so idle workers can steal part of a big state
+            chunks = self.profile_chunks(broker_listings)
+            with self.lock:
+                self.pending_chunks[state['name']] = len(chunks)
+            for chunk in chunks:
+                spawn(('profiles', state['name'], chunk))
+        else:
+            _, state_name, urls = task
+            urls = [url for url in urls if url not in self.processed_urls]
+            if worker.fast and worker.concurrency > 1:
+                worker.fetch_brokers_concurrently(urls, state_name)
+            else:
+                worker.process_listings(urls, state_name)
+            if worker.driver and not worker.driver_alive():
+                raise WebDriverException(f"Driver died while processing brokers from {state_name}")
+            # The state is finished once its last chunk is saved
+            with self.lock:
+                self.pending_chunks[state_name] -= 1
+                if self.pending_chunks[state_name] == 0:
+                    self.save_progress(force=True)
+                    self.checkpoint.mark_state_done(state_name)
+
+    def profile_chunks(self, broker_listings):
+        return [broker_listings[i:i + self.profile_chunk_size]
+                for i in range(0, len(broker_listings), self.profile_chunk_size)]
+
+    def handle_queue_task(self, task):
+        """Process one work-queue task and return the tasks it spawns.
+
+        'states' reads the state list, 'state' walks one state's listing
+        pages and queues its profiles in chunks, and 'profiles' visits a
+        chunk. Profile chunks go ahead of unwalked states, so records keep
+        flowing while the listings are spread over the workers.
+        """
+        if task.kind == 'states':
+            states = self.load_states()
+            if not states:
+                raise RuntimeError('No states found on the directory page')
+            return [('state', state['name'], state) for state in states]
+        if task.kind == 'state':
+            state = task.payload
+            if self.driver is None:
+                self.setup_driver()
+            self.checkpoint.start_state(state['name'])
+            broker_listings = self.state_listings(state)
+            if not broker_listings and not self.driver_alive():
+                raise WebDriverException(f"Driver died while listing {state['name']}")
+            log.info(f"Found {len(broker_listings)} broker listings for {state['name']}")
+            self.checkpoint.mark_state_done(state['name'])
+            return [('profiles', f"{state['name']}:{idx}", {'state': state['name'], 'urls': chunk}, 1)
+                    for idx, chunk in enumerate(self.profile_chunks(broker_listings))]
+        state_name = task.payload['state']
+        urls = [url for url in map(PROFILE_URLS.canonical, task.payload['urls']) if url not in self.processed_urls]
+        if self.fast and self.concurrency > 1:
+            self.fetch_brokers_concurrently(urls, state_name)
+        else:
+            self.process_listings(urls, state_name)
+        if self.driver and not self.driver_alive():
+            raise WebDriverException(f"Driver died while processing brokers from {state_name}")
+        # The task only completes once its records are durable
+        self.save_progress(force=True)
+        return []
+
+    def queue_task(self, task):
+        """handle_queue_task, dropping a dead browser so the next task starts a fresh one"""
+        try:
+            return self.handle_queue_task(task)
+        except Exception:
+            if self.driver and not self.driver_alive():
+                try:
+                    self.driver.quit()
+                except WebDriverException:
+                    pass
+                self.driver = None
+            raise
+
+    def run_queue(self, queue):
+        """Pull state and profile tasks from a shared WorkQueue until every worker's share is done.
+
+        Any number of processes (on this machine or others sharing the
+        queue's database) can run this at once; the first one seeds the
+        queue with the state list. A crawl that finishes without failed
+        tasks empties the queue, so the next run on the file starts over.
+        """
+        try:
+            self.fingerprints.begin_run()
+            queue.put('states', 'states')
+            run_worker(queue, self.queue_task, self.worker)
+            self.retry_failed_profiles()
+            for kind, key, error in queue.failed_tasks():
+                log.warning(f"Gave up on task: {kind} {key} ({error})")
+            log.info("Scraping completed!")
+        except Exception as e:
+            log.exception(f"Error running scraper: {str(e)}")
+        finally:
+            self.save_progress(force=True)
+            if queue.drained():
+                self.export_excel()
+                failed = queue.failed_tasks()
+                # The queue remembers what is done; this worker's own progress files aren't needed again
+                self.finish_crawl(report_delta=not failed)
+                self.processed_urls.clear()
+                self.checkpoint.close()
+                shutil.rmtree(self.progress_dir, ignore_errors=True)
+                if not failed:
+                    # Failed tasks stay queued for --requeue-failed; a clean crawl leaves nothing to redo
+                    queue.clear()
+            self.save_selector_stats()
+            if self.driver:
+                self.driver.quit()
+            if self.session:
+                self.session.close()
+
+    def load_states(self):
+        """State list from the checkpoint when resuming, else read from the directory page"""
+        states = self.checkpoint.recall('states')
+        if states:
+            log.info(f"Using {len(states)} checkpointed states")
+            return states
+        if self.driver is None:
+            self.setup_driver()
+        states = self.get_states()
+        if states:
+            self.checkpoint.remember('states', states)
+        return states
+
+    def run_parallel(self, workers=4):
+        """Crawl all states with a pool of headless browsers sharded by state"""
+        try:
+            self.fingerprints.begin_run()
+            states = self.load_states()
+            if self.driver:
+                self.driver.quit()
+                self.driver = None
+            if not states:
+                log.warning("No states found. Exiting.")
+                return
+
+            pool = WorkStealingPool(
+                workers,
+                start_worker=lambda worker_id: self.make_worker(),
+                stop_worker=self.stop_worker,
+                handle=self.handle_pool_task,
+            )
+            todo = [state for state in states if not self.checkpoint.state_done(state['name'])]
+            log.info(f"{len(states) - len(todo)} states already done, {len(todo)} to go")
+            failed = pool.run([('state', state) for state in todo])
+            self.retry_failed_profiles()
+            for task in failed:
+                log.warning(f"Gave up on task: {task[0]} {task[1]['name'] if task[0] == 'state' else task[1]}")
+            if not failed:
+                self.save_progress(force=True)
+                self.finish_crawl(report_delta=self.listing_complete(states))
+            log.info("Scraping completed!")
+        except Exception as e:
+            log.exception(f"Error running scraper: {str(e)}")
+        finally:
+            self.save_progress(force=True)
+            self.export_excel()
+            self.save_selector_stats()
+            if self.driver:
+                self.driver.quit()
+
     def run(self):
         """Main method to run the scraper"""
         try:
             # Setup the WebDriver
             self.setup_driver()
+            self.fingerprints.begin_run()
             
-            # Get all states
-            states = self.get_states()
+            # Get all states (from the checkpoint when resuming)
+            states = self.load_states()
             
             if not states:
-                print("No states found. Exiting.")
+                log.warning("No states found. Exiting.")
                 return
             
             # Process each state
             for state_idx, state in enumerate(states, 1):
-                print(f"\nProcessing state {state_idx}/{len(states)}: {state['name']}")
+                if self.checkpoint.state_done(state['name']):
+                    log.info(f"Skipping {state['name']} (finished before restart)")
+                    continue
+                log.info(f"Processing state {state_idx}/{len(states)}: {state['name']}")
+                self.checkpoint.start_state(state['name'])
                 
                 # Get all broker listings for this state
-                broker_listings = self.get_broker_listings(state['url'])
+                broker_listings = self.state_listings(state)
                 
                 if not broker_listings:
-                    print(f"No broker listings found for {state['name']}")
+                    if self.checkpoint.saved_listing(state['name']) is not None:
+                        log.info(f"No new or changed brokers in {state['name']}")
+                        self.checkpoint.mark_state_done(state['name'])
+                    else:
+                        log.warning(f"No broker listings found for {state['name']}")
                     continue
                 
-                print(f"Found {len(broker_listings)} broker listings for {state['name']}")
+                log.info(f"Found {len(broker_listings)} broker listings for {state['name']}")
                 
                 # Process each broker listing
-                for listing_idx, listing_url in enumerate(broker_listings, 1):
-                    print(f"Processing broker {listing_idx}/{len(broker_listings)} from {state['name']}")
-                    
-                    # Extract broker information
-                    broker_info = self.extract_broker_info(listing_url)
-                    
-                    if broker_info:
-                        # Add to data list
-                        self.data.append(broker_info)
-                        
-                        # Add to processed URLs
-                        self.processed_urls.add(listing_url)
-                        
-                        # Save progress every few brokers
-                        if len(self.data) >= self.save_frequency:
-                            self.save_progress()
-                    
-                    # Random delay between requests to avoid IP ban
-                    time.sleep(random.uniform(2, 5))
+                if self.fast and self.concurrency > 1:
+                    self.fetch_brokers_concurrently(broker_listings, state['name'])
+                else:
+                    self.process_listings(broker_listings, state['name'])
                 
                 # Save any remaining data
                 self.save_progress(force=True)
-                
-                # Random delay between states
-                time.sleep(random.uniform(2, 5))
+                self.checkpoint.mark_state_done(state['name'])
             
-            print("\nScraping completed!")
+            self.retry_failed_profiles()
+
+            # Finished cleanly: the next run starts from the top
+            self.finish_crawl(report_delta=self.listing_complete(states))
+            log.info("Scraping completed!")
             
         except Exception as e:
-            print(f"Error running scraper: {str(e)}")
+            log.exception(f"Error running scraper: {str(e)}")
         finally:
-            # Save any remaining data
+            # Save any remaining data and refresh the Excel export
             self.save_progress(force=True)
+            self.export_excel()
+            self.save_selector_stats()
             
-            # Close the WebDriver
+            # Close the WebDriver and HTTP session
             if self.driver:
                 self.driver.quit()
+            if self.session:
+                self.session.close()
 
 if __name__ == "__main__":
-    scraper = BusinessBrokerScraper(debug=True)
-    scraper.run()
+    parser = argparse.ArgumentParser(description='Scrape the BusinessBroker.net broker directory')
+    parser.add_argument('--browser-only', action='store_true', help='Skip the HTTP fast path')
+    parser.add_argument('--workers', type=int, default=1, help='Parallel headless browsers (sharded by state)')
+    parser.add_argument('--queue', metavar='DB',
+                        help='Pull states and profile chunks from a shared work queue (SQLite file); start as many '
+                             'processes as you like on the same file')
+    parser.add_argument('--new-crawl', action='store_true',
+                        help='With --queue, drop whatever the queue holds and start a new crawl')
+    parser.add_argument('--requeue-failed', action='store_true',
+                        help='With --queue, give tasks that used up their attempts a fresh set')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Re-visit new brokers and those whose listing card changed since the last crawl, '
+                             'and update changed brokers (unchanged pages come from the cache)')
+    parser.add_argument('--refresh-all', action='store_true',
+                        help='With --refresh, also re-visit brokers whose listing card is unchanged')
+    parser.add_argument('--retry-wait', type=float, default=120,
+                        help='Seconds to wait for scheduled retries of failed profiles before leaving them to the '
+                             'next run (default: 120)')
+    parser.add_argument('--retry-exhausted', action='store_true',
+                        help='Give profiles that used up their retries a fresh set before crawling')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk HTTP response cache')
+    parser.add_argument('--block', default='default',
+                        help="Resource groups the browser won't load: comma-separated from analytics, ads, fonts, "
+                             "embeds, maps, css, or 'default' (the first four) or 'none'")
+    parser.add_argument('--page-load', choices=('eager', 'normal'), default='eager',
+                        help='eager: stop at DOMContentLoaded and wait only for the extracted elements')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Never attach to the browser daemon; launch a fresh Chrome')
+    parser.add_argument('--export', action='store_true', help='Only export the record store to Excel')
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='Time each crawl stage and write businessbroker.prom and a JSON summary to DIR')
+    parser.add_argument('--log-json', action='store_true', help='Log one JSON object per line')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG shows every profile (default: INFO)')
+    args = parser.parse_args()
+
+    setup_logging(json_lines=args.log_json, level=args.log_level)
+    try:
+        blocked = parse_block_list(args.block)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.metrics:
+        METRICS.enable(scraper='businessbroker')
+    scraper = BusinessBrokerScraper(debug=args.workers == 1 and not args.queue, fast=not args.browser_only,
+                                    refresh=args.refresh or args.refresh_all, refresh_all=args.refresh_all,
+                                    use_cache=not args.no_cache, retry_wait=args.retry_wait,
+                                    blocked=blocked, page_load=args.page_load, use_daemon=not args.no_daemon,
+                                    worker=worker_name() if args.queue else None)
+    if args.retry_exhausted:
+        log.info(f"Gave {scraper.dead_letters.requeue_exhausted()} exhausted profiles a fresh set of retries")
+    try:
+        if args.export:
+            scraper.export_excel()
+        elif args.queue:
+            queue = WorkQueue(args.queue)
+            if args.new_crawl:
+                queue.clear()
+                log.info(f"Cleared {args.queue} for a new crawl")
+            if args.requeue_failed:
+                log.info(f"Requeued {queue.requeue_failed()} failed tasks")
+            scraper.run_queue(queue)
+        elif args.workers > 1:
+            scraper.run_parallel(workers=args.workers)
+        else:
+            scraper.run()
+    finally:
+        if args.metrics:
+            if scraper.cache:
+                scraper.cache.count_metrics()
+            prom_path, summary_path = METRICS.write(args.metrics, 'businessbroker')
+            log.info(f"Wrote metrics to {prom_path} and {summary_path}")
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import shutil
+import logging
+import urllib.request
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException, SessionNotCreatedException
+
+from common.checkpoint import atomic_write
+from common.metrics import METRICS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no daemon leases, every run launches its own Chrome
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# URL patterns for CDP Network.setBlockedURLs ('*' is the only wildcard), by group. The third-party
+# hosts are the ones every page of the saved IBBA, BizBuySell and BusinessBroker captures pulls in.
+RESOURCE_PATTERNS = {
+    'analytics': (
+        '*googletagmanager.com/*', '*google-analytics.com/*', '*clarity.ms/*', '*connect.facebook.net/*',
+        '*facebook.com/tr*', '*snap.licdn.com/*', '*px.ads.linkedin.com/*', '*bat.bing.com/*',
+        '*tag.demandbase.com/*', '*company-target.com/*', '*hotjar.com/*', '*nr-data.net/*',
+    ),
+    'ads': (
+        '*doubleclick.net/*', '*googlesyndication.com/*', '*googleadservices.com/*', '*adservice.google.com/*',
+        '*amazon-adsystem.com/*', '*adnxs.com/*', '*criteo.com/*', '*taboola.com/*', '*outbrain.com/*',
+    ),
+    'fonts': (
+        '*fonts.googleapis.com/*', '*fonts.gstatic.com/*', '*use.typekit.net/*',
+        '*.woff', '*.woff?*', '*.woff2', '*.woff2?*', '*.ttf', '*.ttf?*', '*.otf', '*.otf?*', '*.eot', '*.eot?*',
+    ),
+    # Video players and chat widgets: nothing we extract lives in them
+    'embeds': (
+        '*youtube.com/embed/*', '*ytimg.com/*', '*vimeocdn.com/*', '*player.vimeo.com/*',
+        '*app.wonderchat.io/*', '*.mp4', '*.webm',
+    ),
+    # Off by default: the IBBA broker locator is built on Mapbox and may not render without it
+    'maps': ('*api.tiles.mapbox.com/*', '*api.mapbox.com/*'),
+    # Off by default: without styles, is_displayed() and clicks on menus and overlays can misbehave
+    'css': ('*.css', '*.css?*'),
+}
+DEFAULT_BLOCKED = ('analytics', 'ads', 'fonts', 'embeds')
+
+# Browser daemon state, Chrome profiles and the cached chromedriver path, shared by every scraper
+STATE_DIR = os.environ.get('BROWSER_STATE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'scraper-browsers'))
+DAEMON_STATE = os.path.join(STATE_DIR, 'daemon.json')
+DRIVER_CACHE = os.path.join(STATE_DIR, 'chromedriver.json')
+CHROME_NAMES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+MAC_CHROME = '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'
+
+
+def parse_block_list(value):
+    """Resource groups from a --block value: comma-separated names, 'default', or 'none'"""
+    value = (value or '').strip().lower()
+    if value in ('', 'none', 'off'):
+        return ()
+    groups = []
+    for name in value.split(','):
+        name = name.strip()
+        groups.extend(DEFAULT_BLOCKED if name == 'default' else [name])
+    unknown = [name for name in groups if name not in RESOURCE_PATTERNS]
+    if unknown:
+        raise ValueError(f"Unknown resource group(s): {', '.join(unknown)} "
+                         f"(choose from {', '.join(RESOURCE_PATTERNS)}, default, none)")
+    return tuple(dict.fromkeys(groups))
+
+
+def lean_options(chrome_opts, page_load='eager', measure=False):
+    """Set the page-load strategy and, when measuring, turn on Chrome's network performance log"""
+    chrome_opts.page_load_strategy = page_load
+    if measure:
+        chrome_opts.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        chrome_opts.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+
+def block_resources(driver, groups):
+    """Refuse requests matching the groups' URL patterns in this browser tab; returns the patterns"""
+    patterns = [pattern for group in groups for pattern in RESOURCE_PATTERNS[group]]
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    if patterns:
+        log.info(f"Blocking {', '.join(groups)} ({len(patterns)} URL patterns)")
+    return patterns
+
+
+def wait_for_any(driver, xpaths, timeout=10):
+    """Wait until any of the XPaths matches (one union query per poll); False on timeout.
+
+    With the eager load strategy driver.get() returns at DOMContentLoaded,
+    so this is what stands between the load and the snapshot: it waits for
+    the elements we extract rather than for every script and image.
+    """
+    union = ' | '.join(xpaths)
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.find_elements(By.XPATH, union))
+        return True
+    except TimeoutException:
+        return False
+
+
+class TransferMeter:
+    """Bytes, requests and load time per browser page, read from Chrome's performance log.
+
+    Needs a driver started with lean_options(..., measure=True). take()
+    drains the log and sums the Network events since the previous call:
+    encodedDataLength of every finished request (bytes over the wire,
+    headers included), requests sent, and requests the blocking layer
+    refused. Totals are counted in METRICS labelled blocking=on/off, so
+    runs with the layer on and off can be compared.
+    """
+
+    def __init__(self, driver, blocking):
+        self.driver = driver
+        self.blocking = 'on' if blocking else 'off'
+        self.pages = 0
+        self.bytes = 0
+        self.requests = 0
+        self.blocked = 0
+        self.seconds = 0.0
+
+    def take(self, seconds=None):
+        """Account for the page just loaded; returns its (bytes, requests, blocked)"""
+        try:
+            entries = self.driver.get_log('performance')
+        except WebDriverException:
+            return None
+        transferred = requests = blocked = 0
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            if method == 'Network.requestWillBeSent':
+                requests += 1
+            elif method == 'Network.loadingFinished':
+                transferred += int(message['params'].get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+                blocked += 1
+        self.pages += 1
+        self.bytes += transferred
+        self.requests += requests
+        self.blocked += blocked
+        self.seconds += seconds or 0.0
+        METRICS.count('browser_pages', blocking=self.blocking)
+        METRICS.count('browser_bytes', transferred, blocking=self.blocking)
+        METRICS.count('browser_requests', requests, blocking=self.blocking)
+        METRICS.count('browser_blocked_requests', blocked, blocking=self.blocking)
+        return transferred, requests, blocked
+
+    def report(self):
+        if not self.pages:
+            return f"Browser transfer (blocking {self.blocking}): no pages measured"
+        return (f"Browser transfer (blocking {self.blocking}): {self.pages} pages, "
+                f"{self.bytes / self.pages / 1024:.0f} KB and {self.requests / self.pages:.0f} requests per page "
+                f"({self.blocked} blocked), {self.seconds / self.pages * 1000:.0f} ms per load")
+
+
+def chrome_binary():
+    """Path of the Chrome executable: $CHROME_BINARY, else the first Chrome/Chromium on PATH or in /Applications"""
+    path = os.environ.get('CHROME_BINARY')
+    if path:
+        return path
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return MAC_CHROME if os.path.exists(MAC_CHROME) else None
+
+
+def chromedriver_path(refresh=False):
+    """chromedriver binary: $CHROMEDRIVER, else the path cached by an earlier run, else resolved (and saved) once.
+
+    ChromeDriverManager().install() checks versions over the network on
+    every call; the cached path lets runs start offline and without that
+    round-trip. refresh=True resolves it again, e.g. after a Chrome update
+    left the cached driver on the wrong major version.
+    """
+    path = os.environ.get('CHROMEDRIVER')
+    if path:
+        return path
+    if not refresh:
+        try:
+            with open(DRIVER_CACHE, encoding='utf-8') as f:
+                path = json.load(f)['path']
+            if os.access(path, os.X_OK):
+                return path
+        except (OSError, ValueError, KeyError):
+            pass
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    os.makedirs(STATE_DIR, exist_ok=True)
+    atomic_write(DRIVER_CACHE, json.dumps({'path': path, 'saved_at': time.time()}))
+    log.info(f"Cached chromedriver path {path}")
+    return path
+
+
+def debugger_alive(port, timeout=1.0):
+    """True if a Chrome remote-debugging endpoint answers on this port"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=timeout) as resp:
+            return resp.status == 200
+    except (OSError, ValueError):
+        return False
+
+
+class BrowserLease:
+    """Exclusive use of one warm Chrome instance from the browser daemon, held with a file lock.
+
+    The lock is released by release() or, if the scraper dies, by the OS,
+    so an instance is never stranded.
+    """
+
+    def __init__(self, instance, handle):
+        self.port = instance['port']
+        self.profile = instance['profile']
+        self.handle = handle
+
+    @property
+    def address(self):
+        return f"127.0.0.1:{self.port}"
+
+    @classmethod
+    def acquire(cls):
+        """Lease a free, live daemon instance; None if no daemon is running or every instance is taken"""
+        if fcntl is None:
+            return None
+        try:
+            with open(DAEMON_STATE, encoding='utf-8') as f:
+                instances = json.load(f)['instances']
+        except (OSError, ValueError, KeyError):
+            return None
+        for instance in instances:
+            handle = open(instance['profile'] + '.lease', 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            if debugger_alive(instance['port']):
+                return cls(instance, handle)
+            handle.close()  # Being restarted by the daemon; try the next one
+        return None
+
+    def release(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+
+class AttachedChrome(webdriver.Chrome):
+    """WebDriver session on a daemon's Chrome; quit() ends the session and frees the instance, Chrome keeps running"""
+
+    def __init__(self, lease, **kwargs):
+        self.lease = lease
+        super().__init__(**kwargs)
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.lease.release()
+
+
+def option_value(chrome_opts, flag):
+    prefix = flag + '='
+    return next((arg[len(prefix):] for arg in chrome_opts.arguments if arg.startswith(prefix)), None)
+
+
+def attach_options(chrome_opts, lease):
+    """Options for attaching to a running Chrome: the driver-side settings of chrome_opts, Chrome's own are fixed"""
+    attach_opts = Options()
+    attach_opts.debugger_address = lease.address
+    attach_opts.page_load_strategy = chrome_opts.page_load_strategy
+    logging_prefs = chrome_opts.to_capabilities().get('goog:loggingPrefs')
+    if logging_prefs:
+        attach_opts.set_capability('goog:loggingPrefs', logging_prefs)
+    if 'perfLoggingPrefs' in chrome_opts.experimental_options:
+        attach_opts.add_experimental_option('perfLoggingPrefs', chrome_opts.experimental_options['perfLoggingPrefs'])
+    return attach_opts
+
+
+def start_chrome(chrome_opts, use_daemon=True):
+    """Chrome WebDriver: attached to a warm instance of the browser daemon if one is free, else launched.
+
+    An attached browser keeps the daemon's command line (headless mode,
+    window size, no images) and its persistent profile, so cookies and
+    the HTTP cache survive between runs; the User-Agent from chrome_opts
+    is applied over CDP. Either way chromedriver comes from the cached
+    path, and a driver that no longer matches Chrome is resolved again.
+    """
+    lease = BrowserLease.acquire() if use_daemon else None
+    for refresh in (False, True):
+        service = Service(chromedriver_path(refresh=refresh))
+        try:
+            if lease is None:
+                return webdriver.Chrome(service=service, options=chrome_opts)
+            driver = AttachedChrome(lease, service=service, options=attach_options(chrome_opts, lease))
+        except SessionNotCreatedException:
+            if refresh or os.environ.get('CHROMEDRIVER'):
+                if lease:
+                    lease.release()
+                raise
+            log.warning('Cached chromedriver does not match Chrome; resolving it again')
+            continue
+        except Exception:
+            if lease:
+                lease.release()
+            raise
+        user_agent = option_value(chrome_opts, '--user-agent')
+        if user_agent:
+            driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': user_agent})
+        log.info(f"Attached to warm Chrome on {lease.address} ({lease.profile})")
+        return driver
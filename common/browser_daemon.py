@@ -0,0 +1,208 @@
+"""Keep warm Chrome instances running for the scrapers to attach to.
+
+    python -m common.browser_daemon start [--instances N] [--port P] [--headed] [--detach]
+    python -m common.browser_daemon status
+    python -m common.browser_daemon stop
+
+Each instance is a Chrome started once with --remote-debugging-port and
+its own persistent profile under STATE_DIR/profiles, so cookies, logins
+and the HTTP cache carry over from run to run. Scrapers lease a free
+instance (common.browser.start_chrome) and attach to it through
+chromedriver instead of launching Chrome, which takes the start of a run
+from several seconds to a fraction of one and needs no network. The
+daemon resolves and caches the chromedriver path when it starts, checks
+its instances every few seconds and restarts any that died. Run it with
+--detach (or under launchd/systemd) so scheduled runs find it warm.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import subprocess
+
+from common.browser import STATE_DIR, DAEMON_STATE, chrome_binary, chromedriver_path, debugger_alive, fcntl
+from common.checkpoint import atomic_write
+from common.log import setup_logging
+
+log = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHROME_FLAGS = (
+    '--no-first-run', '--no-default-browser-check', '--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage',
+    '--disable-background-networking', '--window-size=1920,1080', '--blink-settings=imagesEnabled=false',
+)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, TypeError):
+        return False
+
+
+def read_state():
+    try:
+        with open(DAEMON_STATE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class BrowserDaemon:
+    def __init__(self, instances=2, port=9310, headless=True, check_every=5.0):
+        self.count = instances
+        self.port = port
+        self.headless = headless
+        self.check_every = check_every
+        self.chrome = chrome_binary()
+        self.processes = {}  # Instance index -> Popen (None for an adopted Chrome)
+        self.running = True
+
+    def instance(self, index):
+        return {'port': self.port + index, 'profile': os.path.join(STATE_DIR, 'profiles', f'chrome-{index}')}
+
+    def launch(self, index):
+        """Start (or adopt) Chrome for an instance and wait until its debugging endpoint answers"""
+        instance = self.instance(index)
+        if debugger_alive(instance['port']):
+            log.info(f"Adopting the Chrome already listening on port {instance['port']}")
+            self.processes[index] = None
+            return True
+        os.makedirs(instance['profile'], exist_ok=True)
+        command = [self.chrome, f"--remote-debugging-port={instance['port']}",
+                   f"--user-data-dir={instance['profile']}", *CHROME_FLAGS]
+        if self.headless:
+            command.append('--headless=new')
+        command.append('about:blank')
+        self.processes[index] = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            if debugger_alive(instance['port']):
+                log.info(f"Chrome {index} ready on port {instance['port']} ({instance['profile']})")
+                return True
+            if self.processes[index].poll() is not None:
+                break
+            time.sleep(0.2)
+        log.warning(f"Chrome {index} did not come up on port {instance['port']}")
+        return False
+
+    def stop_instance(self, index):
+        process = self.processes.pop(index, None)
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def write_state(self):
+        atomic_write(DAEMON_STATE, json.dumps({
+            'pid': os.getpid(),
+            'started': time.time(),
+            'headless': self.headless,
+            'instances': [self.instance(index) for index in range(self.count)],
+        }, indent=2))
+
+    def serve(self):
+        if not self.chrome:
+            raise RuntimeError('No Chrome found; set CHROME_BINARY to its path')
+        os.makedirs(STATE_DIR, exist_ok=True)
+        chromedriver_path()  # Resolve once now, so attaching runs never need the network
+        for index in range(self.count):
+            self.launch(index)
+        self.write_state()
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'running', False))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'running', False))
+        log.info(f"Browser daemon serving {self.count} Chrome instances from port {self.port}")
+        try:
+            while self.running:
+                time.sleep(self.check_every)
+                for index in range(self.count):
+                    if self.running and not debugger_alive(self.instance(index)['port']):
+                        log.warning(f"Chrome {index} stopped answering; restarting it")
+                        self.stop_instance(index)
+                        self.launch(index)
+        finally:
+            for index in list(self.processes):
+                self.stop_instance(index)
+            try:
+                os.remove(DAEMON_STATE)
+            except OSError:
+                pass
+            log.info('Browser daemon stopped')
+
+
+def status():
+    state = read_state()
+    if not state or not pid_alive(state.get('pid')):
+        print('Browser daemon is not running')
+        return 1
+    print(f"Browser daemon pid {state['pid']}, up {(time.time() - state['started']) / 60:.0f} min, "
+          f"headless={state['headless']}")
+    for instance in state['instances']:
+        leased = False
+        if fcntl is not None:
+            with open(instance['profile'] + '.lease', 'a') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    leased = True
+        alive = debugger_alive(instance['port'])
+        print(f"  port {instance['port']}: {'up' if alive else 'down'}, {'in use' if leased else 'free'}, "
+              f"{instance['profile']}")
+    return 0
+
+
+def stop():
+    state = read_state()
+    if not state or not pid_alive(state.get('pid')):
+        print('Browser daemon is not running')
+        return 1
+    os.kill(state['pid'], signal.SIGTERM)
+    deadline = time.monotonic() + 15
+    while os.path.exists(DAEMON_STATE) and time.monotonic() < deadline:
+        time.sleep(0.2)
+    print('Browser daemon stopped')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm Chrome instances for the scrapers to attach to')
+    parser.add_argument('command', choices=('start', 'status', 'stop'))
+    parser.add_argument('--instances', type=int, default=2,
+                        help='Chrome instances to keep warm (one per concurrent scraper or pool worker)')
+    parser.add_argument('--port', type=int, default=9310, help='remote-debugging port of the first instance')
+    parser.add_argument('--headed', action='store_true', help='show the browser windows')
+    parser.add_argument('--detach', action='store_true', help='run in the background, logging to STATE_DIR')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        return status()
+    if args.command == 'stop':
+        return stop()
+    state = read_state()
+    if state and pid_alive(state.get('pid')):
+        print(f"Browser daemon already running (pid {state['pid']})")
+        return 0
+    if args.detach:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        command = [sys.executable, '-m', 'common.browser_daemon', 'start',
+                   '--instances', str(args.instances), '--port', str(args.port)]
+        if args.headed:
+            command.append('--headed')
+        with open(os.path.join(STATE_DIR, 'daemon.log'), 'a') as log_file:
+            process = subprocess.Popen(command, cwd=REPO_DIR, stdout=log_file, stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+        print(f"Browser daemon started in the background (pid {process.pid})")
+        return 0
+    setup_logging()
+    BrowserDaemon(args.instances, args.port, headless=not args.headed).serve()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
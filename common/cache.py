@@ -0,0 +1,198 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+from common.metrics import METRICS
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of fetched pages with TTLs, conditional revalidation and LRU eviction.
+
+    Bodies are stored zlib-compressed under objects/<2 hex>/<sha256 of body>,
+    so identical pages share one file. An SQLite index maps each key (a URL,
+    or 'rendered:' + URL for DOM captured from a browser) to its body, its
+    validators (ETag, Last-Modified) and when it was fetched and last used.
+
+    A fresh entry is served without touching the network. A stale one is
+    revalidated with If-None-Match / If-Modified-Since, and a 304 transfers
+    only headers. Once stored bodies exceed max_bytes, the least recently
+    used entries are dropped. Callers discard() pages that turned out not to
+    parse, so a captcha or error page isn't served back from the cache.
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' digest TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' fetched_at REAL NOT NULL,'
+            ' used_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)')
+        self.conn.commit()
+        self.hits = 0  # Served fresh, no request at all
+        self.revalidated = 0  # 304 Not Modified
+        self.misses = 0  # Full download
+        self.bytes_saved = 0
+        self.stored_bytes = self.total_bytes()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def lookup(self, key):
+        """Index entry for a key as a dict, or None if there is none or its body is gone"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT digest, size, etag, last_modified, fetched_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or not os.path.exists(self.object_path(row[0])):
+            return None
+        return dict(zip(('digest', 'size', 'etag', 'last_modified', 'fetched_at'), row))
+
+    def read(self, entry):
+        try:
+            with open(self.object_path(entry['digest']), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            return None
+
+    def touch(self, key, fetched=False):
+        now = time.time()
+        with self.lock, self.conn:
+            if fetched:
+                self.conn.execute('UPDATE entries SET used_at = ?, fetched_at = ? WHERE key = ?', (now, now, key))
+            else:
+                self.conn.execute('UPDATE entries SET used_at = ? WHERE key = ?', (now, key))
+
+    def get_fresh(self, key, ttl=None):
+        """Cached body if it was fetched within ttl seconds (default self.ttl), else None"""
+        entry = self.lookup(key)
+        if entry is None or time.time() - entry['fetched_at'] > (self.ttl if ttl is None else ttl):
+            return None
+        body = self.read(entry)
+        if body is not None:
+            self.touch(key)
+            self.hits += 1
+            self.bytes_saved += len(body)
+        return body
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since for revalidating a stale entry"""
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def not_modified(self, key, entry):
+        """Record a 304 for a stale entry and return its cached body"""
+        body = self.read(entry)
+        if body is not None:
+            self.touch(key, fetched=True)
+            self.revalidated += 1
+            self.bytes_saved += len(body)
+        return body
+
+    def put(self, key, body, headers=None):
+        """Store a freshly downloaded body with its validators"""
+        headers = headers or {}
+        data = body.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+            self.stored_bytes += os.path.getsize(path)
+        now = time.time()
+        with self.lock, self.conn:
+            previous = self.conn.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries (key, digest, size, etag, last_modified, fetched_at, used_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, digest, os.path.getsize(path), headers.get('ETag'), headers.get('Last-Modified'), now, now)
+            )
+        self.misses += 1
+        if previous and previous[0] != digest:
+            self.release(previous[0])
+        self.evict()
+
+    def discard(self, key):
+        """Forget a key whose body turned out to be useless (captcha, error or JS shell page)"""
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if row:
+            self.release(row[0])
+
+    def release(self, digest):
+        """Delete a body file once no key points at it"""
+        with self.lock:
+            in_use = self.conn.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone()
+        if not in_use:
+            path = self.object_path(digest)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.stored_bytes -= size
+            except OSError:
+                pass
+
+    def total_bytes(self):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)'
+            ).fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the stored bodies fit in max_bytes"""
+        while self.stored_bytes > self.max_bytes:
+            with self.lock:
+                keys = [row[0] for row in self.conn.execute('SELECT key FROM entries ORDER BY used_at LIMIT 100')]
+            if not keys:
+                return
+            for key in keys:
+                self.discard(key)
+                if self.stored_bytes <= self.max_bytes:
+                    return
+
+    def count_metrics(self):
+        """Book this run's fresh / revalidated / downloaded page counts as metrics counters"""
+        METRICS.count('cache_pages', self.hits, outcome='fresh')
+        METRICS.count('cache_pages', self.revalidated, outcome='revalidated')
+        METRICS.count('cache_pages', self.misses, outcome='downloaded')
+
+    def hit_rate(self):
+        total = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / total if total else 0.0
+
+    def report(self):
+        total = self.hits + self.revalidated + self.misses
+        if not total:
+            return 'HTTP cache: no pages requested'
+        return (f"HTTP cache: {self.hits + self.revalidated}/{total} pages from cache ({self.hit_rate():.1%}): "
+                f"{self.hits} fresh, {self.revalidated} revalidated (304), {self.misses} downloaded; "
+                f"{self.bytes_saved / 1e6:.1f} MB not transferred")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,158 @@
+import os
+import logging
+import json
+import threading
+
+log = logging.getLogger(__name__)
+
+
+def atomic_write(path, text):
+    """Write a file so a crash leaves either the old or the new contents, never half of each"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def is_navigable(url):
+    """True for hrefs we can driver.get() directly (not javascript: postbacks or in-page anchors)"""
+    return bool(url) and url.startswith(('http://', 'https://'))
+
+
+class Checkpoint:
+    """Resumable crawl position stored in a progress directory.
+
+    Uses the same layout as the earlier IBBA progress folder:
+      current_state.txt  the state (or category) most recently started
+      scraped_urls.txt   completed profile URLs, one per line, append-only
+      cursor.json        per-state page cursor: the last finished page, the
+                         URL of the page after it (when the site exposes one),
+                         the profile URLs collected so far, whether the
+                         listing is complete, and the list of finished states
+
+    cursor.json is rewritten atomically. scraped_urls.txt is appended and
+    fsynced after each saved batch, so a crash can only lose profiles that
+    hadn't been saved yet.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.cursor_path = os.path.join(directory, 'cursor.json')
+        self.state_path = os.path.join(directory, 'current_state.txt')
+        self.urls_path = os.path.join(directory, 'scraped_urls.txt')
+        self.lock = threading.RLock()
+
+        self.cursor = {'completed_states': [], 'states': {}}
+        if os.path.exists(self.cursor_path):
+            try:
+                with open(self.cursor_path, encoding='utf-8') as f:
+                    self.cursor.update(json.load(f))
+            except (OSError, ValueError) as e:
+                log.warning(f"Ignoring unreadable checkpoint {self.cursor_path}: {str(e)}")
+
+        self.done_urls = set()
+        if os.path.exists(self.urls_path):
+            with open(self.urls_path, encoding='utf-8') as f:
+                self.done_urls = {line.strip() for line in f if line.strip()}
+        self.urls_file = open(self.urls_path, 'a', encoding='utf-8')
+
+    def remember(self, key, value):
+        """Persist an arbitrary JSON value for the rest of this crawl (e.g. the state list)"""
+        with self.lock:
+            self.cursor.setdefault('meta', {})[key] = value
+            self.flush()
+
+    def recall(self, key, default=None):
+        return self.cursor.get('meta', {}).get(key, default)
+
+    def has_progress(self):
+        return bool(self.cursor['completed_states'] or self.cursor['states'] or self.done_urls)
+
+    def current_state(self):
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, encoding='utf-8') as f:
+            return f.read().strip() or None
+
+    def flush(self):
+        atomic_write(self.cursor_path, json.dumps(self.cursor, indent=1))
+
+    # State level
+
+    def state_done(self, state):
+        return state in self.cursor['completed_states']
+
+    def start_state(self, state):
+        with self.lock:
+            atomic_write(self.state_path, state)
+            self.cursor['states'].setdefault(state, {'page': 0, 'next_url': None, 'listings': [], 'complete': False})
+            self.flush()
+
+    def mark_state_done(self, state):
+        with self.lock:
+            if state not in self.cursor['completed_states']:
+                self.cursor['completed_states'].append(state)
+            self.cursor['states'].pop(state, None)
+            self.flush()
+
+    # Page level
+
+    def save_page(self, state, page, next_url, listings):
+        """Record that `page` of a state's listing is finished along with everything collected so far"""
+        with self.lock:
+            self.cursor['states'][state] = {
+                'page': page,
+                'next_url': next_url if is_navigable(next_url) else None,
+                'listings': list(listings),
+                'complete': False,
+            }
+            self.flush()
+
+    def finish_listing(self, state, listings):
+        with self.lock:
+            self.cursor['states'][state] = {'page': None, 'next_url': None, 'listings': list(listings), 'complete': True}
+            self.flush()
+
+    def saved_listing(self, state):
+        """All listings of a state whose listing pages were fully walked, else None"""
+        entry = self.cursor['states'].get(state)
+        return entry['listings'] if entry and entry['complete'] else None
+
+    def resume_point(self, state):
+        """(page, next_url, listings) to continue an unfinished listing walk, or None"""
+        entry = self.cursor['states'].get(state)
+        if not entry or entry['complete'] or not entry['page'] or not entry['next_url']:
+            return None
+        return entry['page'], entry['next_url'], entry['listings']
+
+    # Profile level
+
+    def profile_done(self, url):
+        return url in self.done_urls
+
+    def mark_profiles_done(self, urls):
+        with self.lock:
+            for url in urls:
+                if url and url not in self.done_urls:
+                    self.done_urls.add(url)
+                    self.urls_file.write(url + '\n')
+            self.urls_file.flush()
+            os.fsync(self.urls_file.fileno())
+
+    def clear(self):
+        """Forget all progress after a crawl completes so the next run starts from the top"""
+        with self.lock:
+            self.urls_file.close()
+            for path in (self.cursor_path, self.state_path, self.urls_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.cursor = {'completed_states': [], 'states': {}}
+            self.done_urls = set()
+            self.urls_file = open(self.urls_path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self.lock:
+            self.urls_file.close()
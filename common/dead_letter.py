@@ -0,0 +1,322 @@
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+WAITING, EXHAUSTED = 'waiting', 'exhausted'
+
+
+def domain_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class CircuitBreaker:
+    """Per-domain circuit breaker in front of retries.
+
+    After `threshold` failures in a row on a domain its circuit opens and
+    allow() refuses the domain for `cooldown` seconds. Then one trial is
+    let through (half-open): a success closes the circuit, a failure opens
+    it again for twice as long, up to max_cooldown. Failures that arrive
+    while it is open (requests already under way) don't extend it.
+    """
+
+    def __init__(self, threshold=5, cooldown=60, max_cooldown=900):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = {}  # Domain -> failures in a row
+        self.open_until = {}  # Domain -> when its open circuit lets a trial through
+        self.cooldowns = {}  # Domain -> current cooldown of an open circuit
+        self.trials = set()  # Domains whose half-open trial hasn't reported back
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self, url):
+        domain = domain_of(url)
+        with self.lock:
+            until = self.open_until.get(domain)
+            if until is None:
+                return True
+            now = time.time()
+            if now < until:
+                return False
+            # Half-open: this caller is the trial; the rest wait until it reports back
+            self.open_until[domain] = now + self.cooldowns[domain]
+            self.trials.add(domain)
+            return True
+
+    def success(self, url):
+        domain = domain_of(url)
+        with self.lock:
+            self.failures.pop(domain, None)
+            self.trials.discard(domain)
+            if self.open_until.pop(domain, None) is not None:
+                self.cooldowns.pop(domain, None)
+                log.info(f"{domain}: circuit closed again")
+
+    def failure(self, url):
+        domain = domain_of(url)
+        with self.lock:
+            count = self.failures[domain] = self.failures.get(domain, 0) + 1
+            if domain in self.open_until:
+                if domain not in self.trials:
+                    return
+                # The half-open trial failed: open again for longer
+                self.trials.discard(domain)
+                cooldown = min(self.max_cooldown, self.cooldowns[domain] * 2)
+            elif count < self.threshold:
+                return
+            else:
+                cooldown = self.cooldown
+                self.trips += 1
+                METRICS.count('circuit_opened', domain=domain)
+                log.warning(f"{domain}: {count} failures in a row, holding its retries for {cooldown:.0f}s")
+            self.cooldowns[domain] = cooldown
+            self.open_until[domain] = time.time() + cooldown
+
+    def retry_in(self):
+        """Seconds until the first open circuit lets a trial through, or None if none is open"""
+        with self.lock:
+            if not self.open_until:
+                return None
+            return max(0.0, min(self.open_until.values()) - time.time())
+
+    def report(self):
+        with self.lock:
+            opened = ', '.join(sorted(self.open_until)) or 'none'
+            return f"Circuit breaker: opened {self.trips} times; open now: {opened}"
+
+
+class DeadLetter:
+    """A failed item claimed for a retry"""
+
+    def __init__(self, key, kind, payload, attempts):
+        self.key = key
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"<{self.kind} {self.key}>"
+
+
+class DeadLetterStore:
+    """Items that failed, kept in SQLite with their error and when to try them again.
+
+    record() files a failure under its key (a profile URL): the error
+    class and message, the attempt count, and a next retry time that backs
+    off exponentially (base_delay, doubling per attempt, up to max_delay,
+    with jitter). After max_attempts failures an item is exhausted and is
+    only reported until requeue_exhausted(). resolve() removes items that
+    have since been saved. claim_due() hands due items to a retry and
+    pushes their retry time back, so two workers sharing the file don't
+    retry the same item; a CircuitBreaker, if given, is fed every outcome
+    and holds back the items of a domain whose circuit is open.
+    """
+
+    def __init__(self, db_path, base_delay=30, max_delay=6 * 3600, max_attempts=5, breaker=None):
+        self.db_path = db_path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.breaker = breaker
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letters ('
+            ' key TEXT PRIMARY KEY,'
+            ' kind TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' error_class TEXT NOT NULL,'
+            ' error TEXT,'
+            ' attempts INTEGER NOT NULL,'
+            ' first_failed REAL NOT NULL,'
+            ' last_failed REAL NOT NULL,'
+            ' next_retry REAL,'
+            " state TEXT NOT NULL DEFAULT 'waiting')"
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS dead_letters_due ON dead_letters (state, next_retry)')
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def backoff(self, attempts):
+        """Seconds before retry number `attempts`, with jitter so retries don't arrive together"""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    def record(self, key, error_class, error=None, kind='item', payload=None):
+        """File a failure; returns the item's state (waiting for a retry, or exhausted)"""
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute('SELECT attempts, payload FROM dead_letters WHERE key = ?', (key,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            state = EXHAUSTED if attempts >= self.max_attempts else WAITING
+            # A retry without the original context (e.g. from another worker) keeps the payload it had
+            payload_json = json.dumps(payload, default=str) if payload is not None else (row[1] if row else 'null')
+            conn.execute(
+                'INSERT INTO dead_letters (key, kind, payload, error_class, error, attempts, first_failed, last_failed,'
+                ' next_retry, state) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET'
+                ' payload = excluded.payload, error_class = excluded.error_class, error = excluded.error,'
+                ' attempts = excluded.attempts, last_failed = excluded.last_failed, next_retry = excluded.next_retry,'
+                ' state = excluded.state',
+                (key, kind, payload_json, error_class, str(error or '')[:500], attempts, now, now,
+                 now + self.backoff(attempts) if state == WAITING else None, state)
+            )
+        if self.breaker:
+            self.breaker.failure(key)
+        METRICS.count('dead_letters', kind=kind, error=error_class)
+        log.warning(f"Dead-lettered {key} ({error_class}, attempt {attempts}, {state})")
+        return state
+
+    def resolve_many(self, keys):
+        """Forget failures whose items have now been saved; returns how many there were"""
+        keys = [key for key in keys if key]
+        if not keys:
+            return 0
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany('DELETE FROM dead_letters WHERE key = ?', [(key,) for key in keys])
+            resolved = conn.total_changes - before
+        if self.breaker:
+            for key in keys:
+                self.breaker.success(key)
+        if resolved:
+            METRICS.count('dead_letters_recovered', resolved)
+            log.info(f"Recovered {resolved} previously failed items")
+        return resolved
+
+    def rekey(self, changes):
+        """Re-file failures under new keys, given (old key, new key) pairs; a clash keeps the one under the new key"""
+        with self.transaction() as conn:
+            for old, new in changes:
+                conn.execute('UPDATE OR IGNORE dead_letters SET key = ? WHERE key = ?', (new, old))
+                conn.execute('DELETE FROM dead_letters WHERE key = ?', (old,))
+
+    def claim_due(self, kind=None, limit=50):
+        """Up to `limit` items due for a retry whose domain's circuit allows it"""
+        now = time.time()
+        sql = "SELECT key, kind, payload, attempts FROM dead_letters WHERE state = 'waiting' AND next_retry <= ?"
+        params = [now]
+        if kind:
+            sql += ' AND kind = ?'
+            params.append(kind)
+        with self.transaction() as conn:
+            rows = conn.execute(sql + ' ORDER BY next_retry', params).fetchall()
+            claimed = []
+            for key, row_kind, payload, attempts in rows:
+                if len(claimed) >= limit:
+                    break
+                if self.breaker is None or self.breaker.allow(key):
+                    claimed.append(DeadLetter(key, row_kind, json.loads(payload), attempts))
+            # Held back for one base delay; the retry's outcome resolves or reschedules them
+            conn.executemany('UPDATE dead_letters SET next_retry = ? WHERE key = ?',
+                             [(now + self.base_delay, letter.key) for letter in claimed])
+        return claimed
+
+    def next_due(self, kind=None):
+        """When the next waiting item is due, or None"""
+        sql = "SELECT MIN(next_retry) FROM dead_letters WHERE state = 'waiting'"
+        with self.lock:
+            row = self.conn.execute(sql + (' AND kind = ?' if kind else ''), (kind,) if kind else ()).fetchone()
+        return row[0]
+
+    def requeue_exhausted(self):
+        """Give exhausted items fresh attempts, due now; returns how many"""
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE dead_letters SET state = 'waiting', attempts = 0, next_retry = ? WHERE state = 'exhausted'",
+                (time.time(),)
+            ).rowcount
+
+    def remaining(self):
+        """(key, kind, error class, error, attempts, state, next retry) of every item still failing"""
+        with self.lock:
+            return self.conn.execute(
+                'SELECT key, kind, error_class, error, attempts, state, next_retry FROM dead_letters'
+                ' ORDER BY state, last_failed'
+            ).fetchall()
+
+    def report(self, limit=20):
+        rows = self.remaining()
+        if not rows:
+            return f"Dead letters {self.db_path}: nothing still failing"
+        by_class = {}
+        for row in rows:
+            by_class[row[2]] = by_class.get(row[2], 0) + 1
+        waiting = sum(1 for row in rows if row[5] == WAITING)
+        lines = [f"Dead letters {self.db_path}: {len(rows)} still failing ({waiting} waiting for a retry, "
+                 f"{len(rows) - waiting} exhausted); "
+                 + ', '.join(f"{name}: {count}" for name, count in sorted(by_class.items(), key=lambda e: -e[1]))]
+        for key, kind, error_class, error, attempts, state, next_retry in rows[:limit]:
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(next_retry)) if next_retry else 'not scheduled'
+            lines.append(f"  {key}  {error_class} after {attempts} attempts, {state}, next retry {when}"
+                         + (f": {error}" if error else ''))
+        if len(rows) > limit:
+            lines.append(f"  ... and {len(rows) - limit} more")
+        return '\n'.join(lines)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RetryScheduler:
+    """Runs due dead letters through a retry callback until nothing is due within max_wait seconds.
+
+    retry(letters) sends the claimed items down the scraper's usual path,
+    which resolves the ones it saves and records the ones that fail again
+    (pushing them further out). Items not due before the deadline, or on
+    a domain whose circuit stays open, are left for the next run.
+    """
+
+    def __init__(self, dead_letters, retry, kind=None, batch_size=50, max_wait=120):
+        self.dead_letters = dead_letters
+        self.retry = retry
+        self.kind = kind
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+    def run(self):
+        """Returns how many retries were made"""
+        deadline = time.time() + self.max_wait
+        retried = 0
+        while True:
+            letters = self.dead_letters.claim_due(self.kind, self.batch_size)
+            if letters:
+                retried += len(letters)
+                log.info(f"Retrying {len(letters)} failed items")
+                METRICS.count('retries', len(letters))
+                with METRICS.timer('retry'):
+                    self.retry(letters)
+                continue
+            next_due = self.dead_letters.next_due(self.kind)
+            if next_due is None:
+                break
+            now = time.time()
+            wake = next_due
+            if next_due <= now:
+                # Due, but held back by an open circuit
+                breaker = self.dead_letters.breaker
+                wake = now + max(1.0, (breaker.retry_in() if breaker else None) or 1.0)
+            if wake > deadline:
+                break
+            METRICS.pause(wake - now, 'retry_wait')
+        return retried
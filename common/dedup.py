@@ -0,0 +1,227 @@
+import os
+import logging
+import mmap
+import bisect
+import struct
+import hashlib
+import threading
+from array import array
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'DEDUPIX1'
+HEADER = struct.Struct('<8sQQ')  # magic, key count, last store row id folded into the base file
+WATERMARK = struct.Struct('<Q')  # last store row id folded into the base file or the log
+
+
+def key_hash(key):
+    """Stable 64-bit hash of a dedup key"""
+    return int.from_bytes(hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class DedupIndex:
+    """Compact on-disk membership index for already-scraped keys (profile URLs, company names).
+
+    The index replaces loading every key into a Python set at startup.
+      <path>      sorted array of 64-bit key hashes, memory-mapped and
+                  binary-searched, so opening it costs the same at 10k or 1M keys
+      <path>.log  hashes committed since the last compaction, append-only
+      <path>.rowid  last store row id whose keys are in the base file or log
+
+    Startup maps the base file, reads the (bounded) log, and catches up on any
+    store rows newer than the saved row id, so the index can't fall behind the
+    records it mirrors. add() only marks a key in memory; commit() makes
+    pending keys, and those of store rows saved since the last commit, durable
+    and should be called right after the matching records are saved. With 64-bit hashes the chance of a
+    false "already seen" is about n^2 / 2^65, i.e. negligible at a million keys.
+    """
+
+    def __init__(self, path, store=None, columns=(), compact_threshold=100_000):
+        self.path = path
+        self.log_path = path + '.log'
+        self.watermark_path = path + '.rowid'
+        self.store = store
+        self.columns = list(columns)
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()
+        self.base = None
+        self.base_file = None
+        self.base_map = None
+        self.base_count = 0
+        self.synced_rowid = 0
+        self.logged = set()
+        self.pending = set()
+
+        if not os.path.exists(self.path):
+            self.rebuild()
+        self.open_base()
+        self.load_log()
+        self.catch_up()
+
+    def open_base(self):
+        self.base_file = open(self.path, 'rb')
+        header = self.base_file.read(HEADER.size)
+        magic, count, rowid = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a dedup index")
+        self.base_count = count
+        self.synced_rowid = max(rowid, self.read_watermark())
+        if count:
+            self.base_map = mmap.mmap(self.base_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.base = memoryview(self.base_map)[HEADER.size:HEADER.size + count * 8].cast('Q')
+
+    def close_base(self):
+        if self.base is not None:
+            self.base.release()
+            self.base = None
+        if self.base_map is not None:
+            self.base_map.close()
+            self.base_map = None
+        if self.base_file is not None:
+            self.base_file.close()
+            self.base_file = None
+
+    def read_watermark(self):
+        try:
+            with open(self.watermark_path, 'rb') as f:
+                return WATERMARK.unpack(f.read(WATERMARK.size))[0]
+        except (OSError, struct.error):
+            return 0  # Missing or torn: catch up from the base header
+
+    def write_watermark(self, rowid):
+        tmp_path = self.watermark_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(WATERMARK.pack(rowid))
+        os.replace(tmp_path, self.watermark_path)
+        self.synced_rowid = rowid
+
+    def load_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        hashes = array('Q')
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        # Ignore a torn trailing entry from a crash mid-append
+        hashes.frombytes(data[:len(data) - len(data) % 8])
+        self.logged = set(hashes)
+
+    def store_hashes(self, since):
+        """(last row id, hashes of every key column value) for store rows after row id since"""
+        hashes = set()
+        rowid = since
+        for row in self.store.iter_values_since(self.columns, since):
+            rowid = row[0]
+            hashes.update(key_hash(value) for value in row[1:] if value is not None)
+        return rowid, hashes
+
+    def catch_up(self):
+        """Fold in store rows saved after the last compaction but never committed here"""
+        if self.store is None:
+            return
+        rowid, hashes = self.store_hashes(self.synced_rowid)
+        missing = {h for h in hashes if h not in self.logged and not self.in_base(h)}
+        if missing:
+            log.info(f"Dedup index caught up on {len(missing)} keys from the record store")
+        with self.lock:
+            self.pending.update(missing)
+            self.write_log(rowid)
+
+    def rebuild(self):
+        """Build the base file from scratch out of every record in the store"""
+        rowid, hashes = self.store_hashes(0) if self.store is not None else (0, set())
+        self.write_base(sorted(hashes), rowid)
+        for path in (self.log_path, self.watermark_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write_base(self, sorted_hashes, rowid):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(sorted_hashes), rowid))
+            array('Q', sorted_hashes).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def in_base(self, h):
+        if not self.base_count:
+            return False
+        i = bisect.bisect_left(self.base, h)
+        return i < self.base_count and self.base[i] == h
+
+    def __contains__(self, key):
+        h = key_hash(key)
+        return h in self.pending or h in self.logged or self.in_base(h)
+
+    def __len__(self):
+        return self.base_count + len(self.logged) + len(self.pending)
+
+    def add(self, key):
+        """Mark a key as seen for this run; durable only after commit()"""
+        with self.lock:
+            self.pending.add(key_hash(key))
+
+    def update(self, keys):
+        with self.lock:
+            self.pending.update(key_hash(key) for key in keys)
+
+    def __ior__(self, keys):
+        self.update(keys)
+        return self
+
+    def commit(self):
+        """Append pending keys and those of store rows saved since the last commit to the log"""
+        with self.lock:
+            rowid = self.synced_rowid
+            if self.store is not None:
+                # Only the rows saved since the last commit, so usually the batch just saved
+                rowid, hashes = self.store_hashes(self.synced_rowid)
+                self.pending.update(hashes)
+            self.write_log(rowid)
+
+    def write_log(self, rowid):
+        """Append pending keys to the log, then move the row id watermark; compact once the log is large"""
+        with self.lock:
+            new = array('Q', (h for h in self.pending if h not in self.logged and not self.in_base(h)))
+            self.pending.clear()
+            if new:
+                with open(self.log_path, 'ab') as f:
+                    new.tofile(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.logged.update(new)
+            # After the log append, so a crash in between only costs a re-scan of those rows
+            if rowid != self.synced_rowid:
+                self.write_watermark(rowid)
+            if len(self.logged) >= self.compact_threshold:
+                self.compact()
+
+    def compact(self):
+        """Merge the log into the sorted base file"""
+        with self.lock:
+            rowid = self.synced_rowid
+            merged = sorted(set(self.base if self.base_count else ()) | self.logged)
+            self.close_base()
+            self.write_base(merged, rowid)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.logged = set()
+            self.open_base()
+
+    def clear(self):
+        """Forget every key (e.g. once a refresh crawl that tracks its own progress completes)"""
+        with self.lock:
+            self.close_base()
+            for path in (self.path, self.log_path, self.watermark_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.logged = set()
+            self.pending = set()
+            self.rebuild()
+            self.open_base()
+
+    def close(self):
+        """Release the mapping; keys added since the last commit() are dropped with their unsaved records"""
+        with self.lock:
+            self.pending.clear()
+            self.close_base()
@@ -0,0 +1,319 @@
+"""Post-crawl enrichment: emails, phone numbers and addresses read off each record's own website.
+
+    python -m common.enrich businessbroker/business_brokers.db [--xlsx businessbroker/business_brokers.xlsx]
+
+Works on any scraper's record store. Every distinct Website is fetched
+once (brokers sharing a firm's site share the fetch), along with up to
+--pages - 1 of its contact/about pages, all concurrently. Results are
+written back into the store as they finish, in the Website Emails,
+Website Phones, Website Address and Website Checked columns; a rerun
+skips records that were already checked unless --refresh is given.
+"""
+import re
+import sys
+import time
+import logging
+import argparse
+from urllib.parse import urlsplit, unquote
+
+from common.fetcher import AsyncFetcher, CachingResolver
+from common.throttle import RateController
+from common.snapshot import PageSnapshot, compile_xpath
+from common.structured import StructuredData, first_value
+from common.store import RecordStore
+from common.metrics import METRICS
+from common.log import setup_logging
+
+log = logging.getLogger(__name__)
+
+COLUMNS = ['Website Emails', 'Website Phones', 'Website Address', 'Website Checked']
+MAX_VALUES = 5  # Per column; a franchise page can list every office
+# The directories themselves are not a broker's website
+DIRECTORY_HOSTS = ('axial.net', 'bizbuysell.com', 'businessbroker.net', 'ibba.org')
+CONTACT_WORDS = ('contact', 'about', 'team', 'people', 'office', 'location')  # Most useful first
+
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}')
+# North American numbers, with a separator between exchange and line so order and ID numbers don't match
+PHONE_RE = re.compile(r'(?<![\d/.-])(?:\+?1[\s.-]?)?\(?([2-9]\d{2})\)?[\s.-]?([2-9]\d{2})[\s.-](\d{4})(?![\d-])')
+ADDRESS_RE = re.compile(
+    r"\b\d{1,6}\s+(?:[A-Z0-9][\w.'-]*\s+){1,5}"
+    r"(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Court|Ct|Parkway|Pkwy|Place|Pl|"
+    r"Highway|Hwy|Circle|Cir|Square|Sq|Plaza|Terrace|Trail)\.?"
+    r"(?:,?\s+(?:Suite|Ste|Unit|Floor|Fl|#)\.?\s*[\w-]+)?"
+    r",?\s+[A-Z][A-Za-z.]*(?:\s+[A-Z][A-Za-z.]*){0,3},\s*[A-Z]{2}\s+\d{5}(?:-\d{4})?\b"
+)
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+PLACEHOLDER_DOMAINS = ('example.com', 'domain.com', 'email.com', 'yourdomain.com', 'sentry.io', 'wixpress.com')
+TEXT_XPATH = "//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]"
+MAILTO_XPATH = "//a[starts-with(@href, 'mailto:')]/@href"
+TEL_XPATH = "//a[starts-with(@href, 'tel:')]/@href"
+CFEMAIL_XPATH = "//*[@data-cfemail]/@data-cfemail"
+LINK_XPATH = "//a[@href]"
+
+
+def site_url(value):
+    """Fetchable URL for a Website cell ('www.firm.com' gets a scheme), or None if it isn't one"""
+    value = str(value or '').strip()
+    if not value or ' ' in value or '.' not in value:
+        return None
+    if not value.startswith(('http://', 'https://')):
+        value = 'http://' + value.lstrip('/')
+    parts = urlsplit(value)
+    if not parts.hostname or '.' not in parts.hostname or parts.hostname.endswith(DIRECTORY_HOSTS):
+        return None
+    return value if parts.path else parts._replace(path='/').geturl()
+
+
+def same_site(url, site):
+    host, site_host = urlsplit(url).hostname or '', urlsplit(site).hostname or ''
+    return host.removeprefix('www.') == site_host.removeprefix('www.')
+
+
+def add_unique(values, value):
+    if value and value not in values:
+        values.append(value)
+
+
+def clean_email(value):
+    email = unquote(value).split('?')[0].strip().strip('.').lower()
+    if not EMAIL_RE.fullmatch(email) or email.endswith(IMAGE_SUFFIXES):
+        return None
+    return None if email.split('@')[1].endswith(PLACEHOLDER_DOMAINS) else email
+
+
+def decode_cfemail(encoded):
+    """Address hidden by Cloudflare's email obfuscation (hex, XORed with its first byte)"""
+    try:
+        data = bytes.fromhex(encoded)
+    except ValueError:
+        return None
+    return bytes(byte ^ data[0] for byte in data[1:]).decode('utf-8', 'replace') if data else None
+
+
+def format_phone(match):
+    return f"({match.group(1)}) {match.group(2)}-{match.group(3)}"
+
+
+def schema_contacts(value, found):
+    """Emails, telephones and 'street, city, ST zip' addresses anywhere in schema.org items"""
+    if isinstance(value, list):
+        for entry in value:
+            schema_contacts(entry, found)
+    elif isinstance(value, dict):
+        if any(key in value for key in ('streetAddress', 'postalCode')):
+            street, city, region, postcode = (str(first_value(value.get(key)) or '').strip() for key in
+                                              ('streetAddress', 'addressLocality', 'addressRegion', 'postalCode'))
+            region_part = ' '.join(part for part in (region, postcode) if part)
+            add_unique(found['addresses'], ', '.join(part for part in (street, city, region_part) if part))
+        for key, entry in value.items():
+            if key == 'email' and isinstance(entry, str):
+                add_unique(found['emails'], clean_email(entry.removeprefix('mailto:')))
+            elif key == 'telephone' and isinstance(entry, str):
+                match = PHONE_RE.search(entry)
+                if match:
+                    add_unique(found['phones'], format_phone(match))
+            elif not key.startswith('@'):
+                schema_contacts(entry, found)
+
+
+def extract_contacts(snapshot):
+    """Emails, phone numbers and postal addresses on a page, each deduplicated in page order"""
+    found = {'emails': [], 'phones': [], 'addresses': []}
+    if snapshot.tree is None:
+        return found
+    structured = StructuredData(snapshot)
+    items = structured.microdata() + structured.json_ld()
+    schema_contacts(items, found)
+    for href in compile_xpath(MAILTO_XPATH)(snapshot.tree):
+        add_unique(found['emails'], clean_email(href[len('mailto:'):]))
+    for encoded in compile_xpath(CFEMAIL_XPATH)(snapshot.tree):
+        add_unique(found['emails'], clean_email(decode_cfemail(encoded) or ''))
+    for href in compile_xpath(TEL_XPATH)(snapshot.tree):
+        # tel: numbers are usually bare digits ('+15125550123'), which PHONE_RE won't take from text
+        digits = re.sub(r'\D', '', unquote(href[len('tel:'):]))
+        digits = digits[1:] if len(digits) == 11 and digits.startswith('1') else digits
+        if len(digits) == 10:
+            add_unique(found['phones'], f"({digits[:3]}) {digits[3:6]}-{digits[6:]}")
+    text = ' '.join(' '.join(compile_xpath(TEXT_XPATH)(snapshot.tree)).split())
+    for email in EMAIL_RE.findall(text):
+        add_unique(found['emails'], clean_email(email))
+    for match in PHONE_RE.finditer(text):
+        add_unique(found['phones'], format_phone(match))
+    for address in ADDRESS_RE.findall(text):
+        add_unique(found['addresses'], address)
+    return found
+
+
+def contact_links(snapshot, site, limit):
+    """Up to `limit` same-site contact/about pages linked from a page, most useful first"""
+    ranked = []
+    for link in compile_xpath(LINK_XPATH)(snapshot.tree) if snapshot.tree is not None else ():
+        url = snapshot.link(link)
+        if not url or not url.startswith(('http://', 'https://')) or not same_site(url, site):
+            continue
+        url = url.split('#')[0]
+        label = f"{urlsplit(url).path} {link.text_content()}".lower()
+        rank = next((idx for idx, word in enumerate(CONTACT_WORDS) if word in label), None)
+        if rank is not None and url.rstrip('/') != site.rstrip('/') and url not in (u for _, u in ranked):
+            ranked.append((rank, url))
+    return [url for _, url in sorted(ranked, key=lambda entry: entry[0])[:limit]]
+
+
+class WebsiteEnricher:
+    """Fetch every record's website and contact pages concurrently and write what they list back into the store.
+
+    One AsyncFetcher runs the whole stage: home pages are queued first,
+    and the contact pages found on each are queued as it is parsed.
+    There are at most `per_host` requests per site at a time, a connect
+    and a total timeout per request, and no retries. A shared
+    CachingResolver means a dead domain costs one DNS lookup. Once all of
+    a site's pages are in, every record with that website is updated,
+    in batches of batch_size per transaction.
+    """
+
+    def __init__(self, store, website_column='Website', concurrency=100, per_host=2, timeout=10, connect_timeout=4,
+                 max_pages=3, refresh=False, cache=None, resolver=None, batch_size=100):
+        self.store = store
+        self.website_column = website_column
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout  # Seconds per request, start to last byte
+        self.connect_timeout = connect_timeout  # Seconds to connect; dead hosts fail fast
+        self.max_pages = max_pages  # Pages per site, home page included
+        self.refresh = refresh  # Re-check records that already have a Website Checked value
+        self.cache = cache
+        self.resolver = resolver or CachingResolver()
+        self.rate = RateController(max_window=per_host)
+        self.batch_size = batch_size
+        self.sites = {}  # Site URL -> row ids of its records, pages still in flight and what was found so far
+        self.updates = []  # (row id, changes) waiting for the next batch
+        self.enriched = 0
+        self.stats = {'sites': 0, 'unreachable': 0, 'emails': 0, 'phones': 0, 'addresses': 0}
+        self.fetcher = None
+
+    def collect_sites(self):
+        """Distinct websites of the records still to check"""
+        # By row id: rows imported from the earlier workbooks have no key but still have a website
+        for row_id, record in self.store.iter_rows():
+            if record.get('Website Checked') and not self.refresh:
+                continue
+            site = site_url(record.get(self.website_column))
+            if site:
+                entry = self.sites.setdefault(site, {'rows': [], 'pending': 1, 'reached': False,
+                                                     'emails': [], 'phones': [], 'addresses': []})
+                entry['rows'].append(row_id)
+        return list(self.sites)
+
+    def parse(self, page_html, item):
+        site, url = item
+        snapshot = PageSnapshot(page_html, url)
+        found = extract_contacts(snapshot)
+        if url == site and self.max_pages > 1:
+            found['links'] = contact_links(snapshot, site, self.max_pages - 1)
+        return found
+
+    def on_result(self, item, found):
+        """Merge a page into its site; returns the contact pages to fetch next"""
+        site, url = item
+        entry = self.sites[site]
+        entry['pending'] -= 1
+        spawned = []
+        if found is not None:
+            entry['reached'] = True
+            for field in ('emails', 'phones', 'addresses'):
+                for value in found[field]:
+                    add_unique(entry[field], value)
+            for link in found.get('links', ()):
+                spawned.append((site, link))
+            entry['pending'] += len(spawned)
+        if entry['pending'] == 0:
+            self.finish(site)
+        return spawned
+
+    def finish(self, site):
+        entry = self.sites.pop(site)
+        self.stats['sites'] += 1
+        if not entry['reached']:
+            self.stats['unreachable'] += 1
+        for field in ('emails', 'phones', 'addresses'):
+            self.stats[field] += bool(entry[field])
+        changes = {
+            'Website Emails': '; '.join(entry['emails'][:MAX_VALUES]) or 'Not found',
+            'Website Phones': '; '.join(entry['phones'][:MAX_VALUES]) or 'Not found',
+            'Website Address': '; '.join(entry['addresses'][:MAX_VALUES]) or 'Not found',
+            'Website Checked': time.strftime('%Y-%m-%d') if entry['reached'] else 'Unreachable',
+        }
+        self.updates.extend((row_id, changes) for row_id in entry['rows'])
+        if len(self.updates) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.updates:
+            return
+        with METRICS.timer('save'):
+            updated = self.store.update_rows(self.updates)
+        self.enriched += updated
+        METRICS.count('records_enriched', updated)
+        self.updates.clear()
+        log.info(f"→ Enriched {self.enriched} records", extra={'enriched': self.enriched})
+
+    def run(self):
+        sites = self.collect_sites()
+        records = sum(len(entry['rows']) for entry in self.sites.values())
+        log.info(f"Enriching {records} records from {len(sites)} websites")
+        self.fetcher = AsyncFetcher(concurrency=self.concurrency, per_host=self.per_host, timeout=self.timeout,
+                                    connect_timeout=self.connect_timeout, cache=self.cache, rate=self.rate,
+                                    retries=0, resolver=self.resolver)
+        try:
+            self.fetcher.run([(site, site) for site in sites], self.parse, self.on_result)
+        finally:
+            self.flush()
+        log.info(self.report())
+        return self.enriched
+
+    def report(self):
+        stats = self.stats
+        pages = self.fetcher.fetched + self.fetcher.failed if self.fetcher else 0
+        return (f"Websites: {stats['sites']} checked, {stats['unreachable']} unreachable; emails on "
+                f"{stats['emails']}, phones on {stats['phones']}, addresses on {stats['addresses']}. "
+                f"{pages} pages at {self.fetcher.pages_per_second() if self.fetcher else 0:.1f} pages/sec, "
+                f"{self.resolver.lookups} DNS lookups ({self.resolver.hits} cached)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add emails, phones and addresses from each record's own website "
+                                                 "to a scraper's record store")
+    parser.add_argument('db', help='record store written by a scraper, e.g. businessbroker/business_brokers.db')
+    parser.add_argument('--website-column', default='Website', help='column holding the website (default: Website)')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight across all sites')
+    parser.add_argument('--per-host', type=int, default=2, help='requests in flight to one site')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds per request, start to last byte')
+    parser.add_argument('--pages', type=int, default=3, help='pages per site, home page included')
+    parser.add_argument('--refresh', action='store_true', help='re-check records that were already checked')
+    parser.add_argument('--xlsx', metavar='PATH', help='export the store to this workbook afterwards')
+    parser.add_argument('--metrics', metavar='DIR', help='write enrich.prom and a JSON summary to DIR')
+    parser.add_argument('--log-json', action='store_true', help='log one JSON object per line')
+    parser.add_argument('--log-level', default='INFO', help='default: INFO')
+    args = parser.parse_args()
+
+    setup_logging(json_lines=args.log_json, level=args.log_level)
+    if args.metrics:
+        METRICS.enable(scraper='enrich')
+    store = RecordStore(args.db, [], key_column=None)
+    try:
+        WebsiteEnricher(store, website_column=args.website_column, concurrency=args.concurrency,
+                        per_host=args.per_host, timeout=args.timeout, max_pages=args.pages,
+                        refresh=args.refresh).run()
+        if args.xlsx:
+            count = store.export_xlsx(args.xlsx)
+            log.info(f"Exported {count} records to {args.xlsx}")
+    finally:
+        store.close()
+        if args.metrics:
+            prom_path, summary_path = METRICS.write(args.metrics, 'enrich')
+            log.info(f"Wrote metrics to {prom_path} and {summary_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
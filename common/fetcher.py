@@ -0,0 +1,227 @@
+import time
+import socket
+import logging
+import random
+import asyncio
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+
+from common.http import USER_AGENTS
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+
+class CachingResolver(AbstractResolver):
+    """DNS answers kept across fetcher runs, failed lookups included.
+
+    aiohttp caches lookups per connector, so each AsyncFetcher.run would
+    resolve every host again. Failures are remembered for negative_ttl,
+    so a dead domain costs one lookup however many of its pages are
+    queued. `hosts` pins names to addresses like /etc/hosts does (e.g.
+    broker domains pointed at local stand-in sites).
+    """
+
+    def __init__(self, ttl=600, negative_ttl=300, hosts=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hosts = dict(hosts or {})
+        self.answers = {}  # (host, port, family) -> (expires at, results or the lookup error)
+        self.lookups = 0
+        self.hits = 0
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        key = (host, port, family)
+        cached = self.answers.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            if isinstance(cached[1], OSError):
+                raise cached[1]
+            return list(cached[1])
+        self.lookups += 1
+        try:
+            results = await ThreadedResolver().resolve(self.hosts.get(host, host), port, family)
+        except OSError as e:
+            self.answers[key] = (time.monotonic() + self.negative_ttl, e)
+            raise
+        for result in results:
+            result['hostname'] = host
+        self.answers[key] = (time.monotonic() + self.ttl, results)
+        return list(results)
+
+    async def close(self):
+        pass
+
+
+class AsyncFetcher:
+    """Fetch many pages concurrently with a global and a per-host in-flight limit.
+
+    Items are either URLs or (key, url) pairs. Each fetched page is handed to
+    parse(html, item), and on_result(item, record) is called on the event loop
+    thread as soon as that page finishes, so callers can stream records into
+    their normal save path. Pages that fail to download or parse are reported
+    with record=None; an exception raised by on_result stops the run and is
+    re-raised from run(). Items on_result returns are queued too (e.g. a site's
+    contact pages found on its home page). With a ResponseCache, fresh pages are parsed straight from
+    disk, stale ones are revalidated with a conditional GET, and pages that fail
+    to parse are dropped from the cache. With a RateController, requests wait
+    for the domain's pace and in-flight window, every response feeds it, and
+    throttled requests are retried up to `retries` times. The time each item
+    took (download plus parse) is kept in self.latencies. A resolver (such
+    as a CachingResolver) replaces aiohttp's per-connector DNS cache.
+    """
+
+    def __init__(self, concurrency=8, per_host=4, timeout=20, user_agent=None, cookies=None, headers=None,
+                 cache=None, cache_ttl=None, rate=None, retries=2, connect_timeout=None, resolver=None):
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout  # Seconds to get a connection; None = only the total timeout
+        self.resolver = resolver
+        self.headers = {
+            'User-Agent': user_agent or random.choice(USER_AGENTS),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+        }
+        self.headers.update(headers or {})
+        self.cookies = cookies or {}
+        self.cache = cache
+        self.cache_ttl = cache_ttl  # None = the cache's default TTL
+        self.rate = rate  # RateController shared with the scraper's other request paths
+        self.retries = retries  # Extra attempts after a throttle signal, only with a rate controller
+        self.fetched = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.latencies = []  # Seconds per item, download + parse
+
+    @staticmethod
+    def item_url(item):
+        return item[1] if isinstance(item, tuple) else item
+
+    async def request(self, session, url, entry):
+        """One GET paced by the rate controller: (status, body, headers), status None on a network error"""
+        if self.rate is not None:
+            await self.rate.acquire(url)
+        status, page_html, headers = None, None, None
+        start = time.perf_counter()
+        try:
+            async with session.get(url, headers=self.cache.conditional_headers(entry) if entry else None) as resp:
+                status, headers = resp.status, resp.headers
+                if status == 200:
+                    page_html = await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning(f"Async fetch failed for {url}: {e.__class__.__name__} {str(e)}", extra={'url': url})
+        finally:
+            if self.rate is not None:
+                self.rate.release(url)
+        latency = time.perf_counter() - start
+        METRICS.observe('http_fetch', latency)
+        METRICS.count('http_responses', status=status or 'error')
+        throttled = False
+        if self.rate is not None:
+            throttled = self.rate.record(url, status=status, latency=latency, page_html=page_html,
+                                         retry_after=headers.get('Retry-After') if headers else None,
+                                         error=status is None)
+        return status, page_html, headers, throttled
+
+    async def download(self, session, url):
+        """Page body from the cache or the network, or None"""
+        entry = None
+        if self.cache is not None:
+            cached = self.cache.get_fresh(url, self.cache_ttl)
+            if cached is not None:
+                return cached
+            entry = self.cache.lookup(url)
+        attempts = 1 + (self.retries if self.rate is not None else 0)
+        for _ in range(attempts):
+            status, page_html, headers, throttled = await self.request(session, url, entry)
+            # 429/503 and network errors are retried once the controller lets the domain go again;
+            # a challenge page came back as a 200 and is left to the caller's fallback
+            if not throttled or status == 200:
+                break
+        if status == 304 and entry:
+            page_html = self.cache.not_modified(url, entry)
+            if page_html is None:
+                # Unreadable cached body: fetch it again unconditionally
+                self.cache.discard(url)
+                return await self.download(session, url)
+            return page_html
+        if status != 200:
+            if status is not None:
+                log.warning(f"HTTP {status} for {url}", extra={'url': url, 'status': status})
+            return None
+        if self.cache is not None:
+            self.cache.put(url, page_html, headers)
+        return page_html
+
+    async def fetch_one(self, session, item, parse):
+        url = self.item_url(item)
+        page_html = await self.download(session, url)
+        if page_html is None:
+            return None
+        try:
+            with METRICS.timer('parse'):
+                record = parse(page_html, item)
+        except Exception as e:
+            log.warning(f"Error parsing {url}: {str(e)}")
+            record = None
+        if record is None and self.cache is not None:
+            self.cache.discard(url)
+        return record
+
+    async def worker(self, session, queue, parse, on_result):
+        while True:
+            item = await queue.get()
+            try:
+                start = time.perf_counter()
+                record = await self.fetch_one(session, item, parse)
+                self.latencies.append(time.perf_counter() - start)
+                if record is None:
+                    self.failed += 1
+                else:
+                    self.fetched += 1
+                for extra in on_result(item, record) or ():
+                    queue.put_nowait(extra)
+            finally:
+                queue.task_done()
+
+    async def fetch_all(self, items, parse, on_result):
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        # The connector enforces the per-host cap; the worker count caps total in-flight requests
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, resolver=self.resolver)
+        timeout = aiohttp.ClientTimeout(total=self.timeout, sock_connect=self.connect_timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=self.headers, cookies=self.cookies) as session:
+            workers = [asyncio.create_task(self.worker(session, queue, parse, on_result))
+                       for _ in range(min(self.concurrency, max(1, len(items))))]
+            # Workers only stop by raising (e.g. on_result failing to save): stop the rest and re-raise
+            # rather than wait on a queue nobody is draining
+            joined = asyncio.create_task(queue.join())
+            await asyncio.wait([joined, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in (joined, *workers):
+                task.cancel()
+            results = await asyncio.gather(joined, *workers, return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                raise errors[0]
+
+    def run(self, items, parse, on_result):
+        """Blocking entry point: fetch every item and return the list of items that failed"""
+        failures = []
+
+        def collect(item, record):
+            if record is None:
+                failures.append(item)
+            return on_result(item, record)
+
+        start = time.perf_counter()
+        asyncio.run(self.fetch_all(list(items), parse, collect))
+        self.elapsed += time.perf_counter() - start
+        return failures
+
+    def pages_per_second(self):
+        total = self.fetched + self.failed
+        return total / self.elapsed if self.elapsed else 0.0
@@ -0,0 +1,191 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+from common.snapshot import node_text
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+NEW, CHANGED, UNCHANGED = 'new', 'changed', 'unchanged'
+
+
+def digest(*parts):
+    """Short stable hash of some strings"""
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def card_digest(container):
+    """Hash of a listing card's visible text, whitespace-normalised"""
+    return digest(' '.join(node_text(container).split()))
+
+
+class ListingFingerprints:
+    """Digests of directory listing pages and the cards on them, kept in SQLite between crawls.
+
+    A crawl calls begin_run(), then check_page() for every listing page it
+    walks, with the (profile URL, card digest) pairs on it. Each card comes
+    back as new, changed or unchanged against the last crawl that saw it
+    in the same scope (a broker listed under two states has a card in
+    each), and the page as changed or not. A card is only unchanged if it
+    matches the card seen when its profile was last saved (mark_visited()),
+    so a change first noticed by a run that skipped the profile is still
+    refreshed later. finish_run() compares the URLs
+    seen this run with everything seen before and returns the delta:
+    profiles added, whose card changed, and no longer listed anywhere.
+    A crawl that stops early keeps its run open, so a resumed crawl
+    finishes the same run and its delta covers the whole interval.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cards ('
+            ' url TEXT NOT NULL,'
+            ' scope TEXT NOT NULL,'
+            ' digest TEXT NOT NULL,'
+            ' first_seen REAL NOT NULL,'
+            ' changed_at REAL NOT NULL,'
+            ' last_seen REAL NOT NULL,'
+            ' visited_digest TEXT,'
+            ' PRIMARY KEY (url, scope))'
+        )
+        if 'visited_digest' not in [row[1] for row in self.conn.execute('PRAGMA table_info(cards)')]:
+            # Files from before visits were tracked: take every card as visited as last seen
+            self.conn.execute('ALTER TABLE cards ADD COLUMN visited_digest TEXT')
+            self.conn.execute('UPDATE cards SET visited_digest = digest')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' scope TEXT NOT NULL,'
+            ' page INTEGER NOT NULL,'
+            ' digest TEXT NOT NULL,'
+            ' changed_at REAL NOT NULL,'
+            ' last_seen REAL NOT NULL,'
+            ' PRIMARY KEY (scope, page))'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)')
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def begin_run(self):
+        """Open a run unless one is already open (a resumed crawl); returns its start time"""
+        with self.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('run_started', ?)", (time.time(),))
+            return conn.execute("SELECT value FROM meta WHERE key = 'run_started'").fetchone()[0]
+
+    def listed(self, scope):
+        """True if the open run has seen cards on any listing page of a scope"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM pages WHERE scope = ? AND last_seen >= (SELECT value FROM meta WHERE key = 'run_started')"
+                ' LIMIT 1', (scope,)
+            ).fetchone() is not None
+
+    def check_page(self, scope, page, cards):
+        """Record a listing page's (url, card digest) pairs; returns (page changed, {url: NEW|CHANGED|UNCHANGED})"""
+        now = time.time()
+        page_digest = digest(*sorted(f"{url} {card}" for url, card in cards))
+        statuses = {}
+        with self.transaction() as conn:
+            previous = conn.execute('SELECT digest FROM pages WHERE scope = ? AND page = ?', (scope, page)).fetchone()
+            page_changed = previous is None or previous[0] != page_digest
+            conn.execute(
+                'INSERT INTO pages (scope, page, digest, changed_at, last_seen) VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT (scope, page) DO UPDATE SET last_seen = excluded.last_seen, digest = excluded.digest,'
+                ' changed_at = CASE WHEN pages.digest != excluded.digest THEN excluded.changed_at'
+                ' ELSE pages.changed_at END', (scope, page, page_digest, now, now)
+            )
+            for url, card in cards:
+                row = conn.execute('SELECT visited_digest FROM cards WHERE url = ? AND scope = ?',
+                                   (url, scope)).fetchone()
+                statuses[url] = NEW if row is None else UNCHANGED if row[0] == card else CHANGED
+            conn.executemany(
+                'INSERT INTO cards (url, scope, digest, first_seen, changed_at, last_seen) VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (url, scope) DO UPDATE SET last_seen = excluded.last_seen, digest = excluded.digest,'
+                ' changed_at = CASE WHEN cards.digest != excluded.digest THEN excluded.changed_at'
+                ' ELSE cards.changed_at END', [(url, scope, card, now, now, now) for url, card in cards]
+            )
+        METRICS.count('listing_pages', status='changed' if page_changed else 'unchanged')
+        return page_changed, statuses
+
+    def mark_visited(self, urls):
+        """Record that these profiles were just saved from the cards last seen for them"""
+        urls = [url for url in urls if url]
+        if not urls:
+            return
+        with self.transaction() as conn:
+            conn.executemany('UPDATE cards SET visited_digest = digest WHERE url = ?', [(url,) for url in urls])
+
+    def urls(self):
+        with self.lock:
+            return {row[0] for row in self.conn.execute('SELECT DISTINCT url FROM cards')}
+
+    def rekey(self, changes):
+        """Rename cards' profile URLs, given (old URL, new URL) pairs; a clash keeps the card under the new URL"""
+        with self.transaction() as conn:
+            for old, new in changes:
+                conn.execute('UPDATE OR IGNORE cards SET url = ? WHERE url = ?', (new, old))
+                conn.execute('DELETE FROM cards WHERE url = ?', (old,))
+
+    def finish_run(self):
+        """Close the open run and return its delta, or None if no run was open or it saw no listing pages"""
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'run_started'").fetchone()
+            if row is None:
+                return None
+            started = row[0]
+            if not conn.execute('SELECT 1 FROM pages WHERE last_seen >= ? LIMIT 1', (started,)).fetchone():
+                # Nothing was listed (a worker that joined after the crawl ended): no delta to report
+                conn.execute("DELETE FROM meta WHERE key = 'run_started'")
+                return None
+            previous = conn.execute("SELECT value FROM meta WHERE key = 'last_finished'").fetchone()
+            added = [url for (url,) in conn.execute(
+                'SELECT url FROM cards GROUP BY url HAVING MIN(first_seen) >= ? ORDER BY url', (started,))]
+            removed = [url for (url,) in conn.execute(
+                'SELECT url FROM cards GROUP BY url HAVING MAX(last_seen) < ? ORDER BY url', (started,))]
+            changed = [url for (url,) in conn.execute(
+                'SELECT url FROM cards GROUP BY url HAVING MIN(first_seen) < ? AND MAX(changed_at) >= ?'
+                ' AND MAX(last_seen) >= ? ORDER BY url', (started, started, started))]
+            pages_seen, pages_changed = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(changed_at >= ?), 0) FROM pages WHERE last_seen >= ?',
+                (started, started)).fetchone()
+            # Cards and pages this run didn't see are gone; the delta above is their last mention
+            conn.execute('DELETE FROM cards WHERE last_seen < ?', (started,))
+            conn.execute('DELETE FROM pages WHERE last_seen < ?', (started,))
+            conn.execute("DELETE FROM meta WHERE key = 'run_started'")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_finished', ?)", (now,))
+        return {
+            'started': started,
+            'finished': now,
+            'previous_crawl': previous[0] if previous else None,
+            'added': added,
+            'changed': changed,
+            'removed': removed,
+            'pages_seen': pages_seen,
+            'pages_changed': pages_changed,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
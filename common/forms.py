@@ -0,0 +1,98 @@
+import re
+import logging
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+from selenium.common.exceptions import NoSuchElementException
+
+from common.snapshot import PageSnapshot, node_text
+
+log = logging.getLogger(__name__)
+
+# Fillable controls in document order (the live page and the snapshot list them identically)
+CONTROLS_XPATH = (".//input[not(@type='hidden' or @type='submit' or @type='button' or @type='image'"
+                  " or @type='reset' or @type='checkbox' or @type='radio')] | .//select | .//textarea")
+SUBMIT_XPATH = ".//button[not(@type) or @type='submit'] | .//input[@type='submit']"
+
+
+def field_key(text):
+    """Normalise a label/name for matching: 'First Name', 'first_name' and 'firstName' all become 'firstname'"""
+    return re.sub(r'[^a-z0-9]', '', (text or '').lower())
+
+
+def control_names(snapshot, control):
+    """Every name a form control goes by: its label(s), placeholder, aria-label, name and id"""
+    names = []
+    control_id = control.get('id')
+    if control_id:
+        names += [node_text(label) for label in snapshot.find_all(f"//label[@for='{control_id}']")]
+    names += [node_text(label) for label in control.iterancestors('label')]
+    names += [control.get(attr) for attr in ('placeholder', 'aria-label', 'name', 'id')]
+    return [key for key in (field_key(name) for name in names) if key]
+
+
+def match_fields(snapshot, controls, fields):
+    """{field: index into controls}, preferring exact name matches over partial ones"""
+    names = [control_names(snapshot, control) for control in controls]
+    matches, used = {}, set()
+    for exact in (True, False):
+        for field in fields:
+            key = field_key(field)
+            if field in matches or not key:
+                continue
+            for i, control_keys in enumerate(names):
+                if i in used:
+                    continue
+                if any(name == key if exact else (key in name or (len(name) >= 4 and name in key))
+                       for name in control_keys):
+                    matches[field] = i
+                    used.add(i)
+                    break
+    return matches
+
+
+def set_control(element, tag, value):
+    if tag == 'select':
+        select = Select(element)
+        try:
+            select.select_by_visible_text(value)
+        except NoSuchElementException:
+            # Fall back to the first option that contains the value, e.g. 'M&A Advisory' in 'M&A Advisory Firm'
+            for option in select.options:
+                if value.lower() in option.text.lower():
+                    option.click()
+                    break
+            else:
+                log.warning(f"no option matching '{value}'")
+    else:
+        element.clear()
+        element.send_keys(value)
+
+
+def fill_form(driver, values, form_xpath='//form'):
+    """Fill a form by matching each key of values to a control's label, placeholder or name, then submit it.
+
+    Field matching runs on one page snapshot; only the typing and clicks go
+    through WebDriver. Returns the number of fields filled, or 0 if the
+    form isn't on the page.
+    """
+    snapshot = PageSnapshot.capture(driver)
+    form = snapshot.first(form_xpath)
+    live_forms = driver.find_elements(By.XPATH, form_xpath)
+    if form is None or not live_forms:
+        return 0
+    controls = snapshot.find_all(CONTROLS_XPATH, form)
+    live_controls = live_forms[0].find_elements(By.XPATH, CONTROLS_XPATH)
+    matches = match_fields(snapshot, controls, values)
+    for field, value in values.items():
+        if field not in matches:
+            log.warning(f"no form field found for '{field}'")
+            continue
+        i = matches[field]
+        set_control(live_controls[i], controls[i].tag, value)
+
+    buttons = live_forms[0].find_elements(By.XPATH, SUBMIT_XPATH)
+    if buttons:
+        buttons[0].click()
+    else:
+        live_forms[0].submit()
+    return len(matches)
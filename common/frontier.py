@@ -0,0 +1,193 @@
+import re
+import logging
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+# Paths that are files, not pages
+ASSET_EXTENSIONS = ('.css', '.js', '.json', '.xml', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+                    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', '.woff', '.woff2', '.ttf', '.mp4')
+
+# Query parameters that never pick a different page: campaign tracking, click ids, referrers
+TRACKING_PREFIXES = ('utm_', 'mc_', 'pk_')
+TRACKING_PARAMS = ('fbclid', 'gclid', 'msclkid', 'dclid', 'yclid', 'ref', 'referrer', 'source', 'returnurl')
+
+PROFILE, DUPLICATE, NOT_PROFILE, OFFSITE, NOT_PAGE = 'profile', 'duplicate', 'not a profile', 'offsite', 'not a page'
+
+
+def keeps_param(key, keep_query):
+    """True if a query parameter is part of the canonical URL: named in keep_query, or any
+    non-tracking parameter when keep_query is None. Names compare case-insensitively."""
+    key = key.lower()
+    if keep_query is None:
+        return not key.startswith(TRACKING_PREFIXES) and key not in TRACKING_PARAMS
+    return key in keep_query
+
+
+def canonical_url(url, base=None, keep_query=(), trailing_slash=None):
+    """One spelling per page: absolute, scheme and host lower-cased, no default port, fragment or
+    query parameters other than keep_query (None: all but tracking ones), repeated slashes collapsed.
+    trailing_slash True or False forces the final slash on or off. None for anything that isn't an
+    http(s) link."""
+    if not url:
+        return None
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None  # mailto:, tel:, javascript:, relative links without a base
+    try:
+        port = parts.port
+    except ValueError:
+        return None
+    host = parts.hostname.rstrip('.')
+    if port and str(port) != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    if trailing_slash is True and not path.endswith('/'):
+        path += '/'
+    elif trailing_slash is False and path != '/':
+        path = path.rstrip('/')
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if keeps_param(key, keep_query)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class ProfileClassifier:
+    """Rule-based test of whether a link is a profile page, on its canonical URL alone.
+
+    A profile lives on one of `hosts` (subdomains included) or on the
+    host of the page linking to it (`base`), and its path matches one of
+    `patterns` (case-insensitive, anchored at both ends).
+    `keep_query` names the query parameters that pick a different profile;
+    every other parameter (tracking, sort order, return URLs) is dropped
+    from the canonical URL, as are fragments. With keep_query=None only
+    tracking parameters are dropped, for sites whose identifying
+    parameters aren't known (two ?id= profiles must not become one).
+    """
+
+    def __init__(self, hosts, patterns, keep_query=(), trailing_slash=None):
+        self.hosts = tuple(host.lower() for host in hosts)
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.keep_query = None if keep_query is None else tuple(key.lower() for key in keep_query)
+        self.trailing_slash = trailing_slash
+
+    def canonical(self, url, base=None):
+        """Canonical spelling of a link, or the link itself if it has none (for keys saved before canonicalizing)"""
+        return canonical_url(url, base, self.keep_query, self.trailing_slash) or url
+
+    def on_site(self, host, base=None):
+        if base and host == urlsplit(base).netloc.lower():
+            return True
+        host = host.split(':')[0]
+        return any(host == site or host.endswith('.' + site) for site in self.hosts)
+
+    def classify(self, url, base=None):
+        """(canonical URL or None, verdict): PROFILE, NOT_PROFILE, OFFSITE or NOT_PAGE"""
+        canonical = canonical_url(url, base, self.keep_query, self.trailing_slash)
+        if canonical is None:
+            return None, NOT_PAGE
+        parts = urlsplit(canonical)
+        if not self.on_site(parts.netloc, base):
+            return canonical, OFFSITE
+        if parts.path.lower().endswith(ASSET_EXTENSIONS):
+            return canonical, NOT_PAGE
+        if not any(pattern.fullmatch(parts.path) for pattern in self.patterns):
+            return canonical, NOT_PROFILE
+        return canonical, PROFILE
+
+
+class ProfileFrontier:
+    """Profile URLs queued for a visit this run, each once under its canonical spelling.
+
+    classify() turns away links that aren't profiles; add() turns away
+    profiles already queued (on an earlier page, under another state, or
+    with a different query string). Both count what they turn away, since
+    each would have cost a page load; report() sums that up as fetches
+    avoided. Each URL belongs to the scope (state) that queued it first,
+    and forget(scope) releases them when that scope is walked again
+    after a failure. A link the page itself labels as a profile is
+    trusted even if its path matches none of the classifier's patterns,
+    so a site's unfamiliar URL scheme costs a warning, not its profiles.
+    Thread-safe, so pool workers can share one frontier.
+    """
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.seen = {}  # Canonical URL -> scope that queued it
+        self.scopes = {}  # Scope -> its URLs
+        self.verdicts = {}  # Verdict -> links
+        self.unrecognised = 0  # Labelled profile links whose path no pattern matched
+        self.lock = threading.Lock()
+
+    def tally(self, verdict, n=1):
+        with self.lock:
+            self.verdicts[verdict] = self.verdicts.get(verdict, 0) + n
+        METRICS.count('frontier_links', n, verdict=verdict)
+
+    def classify(self, url, base=None, labelled=False):
+        """Canonical URL of a profile link, or None (counted as avoided) for anything else"""
+        canonical, verdict = self.classifier.classify(url, base)
+        if verdict == NOT_PROFILE and labelled:
+            with self.lock:
+                self.unrecognised += 1
+                first = self.unrecognised == 1
+            if first:
+                log.warning(f"Profile link with a path no profile pattern matches, kept: {url}")
+            return canonical
+        if verdict != PROFILE:
+            self.tally(verdict)
+            log.debug(f"Skipped link ({verdict}): {url}")
+            return None
+        return canonical
+
+    def add(self, url, scope=None):
+        """True if a canonical profile URL is new to the frontier"""
+        with self.lock:
+            new = url not in self.seen
+            if new:
+                self.seen[url] = scope
+                self.scopes.setdefault(scope, set()).add(url)
+        self.tally(PROFILE if new else DUPLICATE)
+        return new
+
+    def admit(self, url, base=None, scope=None):
+        """Canonical URL of a profile link not queued before, else None"""
+        url = self.classify(url, base)
+        return url if url and self.add(url, scope) else None
+
+    def mark(self, urls, scope=None):
+        """Queue URLs without counting them (listings restored from a checkpoint)"""
+        with self.lock:
+            for url in urls:
+                if url not in self.seen:
+                    self.seen[url] = scope
+                    self.scopes.setdefault(scope, set()).add(url)
+
+    def forget(self, scope):
+        """Release a scope's URLs before it is walked again"""
+        with self.lock:
+            for url in self.scopes.pop(scope, ()):
+                del self.seen[url]
+
+    def avoided(self):
+        with self.lock:
+            return sum(count for verdict, count in self.verdicts.items() if verdict != PROFILE)
+
+    def report(self):
+        with self.lock:
+            verdicts = dict(self.verdicts)
+            unrecognised = self.unrecognised
+        admitted = verdicts.pop(PROFILE, 0)
+        details = ', '.join(f"{verdict}: {count}" for verdict, count in sorted(verdicts.items(), key=lambda e: -e[1]))
+        report = (f"Frontier: {admitted} profiles queued from {admitted + sum(verdicts.values())} links; "
+                  f"{sum(verdicts.values())} fetches avoided" + (f" ({details})" if details else ''))
+        if unrecognised:
+            report += f"; {unrecognised} labelled profile links matched no profile pattern"
+        return report
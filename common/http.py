@@ -0,0 +1,130 @@
+import time
+import random
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+# Same desktop User-Agents the Selenium sessions rotate through
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36',
+]
+
+DEFAULT_TIMEOUT = (5, 20)  # (connect, read) seconds
+
+
+def make_session(user_agent=None, pool_size=10, retries=2):
+    """Build a keep-alive requests session with a pooled, retrying adapter"""
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET', 'HEAD'),
+        raise_on_status=False,  # Hand back the last response so its status reaches the rate controller
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': user_agent or random.choice(USER_AGENTS),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+    })
+    return session
+
+
+def copy_driver_cookies(driver, session):
+    """Copy cookies from a live WebDriver into a requests session"""
+    for cookie in driver.get_cookies():
+        session.cookies.set(
+            cookie['name'], cookie['value'],
+            domain=cookie.get('domain'), path=cookie.get('path', '/')
+        )
+
+
+def fetch_html(session, url, timeout=DEFAULT_TIMEOUT, cache=None, ttl=None, rate=None):
+    """GET a page and return its decoded HTML, or None on any HTTP/network error.
+
+    With a ResponseCache, a fresh copy is returned without a request and a
+    stale one is revalidated with a conditional GET. With a RateController,
+    the request waits for the domain's next slot and its outcome adjusts
+    the pace.
+    """
+    entry = None
+    if cache is not None:
+        cached = cache.get_fresh(url, ttl)
+        if cached is not None:
+            return cached
+        entry = cache.lookup(url)
+    if rate is not None:
+        rate.wait(url)
+    start = time.perf_counter()
+    try:
+        resp = session.get(url, timeout=timeout, headers=cache.conditional_headers(entry) if entry else None)
+    except requests.RequestException as e:
+        METRICS.observe('http_fetch', time.perf_counter() - start)
+        METRICS.count('http_responses', status='error')
+        if rate is not None:
+            rate.record(url, error=True)
+        log.warning(f"HTTP fetch failed for {url}: {str(e)}", extra={'url': url})
+        return None
+    latency = time.perf_counter() - start
+    METRICS.observe('http_fetch', latency)
+    METRICS.count('http_responses', status=resp.status_code)
+    if rate is not None:
+        rate.record(url, status=resp.status_code, latency=latency,
+                    page_html=resp.text if resp.status_code == 200 else None,
+                    retry_after=resp.headers.get('Retry-After'))
+    if resp.status_code == 304 and entry:
+        page_html = cache.not_modified(url, entry)
+        if page_html is not None:
+            return page_html
+        cache.discard(url)  # Unreadable cached body: fetch it again unconditionally
+        return fetch_html(session, url, timeout, cache, ttl, rate)
+    if resp.status_code != 200:
+        log.warning(f"HTTP {resp.status_code} for {url}", extra={'url': url, 'status': resp.status_code})
+        return None
+    if cache is not None:
+        cache.put(url, resp.text, resp.headers)
+    return resp.text
+
+
+def post_json(session, url, payload, headers=None, timeout=DEFAULT_TIMEOUT, rate=None):
+    """POST a JSON body and return (status, decoded JSON); status is None on a network error.
+
+    The JSON is None unless the response is a 200 with a parseable body.
+    Paced and recorded like fetch_html when given a RateController.
+    """
+    if rate is not None:
+        rate.wait(url)
+    start = time.perf_counter()
+    try:
+        resp = session.post(url, json=payload, timeout=timeout,
+                            headers=dict({'Accept': 'application/json, text/plain, */*'}, **(headers or {})))
+    except requests.RequestException as e:
+        METRICS.observe('http_fetch', time.perf_counter() - start)
+        METRICS.count('http_responses', status='error')
+        if rate is not None:
+            rate.record(url, error=True)
+        log.warning(f"HTTP POST failed for {url}: {str(e)}", extra={'url': url})
+        return None, None
+    latency = time.perf_counter() - start
+    METRICS.observe('http_fetch', latency)
+    METRICS.count('http_responses', status=resp.status_code)
+    if rate is not None:
+        rate.record(url, status=resp.status_code, latency=latency, retry_after=resp.headers.get('Retry-After'))
+    if resp.status_code != 200:
+        log.warning(f"HTTP {resp.status_code} for POST {url}", extra={'url': url, 'status': resp.status_code})
+        return resp.status_code, None
+    try:
+        return resp.status_code, resp.json()
+    except ValueError:
+        log.warning(f"POST {url} did not return JSON", extra={'url': url})
+        return resp.status_code, None
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import random
+import threading
+
+from common.checkpoint import atomic_write
+
+# Histogram bucket upper bounds in seconds, from an XPath probe up to a slow page load
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SAMPLE_SIZE = 10_000  # Durations kept per stage for the percentiles in the JSON summary
+
+
+class NullTimer:
+    """What timer() hands out while metrics are disabled: entering and leaving it does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Bucketed durations for one stage, plus a reservoir sample for percentiles"""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < SAMPLE_SIZE:
+                self.samples[slot] = seconds
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for key, value in sorted(labels.items()))
+    return '{' + pairs + '}'
+
+
+class Metrics:
+    """Per-stage timers, counters and histograms for a crawl, exported as Prometheus text and a JSON summary.
+
+    Disabled by default. While disabled, timer() returns a shared no-op
+    context manager and count()/observe() return at once, so the calls
+    can stay in hot paths. enable() turns collection on for the run and
+    sets constant labels (e.g. scraper="businessbroker") that go on every
+    exported series. pause() is time.sleep() that also books the wait
+    under the 'sleep' stage, so politeness delays show up next to page
+    loads, XPath resolution and saves.
+    """
+
+    def __init__(self, namespace='scraper'):
+        self.namespace = namespace
+        self.enabled = False
+        self.labels = {}
+        self.stages = {}
+        self.counters = {}  # name -> {sorted label items: value}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def enable(self, **labels):
+        self.enabled = True
+        self.labels = labels
+        self.started = time.time()
+
+    def timer(self, stage):
+        """Context manager that books the time spent inside it under `stage`"""
+        return StageTimer(self, stage) if self.enabled else NULL_TIMER
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def pause(self, seconds, stage='sleep'):
+        time.sleep(seconds)
+        self.observe(stage, seconds)
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        base = dict(self.labels)
+        lines = []
+        with self.lock:
+            if self.stages:
+                family = f'{self.namespace}_stage_seconds'
+                lines.append(f'# HELP {family} Time spent per crawl stage')
+                lines.append(f'# TYPE {family} histogram')
+                for stage, histogram in sorted(self.stages.items()):
+                    labels = dict(base, stage=stage)
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, histogram.buckets):
+                        cumulative += n
+                        lines.append(f'{family}_bucket{label_text(dict(labels, le=bound))} {cumulative}')
+                    lines.append(f'{family}_bucket{label_text(dict(labels, le="+Inf"))} {histogram.count}')
+                    lines.append(f'{family}_sum{label_text(labels)} {histogram.total:.6f}')
+                    lines.append(f'{family}_count{label_text(labels)} {histogram.count}')
+            for name, series in sorted(self.counters.items()):
+                family = f'{self.namespace}_{name}_total'
+                lines.append(f'# TYPE {family} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{family}{label_text(dict(base, **dict(key)))} {value}')
+        family = f'{self.namespace}_run_seconds'
+        lines.append(f'# TYPE {family} gauge')
+        lines.append(f'{family}{label_text(base)} {time.time() - self.started:.3f}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Per-stage totals and percentiles plus counters, as a dict for the JSON run summary.
+
+        share_of_run is a stage's total time over the run's wall time; stages
+        that run concurrently (async fetches, pool workers) can exceed 1.
+        """
+        wall = time.time() - self.started
+        with self.lock:
+            stages = {
+                stage: {
+                    'count': histogram.count,
+                    'total_s': round(histogram.total, 3),
+                    'share_of_run': round(histogram.total / wall, 3) if wall else 0.0,
+                    'mean_ms': round(histogram.total / histogram.count * 1000, 3),
+                    'p50_ms': round(histogram.percentile(50) * 1000, 3),
+                    'p95_ms': round(histogram.percentile(95) * 1000, 3),
+                    'max_ms': round(histogram.max * 1000, 3),
+                }
+                for stage, histogram in sorted(self.stages.items(), key=lambda item: -item[1].total)
+            }
+            counters = {
+                name: {','.join(f'{k}={v}' for k, v in key) or 'total': value for key, value in sorted(series.items())}
+                for name, series in sorted(self.counters.items())
+            }
+        return {'labels': self.labels, 'started': self.started, 'run_seconds': round(wall, 3),
+                'stages': stages, 'counters': counters}
+
+    def write(self, directory, name):
+        """Write <name>.prom (for a node_exporter textfile collector) and <name>_summary.json"""
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, f'{name}.prom')
+        summary_path = os.path.join(directory, f'{name}_summary.json')
+        atomic_write(prom_path, self.prometheus())
+        atomic_write(summary_path, json.dumps(self.summary(), indent=2))
+        return prom_path, summary_path
+
+
+# Shared by every scraper in the process; scripts call METRICS.enable() when asked to export
+METRICS = Metrics()
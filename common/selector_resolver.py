@@ -0,0 +1,162 @@
+import os
+import logging
+import json
+import threading
+from selenium.webdriver.common.by import By
+
+from common.snapshot import node_text
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+
+class SelectorResolver:
+    """Fallback XPath chains per field, reordered by which selector actually matches on a site.
+
+    Every resolve probes the chain without waiting: snapshot XPaths are
+    local, and live probes use find_elements, which returns immediately
+    when implicit waits are off. The selector with the most hits is
+    tried first next time. Only a chain's alternates are reordered: its
+    fallbacks (loose XPaths that also match the wrong element on a page
+    the alternates would have read correctly) are tried after every
+    alternate, in the declared order, however often they hit. Per-selector hit counts and per-field misses
+    are kept and can be saved to disk, so a site layout change shows up
+    as a new winner or a rising miss count in report().
+    """
+
+    def __init__(self, site):
+        self.site = site
+        self.chains = {}
+        self.fallbacks = {}
+        self.hits = {}
+        self.misses = {}
+        self.previous_winner = {}
+        self.run_hits = {}  # This run only, so a layout change isn't masked by history
+        self.run_misses = {}
+        self.lock = threading.Lock()
+
+    def register(self, field, xpaths, fallbacks=()):
+        """Declare a field's chain: equivalent xpaths, reordered by hits (the declared order breaks ties),
+        then fallbacks, never promoted ahead of them"""
+        self.fallbacks[field] = list(fallbacks)
+        xpaths = list(xpaths) + self.fallbacks[field]
+        self.chains[field] = xpaths
+        self.hits.setdefault(field, {xpath: 0 for xpath in xpaths})
+        self.misses.setdefault(field, 0)
+        self.run_hits.setdefault(field, {xpath: 0 for xpath in xpaths})
+        self.run_misses.setdefault(field, 0)
+
+    def ordered(self, field):
+        fallbacks = self.fallbacks[field]
+        hits = self.hits[field]
+        alternates = [xpath for xpath in self.chains[field] if xpath not in fallbacks]
+        return sorted(alternates, key=lambda xpath: -hits.get(xpath, 0)) + fallbacks
+
+    def winner(self, field, hits=None):
+        hits = self.hits.get(field, {}) if hits is None else hits
+        best = max(hits, key=hits.get, default=None)
+        return best if best and hits[best] else None
+
+    def record(self, field, xpath, position=0):
+        with self.lock:
+            if xpath is None:
+                self.misses[field] += 1
+                self.run_misses[field] += 1
+            else:
+                self.hits[field][xpath] += 1
+                self.run_hits[field][xpath] += 1
+        if xpath is None:
+            METRICS.count('selector_misses', site=self.site, field=field)
+        elif position:
+            # Matched, but only after the preferred selector(s) missed
+            METRICS.count('selector_fallbacks', site=self.site, field=field)
+
+    def find_all(self, snapshot, field, context=None):
+        """Matches of the first selector in learned order that finds anything in a snapshot"""
+        with METRICS.timer('xpath'):
+            for position, xpath in enumerate(self.ordered(field)):
+                matches = snapshot.find_all(xpath, context)
+                if matches:
+                    self.record(field, xpath, position)
+                    return matches
+            self.record(field, None)
+            return []
+
+    def first(self, snapshot, field, context=None):
+        matches = self.find_all(snapshot, field, context)
+        return matches[0] if matches else None
+
+    def text(self, snapshot, field, default=None, context=None):
+        node = self.first(snapshot, field, context)
+        if node is None:
+            return default
+        return node_text(node) or default
+
+    def find_live(self, driver, field):
+        """Probe the chain against the live page with find_elements (no implicit wait needed)"""
+        with METRICS.timer('xpath_live'):
+            for position, xpath in enumerate(self.ordered(field)):
+                elements = driver.find_elements(By.XPATH, xpath)
+                if elements:
+                    self.record(field, xpath, position)
+                    return elements
+            self.record(field, None)
+            return []
+
+    def load(self, path):
+        """Restore learned ordering and counts from an earlier run"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not load selector stats from {path}: {str(e)}")
+            return
+        with self.lock:
+            for field, stats in saved.get('fields', {}).items():
+                if field not in self.chains:
+                    continue
+                for xpath, count in stats.get('hits', {}).items():
+                    if xpath in self.hits[field]:
+                        self.hits[field][xpath] = count
+                self.misses[field] = stats.get('misses', 0)
+                self.previous_winner[field] = self.winner(field)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'site': self.site,
+                'fields': {
+                    field: {'hits': dict(self.hits[field]), 'misses': self.misses[field],
+                            'winner': self.winner(field)}
+                    for field in self.chains
+                },
+            }
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """One line per field with this run's hit/miss counts, flagging possible layout changes"""
+        lines = [f"Selector stats for {self.site}:"]
+        with self.lock:
+            for field, chain in self.chains.items():
+                hits = self.run_hits[field]
+                misses = self.run_misses[field]
+                total = sum(hits.values()) + misses
+                if not total:
+                    continue
+                per_selector = ', '.join(f"#{chain.index(x) + 1}={n}" for x, n in hits.items() if n)
+                line = f"  {field}: {total - misses}/{total} hit ({per_selector or 'none'})"
+                previous = self.previous_winner.get(field)
+                current = self.winner(field, hits)
+                if previous and current and current != previous:
+                    line += f"  ⚠ winning selector changed from #{chain.index(previous) + 1} to #{chain.index(current) + 1}"
+                if misses > total / 2:
+                    line += "  ⚠ mostly missing"
+                lines.append(line)
+        return '\n'.join(lines)
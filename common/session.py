@@ -0,0 +1,89 @@
+import os
+import logging
+import json
+import time
+
+from common.checkpoint import atomic_write
+from common.http import make_session
+
+log = logging.getLogger(__name__)
+
+COOKIE_FIELDS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+
+class SavedSession:
+    """Browser cookies and User-Agent persisted between runs, so a site login happens once per session lifetime.
+
+    Cookies past their expiry are dropped on load, and the whole session is
+    considered stale after max_age seconds even if the site set no expiry.
+    A loaded session can be put back into a browser (restore) or handed to
+    a pooled requests session or AsyncFetcher, so pages can be fetched
+    without a browser at all.
+    """
+
+    def __init__(self, path, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        """The saved {'user_agent', 'saved_at', 'cookies'} if it is still usable, else None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable session file {self.path}: {str(e)}")
+            return None
+        now = time.time()
+        if now - saved.get('saved_at', 0) > self.max_age:
+            return None
+        saved['cookies'] = [c for c in saved.get('cookies', []) if c.get('expiry', now + 1) > now]
+        return saved if saved['cookies'] else None
+
+    def save(self, driver):
+        """Persist the live browser's cookies and User-Agent"""
+        atomic_write(self.path, json.dumps({
+            'user_agent': driver.execute_script('return navigator.userAgent;'),
+            'saved_at': time.time(),
+            'cookies': driver.get_cookies(),
+        }, indent=1))
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def user_agent(self):
+        saved = self.load()
+        return saved['user_agent'] if saved else None
+
+    def cookie_dict(self):
+        """{name: value} for AsyncFetcher"""
+        saved = self.load()
+        return {c['name']: c['value'] for c in saved['cookies']} if saved else {}
+
+    def restore(self, driver, url):
+        """Load the saved cookies into a browser and open url with them; False if there is nothing to restore"""
+        saved = self.load()
+        if not saved:
+            return False
+        # Cookies can only be added for the domain the browser is currently on
+        driver.get(url)
+        for cookie in saved['cookies']:
+            try:
+                driver.add_cookie({k: cookie[k] for k in COOKIE_FIELDS if k in cookie})
+            except Exception as e:
+                log.warning(f"Could not restore cookie {cookie.get('name')}: {str(e)}")
+        driver.get(url)
+        return True
+
+    def requests_session(self, pool_size=10):
+        """Pooled requests session carrying the saved cookies and User-Agent, or None"""
+        saved = self.load()
+        if not saved:
+            return None
+        session = make_session(user_agent=saved['user_agent'], pool_size=pool_size)
+        for cookie in saved['cookies']:
+            session.cookies.set(cookie['name'], cookie['value'],
+                                domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        return session
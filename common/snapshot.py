@@ -0,0 +1,86 @@
+from functools import lru_cache
+from urllib.parse import urljoin
+from lxml import etree, html as lxml_html
+
+from common.metrics import METRICS
+
+
+@lru_cache(maxsize=256)
+def compile_xpath(expr):
+    """Compile an XPath once per process"""
+    return etree.XPath(expr)
+
+
+def node_text(node):
+    """Visible text of an element, or the value of an attribute/text result"""
+    if isinstance(node, str):
+        return node.strip()
+    return node.text_content().strip()
+
+
+class PageSnapshot:
+    """A parsed copy of a page's DOM taken in a single WebDriver round-trip.
+
+    Field extractors and their XPath fallback chains run locally against the
+    lxml tree instead of issuing one find_element call per probe. A chain is
+    a list of XPath strings (or compiled XPaths) tried in order.
+    """
+
+    def __init__(self, page_html, url=None):
+        self.html = page_html
+        self.url = url
+        with METRICS.timer('html_parse'):
+            self.tree = lxml_html.fromstring(page_html) if page_html and page_html.strip() else None
+
+    @classmethod
+    def capture(cls, driver):
+        """Grab the current DOM with one page_source call (plus current_url for resolving links)"""
+        with METRICS.timer('page_source'):
+            page_html = driver.page_source
+        return cls(page_html, driver.current_url)
+
+    @staticmethod
+    def as_chain(xpaths):
+        return [xpaths] if isinstance(xpaths, (str, etree.XPath)) else xpaths
+
+    def find_all(self, xpaths, context=None):
+        """Results of the first XPath in the chain that matches anything"""
+        root = self.tree if context is None else context
+        if root is None:
+            return []
+        for xpath in self.as_chain(xpaths):
+            if isinstance(xpath, str):
+                xpath = compile_xpath(xpath)
+            matches = xpath(root)
+            if matches:
+                return matches
+        return []
+
+    def first(self, xpaths, context=None):
+        matches = self.find_all(xpaths, context)
+        return matches[0] if matches else None
+
+    def text(self, xpaths, default=None, context=None):
+        """Stripped text of the first match in the chain, or default if nothing matched or it's blank"""
+        node = self.first(xpaths, context)
+        if node is None:
+            return default
+        return node_text(node) or default
+
+    def attr(self, xpaths, name, default=None, context=None):
+        node = self.first(xpaths, context)
+        if node is None:
+            return default
+        return node.get(name) or default
+
+    def link(self, node):
+        """Absolute href of an <a> element, resolved against the page URL like WebDriver does"""
+        href = node.get('href')
+        if not href:
+            return None
+        return urljoin(self.url, href) if self.url else href
+
+    def search(self, regex, default=None):
+        """First capture group of a compiled regex over the raw HTML"""
+        m = regex.search(self.html or '')
+        return m.group(1).strip() if m else default
@@ -0,0 +1,217 @@
+import os
+import json
+import sqlite3
+import threading
+from openpyxl import Workbook, load_workbook
+
+
+class RecordStore:
+    """Append-only record store backed by SQLite in WAL mode.
+
+    Each save is a single INSERT (or one transaction per batch), so the cost
+    doesn't grow with the number of records already stored, and a crash
+    mid-write loses at most the uncommitted batch. Records are kept as JSON
+    keyed by key_column; a repeated key is ignored, which is what the
+    scrapers' dedup sets expect. Records without a key (e.g. rows imported
+    from older workbooks) are always kept. update() patches fields of an
+    existing record in place; update_rows() does the same by row id, and rekey()
+    moves records to new keys. The .xlsx deliverable is written by
+    export_xlsx in one streaming pass.
+    """
+
+    def __init__(self, db_path, columns, key_column):
+        self.db_path = db_path
+        self.columns = list(columns)
+        self.key_column = key_column
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS records ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' key TEXT UNIQUE,'
+            ' data TEXT NOT NULL,'
+            " created_at TEXT NOT NULL DEFAULT (datetime('now')))"
+        )
+        self.conn.commit()
+
+    def record_key(self, record):
+        key = record.get(self.key_column)
+        return None if key is None or key != key else str(key)  # key != key catches NaN
+
+    def append_many(self, records, replace=False):
+        """Insert a batch of records in one transaction; returns how many were new.
+
+        With replace=True a record whose key is already stored has the new
+        record's fields merged into it (used by refresh crawls): fields added
+        later, such as the website enrichment columns, survive, and the count
+        includes only records whose scraped fields changed.
+        """
+        rows = [(self.record_key(r), json.dumps(r, default=str)) for r in records]
+        sql = 'INSERT OR IGNORE INTO records (key, data) VALUES (?, ?)'
+        if replace:
+            sql = ('INSERT INTO records (key, data) VALUES (?, ?) ON CONFLICT (key)'
+                   ' DO UPDATE SET data = json_patch(data, excluded.data)'
+                   ' WHERE json_patch(data, excluded.data) != json(data)')
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(sql, rows)
+            return self.conn.total_changes - before
+
+    def append(self, record):
+        return self.append_many([record])
+
+    def get(self, key):
+        """The stored record with this key, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM records WHERE key = ?', (str(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, key, changes):
+        """Merge changed fields into the stored record with this key; returns False if there is none"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute('UPDATE records SET data = json_patch(data, ?) WHERE key = ?',
+                                       (json.dumps(changes, default=str), str(key)))
+            return cursor.rowcount > 0
+
+    def update_many(self, changes):
+        """update() for a batch of (key, changes) pairs in one transaction; returns how many records matched"""
+        rows = [(json.dumps(fields, default=str), str(key)) for key, fields in changes]
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany('UPDATE records SET data = json_patch(data, ?) WHERE key = ?', rows)
+            return self.conn.total_changes - before
+
+    def update_rows(self, changes):
+        """update_many() by row id, for records imported without a key; returns how many records matched"""
+        rows = [(json.dumps(fields, default=str), row_id) for row_id, fields in changes]
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany('UPDATE records SET data = json_patch(data, ?) WHERE id = ?', rows)
+            return self.conn.total_changes - before
+
+    def rekey(self, changes):
+        """Move records to new keys, given (old key, new key) pairs; returns how many moved.
+
+        A moved record is saved again under a new row id, so indexes that
+        follow the store by row id (DedupIndex) pick up its new key. If the
+        new key is already stored, the old record is dropped as a duplicate.
+        """
+        path = '$."' + self.key_column.replace('"', '') + '"'
+        moved = 0
+        with self.lock, self.conn:
+            for old, new in changes:
+                self.conn.execute('INSERT OR IGNORE INTO records (key, data, created_at)'
+                                  ' SELECT ?, json_set(data, ?, ?), created_at FROM records WHERE key = ?',
+                                  (str(new), path, str(new), str(old)))
+                moved += self.conn.execute('DELETE FROM records WHERE key = ?', (str(old),)).rowcount
+        return moved
+
+    def version(self):
+        """Data version the scrapers last migrated this store to (SQLite's user_version, 0 when new)"""
+        with self.lock:
+            return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_version(self, version):
+        with self.lock:
+            self.conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def keys(self):
+        with self.lock:
+            return {row[0] for row in self.conn.execute('SELECT key FROM records WHERE key IS NOT NULL')}
+
+    def column_values(self, column):
+        """Set of non-empty values of one column across all records"""
+        path = '$."' + column.replace('"', '') + '"'
+        with self.lock:
+            return {row[0] for row in self.conn.execute(
+                'SELECT json_extract(data, ?) FROM records WHERE json_extract(data, ?) IS NOT NULL', (path, path)
+            )}
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def max_rowid(self):
+        with self.lock:
+            return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM records').fetchone()[0]
+
+    def iter_values_since(self, columns, last_id=0, batch_size=10000):
+        """Yield (id, value, ...) of the given columns for records after row id last_id, without decoding whole records"""
+        paths = ['$."' + column.replace('"', '') + '"' for column in columns]
+        selects = ', '.join('json_extract(data, ?)' for _ in paths)
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f'SELECT id, {selects} FROM records WHERE id > ? ORDER BY id LIMIT ?',
+                    (*paths, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+    def iter_records(self, batch_size=1000):
+        """Yield stored records in insertion order without loading them all at once"""
+        for _, record in self.iter_rows(batch_size):
+            yield record
+
+    def iter_rows(self, batch_size=1000):
+        """Yield (row id, record) in insertion order; the row id also addresses records imported without a key"""
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT id, data FROM records WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield row_id, json.loads(data)
+            last_id = rows[-1][0]
+
+    def import_xlsx(self, xlsx_path):
+        """One-time migration of an existing workbook into the store; returns rows imported"""
+        wb = load_workbook(xlsx_path, read_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                return 0
+            batch, imported = [], 0
+            for values in rows:
+                record = {col: val for col, val in zip(header, values) if col is not None and val is not None}
+                if record:
+                    batch.append(record)
+                if len(batch) >= 1000:
+                    imported += self.append_many(batch)
+                    batch = []
+            return imported + self.append_many(batch)
+        finally:
+            wb.close()
+
+    def export_xlsx(self, xlsx_path):
+        """Stream every record into a fresh workbook, replacing xlsx_path atomically"""
+        columns = list(self.columns)
+        with self.lock:
+            for (data,) in self.conn.execute('SELECT data FROM records'):
+                for col in json.loads(data):
+                    if col not in columns:
+                        columns.append(col)
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(columns)
+        count = 0
+        for record in self.iter_records():
+            ws.append([record.get(col) for col in columns])
+            count += 1
+        tmp_path = f"{xlsx_path}.{os.getpid()}.tmp"  # Queue workers may export at the same moment
+        wb.save(tmp_path)
+        os.replace(tmp_path, xlsx_path)
+        return count
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
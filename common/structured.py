@@ -0,0 +1,132 @@
+import json
+import logging
+
+from common.snapshot import compile_xpath, node_text
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+# Top-level microdata items, their properties, and the JSON-LD blocks of a page
+ITEMS_XPATH = "//*[@itemscope][not(ancestor::*[@itemscope])]"
+JSON_LD_XPATH = "//script[@type='application/ld+json']"
+# Elements whose microdata value is an attribute rather than their text
+VALUE_ATTRS = {'meta': 'content', 'a': 'href', 'link': 'href', 'area': 'href', 'img': 'src', 'audio': 'src',
+               'video': 'src', 'source': 'src', 'iframe': 'src', 'embed': 'src', 'object': 'data',
+               'time': 'datetime', 'data': 'value', 'meter': 'value'}
+URL_ATTRS = ('href', 'src', 'data')
+
+
+def add_value(item, prop, value):
+    """Set a property, turning repeats into a list"""
+    if prop not in item:
+        item[prop] = value
+    elif isinstance(item[prop], list):
+        item[prop].append(value)
+    else:
+        item[prop] = [item[prop], value]
+
+
+def first_value(value):
+    """The first of a repeated property, or the value itself"""
+    return value[0] if isinstance(value, list) and value else value
+
+
+def item_type(item):
+    """Short type name ('Organization') from an @type/itemtype URL or list"""
+    value = first_value(item.get('@type')) or ''
+    return str(value).rstrip('/').rsplit('/', 1)[-1]
+
+
+class StructuredData:
+    """schema.org microdata and JSON-LD read from a page snapshot in one pass.
+
+    microdata() returns one dict per top-level itemscope: '@type', and
+    each itemprop mapped to its value (attribute values per the microdata
+    spec, links resolved against the page, nested items as dicts, repeats
+    as lists; a linked 'name' is read as text); '@element' is the element
+    itself. item_of(node) gives the item a property node belongs to, so a
+    scraper can start from the selector it already uses for a card.
+    json_ld() returns every JSON-LD object, with @graph and ItemList
+    entries flattened out. Unparseable JSON-LD blocks are skipped.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.items = {}  # itemscope element -> parsed item
+
+    def property_value(self, node):
+        if node.get('itemscope') is not None:
+            return self.item(node)
+        attr = VALUE_ATTRS.get(node.tag if isinstance(node.tag, str) else '')
+        # <a itemprop="name"> is how sites mark up a linked name; read it as the name, not the URL
+        if attr == 'href' and 'name' in node.get('itemprop', '').split():
+            attr = None
+        if attr:
+            value = node.get(attr)
+            if value and attr in URL_ATTRS:
+                return self.snapshot.link(node) if attr == 'href' else value
+            if value is not None:
+                return value.strip()
+        if node.get('content') is not None:
+            return node.get('content').strip()
+        return node_text(node)
+
+    @staticmethod
+    def owner(node):
+        """Nearest itemscope ancestor of a property"""
+        parent = node.getparent()
+        while parent is not None and parent.get('itemscope') is None:
+            parent = parent.getparent()
+        return parent
+
+    def item_of(self, node):
+        """The microdata item a property node belongs to (its nearest itemscope), or None"""
+        scope = self.owner(node)
+        return self.item(scope) if scope is not None else None
+
+    def item(self, element):
+        if element in self.items:
+            return self.items[element]
+        item = self.items[element] = {'@type': element.get('itemtype') or ''}
+        for prop_node in element.iterdescendants('*'):
+            if prop_node.get('itemprop') is None or self.owner(prop_node) is not element:
+                continue
+            value = self.property_value(prop_node)
+            for prop in prop_node.get('itemprop').split():
+                add_value(item, prop, value)
+        item['@element'] = element
+        return item
+
+    def microdata(self):
+        if self.snapshot.tree is None:
+            return []
+        with METRICS.timer('structured_data'):
+            return [self.item(element) for element in compile_xpath(ITEMS_XPATH)(self.snapshot.tree)]
+
+    def json_ld(self):
+        if self.snapshot.tree is None:
+            return []
+        objects = []
+        with METRICS.timer('structured_data'):
+            for script in compile_xpath(JSON_LD_XPATH)(self.snapshot.tree):
+                try:
+                    data = json.loads(script.text or '')
+                except ValueError:
+                    log.debug(f"Skipping unparseable JSON-LD on {self.snapshot.url}")
+                    continue
+                self.flatten(data, objects)
+        return objects
+
+    def flatten(self, data, objects):
+        if isinstance(data, list):
+            for entry in data:
+                self.flatten(entry, objects)
+        elif isinstance(data, dict):
+            if '@graph' in data:
+                self.flatten(data['@graph'], objects)
+            elif item_type(data) == 'ItemList':
+                for entry in data.get('itemListElement') or []:
+                    # ListItem wrappers carry the real object in 'item'
+                    self.flatten(entry.get('item', entry) if isinstance(entry, dict) else entry, objects)
+            else:
+                objects.append(data)
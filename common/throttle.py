@@ -0,0 +1,200 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+# Challenge and block pages; specific enough not to match a page that merely embeds a form captcha
+BLOCK_MARKERS = (
+    'cf-chl', 'challenge-platform', '/cdn-cgi/challenge', 'px-captcha', '_incapsula_resource',
+    'are you a robot', 'verify you are human', 'unusual traffic from your', 'access denied</title>',
+    'g-recaptcha-response" required', 'h-captcha',
+)
+
+
+def looks_blocked(page_html):
+    """True if a page looks like a bot challenge or block page instead of real content"""
+    if not page_html:
+        return False
+    text = page_html.lower()
+    return any(marker in text for marker in BLOCK_MARKERS)
+
+
+def retry_after_seconds(value):
+    """Seconds from a Retry-After header (delta-seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class DomainState:
+    def __init__(self, rate, window):
+        self.rate = rate  # Request starts per second
+        self.window = window  # Requests allowed in flight at once (async fetches)
+        self.in_flight = 0
+        self.next_at = 0.0  # time.monotonic() before which no request may start
+        self.blocked_until = 0.0  # From Retry-After
+        self.calm_until = 0.0  # No second cut before this, while requests sent at the old pace drain
+        self.baseline = None  # Lowest smoothed latency seen
+        self.latency = None  # Smoothed latency
+        self.healthy_streak = 0
+        self.slow_start = True  # Grow multiplicatively until the first throttle signal
+        self.backoffs = {}  # Reason -> count
+
+
+class RateController:
+    """Per-domain adaptive pacing (AIMD) shared by the HTTP and browser paths of every scraper.
+
+    Each domain has a request rate and, for async fetches, a window of
+    requests in flight. A healthy response grows the rate by 25% until
+    the domain's first throttle signal (slow start) and by increase/rate
+    after it, i.e. about `increase` req/s per second of healthy traffic,
+    and adds a slot to the window once per window's worth of healthy
+    responses, up to max_rate / max_window. A throttle signal (429 or
+    503, a timeout or connection error, or a challenge page) halves both,
+    at most once per drain period so a burst of in-flight failures counts
+    as one, and honours Retry-After by holding the domain until then. The
+    rate never drops below min_rate (by default one request per 5 s).
+    Responses much slower than the domain's best smoothed latency trim
+    the rate slightly, so a struggling server is eased off before it
+    starts refusing. Request starts are jittered by +/-25%.
+
+    wait() blocks (browser loads, requests); acquire()/release() are the
+    asyncio equivalents with the window. record() takes the outcome and
+    returns True if it was a throttle signal.
+    """
+
+    def __init__(self, start_rate=4.0, min_rate=0.2, max_rate=100.0, increase=0.5, start_window=2,
+                 max_window=8, slow_factor=3.0, jitter=0.25):
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.start_window = start_window
+        self.max_window = max_window
+        self.slow_factor = slow_factor
+        self.jitter = jitter
+        self.domains = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def domain(url):
+        return urlsplit(url).netloc.lower()
+
+    def state(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = DomainState(self.start_rate, min(self.start_window, self.max_window))
+        return state
+
+    def reserve(self, domain, use_window=False):
+        """Book the domain's next request start; returns seconds to wait, or None if the window is full"""
+        with self.lock:
+            state = self.state(domain)
+            if use_window and state.in_flight >= state.window:
+                return None
+            now = time.monotonic()
+            start = max(now, state.next_at, state.blocked_until)
+            spacing = 1.0 / state.rate
+            state.next_at = start + spacing * random.uniform(1 - self.jitter, 1 + self.jitter)
+            if use_window:
+                state.in_flight += 1
+            return start - now
+
+    def wait(self, url):
+        """Block until this domain may be sent the next request"""
+        delay = self.reserve(self.domain(url))
+        if delay > 0:
+            METRICS.pause(delay, 'throttle')
+
+    async def acquire(self, url):
+        """Wait for a request slot (window and pacing) on the event loop; pair with release()"""
+        domain = self.domain(url)
+        start = time.perf_counter()
+        delay = self.reserve(domain, use_window=True)
+        while delay is None:
+            await asyncio.sleep(0.005)
+            delay = self.reserve(domain, use_window=True)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        METRICS.observe('throttle', time.perf_counter() - start)
+
+    def release(self, url):
+        with self.lock:
+            state = self.state(self.domain(url))
+            state.in_flight = max(0, state.in_flight - 1)
+
+    def record(self, url, status=None, latency=None, page_html=None, retry_after=None, error=False):
+        """Adapt the domain's pace to one response; returns True if it was a throttle signal"""
+        domain = self.domain(url)
+        if error:
+            reason = 'error'
+        elif status in THROTTLE_STATUSES:
+            reason = str(status)
+        elif looks_blocked(page_html):
+            reason = 'challenge'
+        else:
+            reason = None
+        cut = False
+        with self.lock:
+            state = self.state(domain)
+            if reason:
+                now = time.monotonic()
+                wait = retry_after_seconds(retry_after)
+                if wait:
+                    state.blocked_until = max(state.blocked_until, now + wait)
+                if now >= state.calm_until:
+                    state.rate = max(self.min_rate, state.rate / 2)
+                    state.window = max(1, state.window // 2)
+                    state.calm_until = max(now, state.blocked_until) + max(1.0 / state.rate, state.latency or 0.0)
+                    state.slow_start = False
+                    cut = True
+                state.healthy_streak = 0
+                state.backoffs[reason] = state.backoffs.get(reason, 0) + 1
+                rate = state.rate
+            elif latency is not None and state.latency is not None and latency > self.slow_factor * state.baseline:
+                state.rate = max(self.min_rate, state.rate * 0.9)
+                state.healthy_streak = 0
+            else:
+                grown = state.rate * 1.25 if state.slow_start else state.rate + self.increase / state.rate
+                state.rate = min(self.max_rate, grown)
+                state.healthy_streak += 1
+                if state.healthy_streak >= state.window and state.window < self.max_window:
+                    state.window += 1
+                    state.healthy_streak = 0
+            if latency is not None and not reason:
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+                state.baseline = state.latency if state.baseline is None else min(state.baseline, state.latency)
+        if reason:
+            METRICS.count('throttle_backoffs', domain=domain, reason=reason)
+        if cut:
+            log.warning(f"{domain}: backing off to {rate:.2f} req/s ({reason})"
+                        + (f", holding for Retry-After {retry_after}" if retry_after else ''),
+                        extra={'domain': domain, 'reason': reason, 'rate': round(rate, 3)})
+        return bool(reason)
+
+    def report(self):
+        with self.lock:
+            if not self.domains:
+                return 'Rate control: no requests paced'
+            lines = []
+            for domain, state in sorted(self.domains.items()):
+                backoffs = ', '.join(f"{reason} x{n}" for reason, n in sorted(state.backoffs.items())) or 'none'
+                latency = f", {state.latency * 1000:.0f} ms smoothed latency" if state.latency is not None else ''
+                lines.append(f"Rate control for {domain}: {state.rate:.2f} req/s, window {state.window}"
+                             f"{latency}; back-offs: {backoffs}")
+            return '\n'.join(lines)
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+from common.metrics import METRICS
+
+log = logging.getLogger(__name__)
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+
+def worker_name():
+    """host:pid, unique among the processes sharing a queue"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Task:
+    """A claimed task; attempts counts this claim"""
+
+    def __init__(self, task_id, kind, key, payload, attempts):
+        self.id = task_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"<{self.kind} {self.key}>"
+
+
+class WorkQueue:
+    """Durable crawl work queue in SQLite, shared by any number of worker processes.
+
+    A task has a kind ('state', 'profiles', ...), a unique key and a JSON
+    payload. Putting a key that is already queued does nothing, so every
+    worker can seed the queue and a re-walked listing doesn't duplicate
+    work. claim() leases pending tasks to one worker for lease_seconds
+    (higher priority first, then oldest); a Heartbeat renews the worker's
+    leases while it runs. A worker that dies stops renewing, and once its
+    lease runs out the task goes back to pending for another worker.
+    complete() marks a task done and queues the tasks it spawned in one
+    transaction, so a crash never loses a step or applies half of it. A
+    task that fails or loses its lease max_attempts times is marked failed
+    and left for requeue_failed().
+
+    Claims run in BEGIN IMMEDIATE transactions, so two processes never
+    lease the same task. Workers on other machines need the database on a
+    filesystem with working POSIX locks.
+    """
+
+    def __init__(self, db_path, lease_seconds=120, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # Autocommit mode: every write below opens its own IMMEDIATE transaction
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' kind TEXT NOT NULL,'
+            ' key TEXT NOT NULL UNIQUE,'
+            ' payload TEXT NOT NULL,'
+            ' priority INTEGER NOT NULL DEFAULT 0,'
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            ' worker TEXT,'
+            ' lease_until REAL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' updated_at REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, priority, id)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_worker ON tasks (worker)')
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    @staticmethod
+    def task_rows(tasks):
+        """(kind, key, payload JSON, priority) rows from (kind, key[, payload[, priority]]) tuples"""
+        rows = []
+        for task in tasks:
+            kind, key = task[0], task[1]
+            payload = task[2] if len(task) > 2 else None
+            priority = task[3] if len(task) > 3 else 0
+            rows.append((kind, str(key), json.dumps(payload, default=str), priority))
+        return rows
+
+    def put_many(self, tasks, conn=None):
+        """Queue (kind, key[, payload[, priority]]) tasks, skipping keys already queued; returns how many were new"""
+        rows = self.task_rows(tasks)
+        if conn is not None:
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO tasks (kind, key, payload, priority, updated_at)'
+                             ' VALUES (?, ?, ?, ?, ?)', [row + (time.time(),) for row in rows])
+            return conn.total_changes - before
+        with self.transaction() as conn:
+            return self.put_many(tasks, conn)
+
+    def put(self, kind, key, payload=None, priority=0):
+        return self.put_many([(kind, key, payload, priority)]) > 0
+
+    def claim(self, worker, limit=1, kinds=None):
+        """Lease up to `limit` pending tasks (optionally only of some kinds) to a worker"""
+        now = time.time()
+        with self.transaction() as conn:
+            # A lease that ran out belongs to a worker that died or lost contact
+            expired = conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " worker = NULL, lease_until = NULL, error = 'lease expired', updated_at = ?"
+                " WHERE state = 'leased' AND lease_until < ?", (self.max_attempts, now, now)
+            ).rowcount
+            sql = "SELECT id, kind, key, payload, attempts FROM tasks WHERE state = 'pending'"
+            params = []
+            if kinds:
+                sql += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+                params.extend(kinds)
+            rows = conn.execute(sql + ' ORDER BY priority DESC, id LIMIT ?', (*params, limit)).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1,"
+                ' updated_at = ? WHERE id = ?', [(worker, now + self.lease_seconds, now, row[0]) for row in rows]
+            )
+        if expired:
+            log.warning(f"Re-queued {expired} tasks whose worker stopped renewing its lease")
+            METRICS.count('leases_expired', expired)
+        return [Task(task_id, kind, key, json.loads(payload), attempts + 1)
+                for task_id, kind, key, payload, attempts in rows]
+
+    def renew(self, worker):
+        """Extend every lease the worker holds; returns how many it still holds"""
+        now = time.time()
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE worker = ? AND state = 'leased'",
+                (now + self.lease_seconds, now, worker)
+            ).rowcount
+
+    def complete(self, task, worker, spawn=()):
+        """Mark a task done and queue the tasks it spawned; False if the worker had already lost its lease"""
+        with self.transaction() as conn:
+            held = conn.execute(
+                "UPDATE tasks SET state = 'done', worker = NULL, lease_until = NULL, error = NULL, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND state = 'leased'", (time.time(), task.id, worker)
+            ).rowcount
+            # Queued even when the lease was lost: whoever redoes the task spawns the same keys
+            self.put_many(spawn, conn)
+        if not held:
+            log.warning(f"Finished {task!r} after its lease had passed to another worker")
+        return bool(held)
+
+    def fail(self, task, worker, error):
+        """Give a task back for a retry, or mark it failed once it has used up its attempts"""
+        state = FAILED if task.attempts >= self.max_attempts else PENDING
+        with self.transaction() as conn:
+            conn.execute(
+                'UPDATE tasks SET state = ?, worker = NULL, lease_until = NULL, error = ?, updated_at = ?'
+                " WHERE id = ? AND worker = ? AND state = 'leased'",
+                (state, str(error)[:500], time.time(), task.id, worker)
+            )
+        return state
+
+    def release(self, worker):
+        """Hand back every task a worker still holds (on shutdown), without counting the attempt"""
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET state = 'pending', worker = NULL, lease_until = NULL, attempts = attempts - 1,"
+                " updated_at = ? WHERE worker = ? AND state = 'leased'", (time.time(), worker)
+            ).rowcount
+
+    def requeue_failed(self):
+        """Put failed tasks back with fresh attempts; returns how many"""
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE tasks SET state = 'pending', attempts = 0, updated_at = ? WHERE state = 'failed'",
+                (time.time(),)
+            ).rowcount
+
+    def counts(self):
+        with self.lock:
+            counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+            counts.update(self.conn.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+            return counts
+
+    def drained(self):
+        """True once nothing is pending or leased (failed tasks don't hold the crawl open)"""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def failed_tasks(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT kind, key, error FROM tasks WHERE state = 'failed' ORDER BY id"
+            ).fetchall()
+
+    def clear(self):
+        """Forget every task after a crawl completes so the next run starts from the top"""
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM tasks')
+
+    def report(self):
+        counts = self.counts()
+        return (f"Work queue {self.db_path}: {counts[DONE]} done, {counts[PENDING]} pending, "
+                f"{counts[LEASED]} leased, {counts[FAILED]} failed")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Heartbeat(threading.Thread):
+    """Renews a worker's leases every lease_seconds / 3 until stopped.
+
+    The thread dies with its process, so the leases of a crashed or killed
+    worker expire while a slow but live one keeps its tasks.
+    """
+
+    def __init__(self, queue, worker):
+        super().__init__(name=f"heartbeat-{worker}", daemon=True)
+        self.queue = queue
+        self.worker = worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.renew(self.worker)
+            except sqlite3.Error as e:
+                log.warning(f"Couldn't renew leases for {self.worker}: {str(e)}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.join()
+
+
+def run_worker(queue, handle, worker=None, batch=1, idle_wait=1.0):
+    """Claim and handle tasks until the queue is drained; returns how many this worker completed.
+
+    handle(task) does the work and returns the tasks it spawns, as
+    (kind, key, payload[, priority]) tuples. If it raises, the task goes
+    back to the queue for a retry. While other workers still hold leases
+    the queue isn't drained, so an idle worker waits for the tasks they
+    spawn (or for their leases to expire) instead of exiting.
+    """
+    worker = worker or worker_name()
+    completed = 0
+    with Heartbeat(queue, worker):
+        try:
+            while True:
+                tasks = queue.claim(worker, batch)
+                if not tasks:
+                    if queue.drained():
+                        break
+                    METRICS.pause(idle_wait, 'queue_idle')
+                    continue
+                for task in tasks:
+                    try:
+                        with METRICS.timer(f"task_{task.kind}"):
+                            spawn = handle(task)
+                    except Exception as e:
+                        state = queue.fail(task, worker, f"{e.__class__.__name__}: {str(e)}")
+                        log.warning(f"{worker} failed {task!r} (attempt {task.attempts}, now {state}): {str(e)}")
+                        METRICS.count('tasks_failed', kind=task.kind)
+                        continue
+                    queue.complete(task, worker, spawn or ())
+                    METRICS.count('tasks_done', kind=task.kind)
+                    completed += 1
+        finally:
+            # Tasks claimed in this batch but not started go straight back
+            queue.release(worker)
+    log.info(f"{worker} finished {completed} tasks. {queue.report()}")
+    return completed
@@ -0,0 +1,138 @@
+import random
+import logging
+import threading
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class WorkStealingPool:
+    """Run tasks on N worker threads, each owning a deque of work.
+
+    Initial tasks are dealt round-robin across the workers. A worker pops
+    from the back of its own deque, and tasks it spawns go on the back too,
+    so related work stays with the same worker. Once its deque is empty,
+    a worker steals from the front of the fullest deque. That way a single
+    large task that fans out into many small ones (one big state -> its
+    profile chunks) gets shared across the whole pool.
+
+    start_worker(worker_id) builds a worker context (e.g. a scraper with its own
+    driver), stop_worker(context) tears it down, and handle(context, task, spawn)
+    processes one task. If handle raises, the context is treated as crashed:
+    it is stopped, a fresh one is started, and the task is retried up to
+    max_retries times.
+    """
+
+    def __init__(self, num_workers, start_worker, stop_worker, handle, max_retries=2):
+        self.num_workers = max(1, num_workers)
+        self.start_worker = start_worker
+        self.stop_worker = stop_worker
+        self.handle = handle
+        self.max_retries = max_retries
+        self.deques = [deque() for _ in range(self.num_workers)]
+        self.cond = threading.Condition()
+        self.busy = 0
+        self.stolen = 0
+        self.restarts = 0
+        self.failed_tasks = []
+
+    def push(self, worker_id, task):
+        with self.cond:
+            self.deques[worker_id].append(task)
+            self.cond.notify_all()
+
+    def next_task(self, worker_id):
+        """Pop local work, else steal; returns None once every deque is empty and nobody is busy"""
+        with self.cond:
+            while True:
+                own = self.deques[worker_id]
+                if own:
+                    self.busy += 1
+                    return own.pop()
+                victim = max(self.deques, key=len)
+                if victim:
+                    self.busy += 1
+                    self.stolen += 1
+                    return victim.popleft()
+                if self.busy == 0:
+                    self.cond.notify_all()
+                    return None
+                # Someone is still working and may spawn more tasks
+                self.cond.wait()
+
+    def task_done(self):
+        with self.cond:
+            self.busy -= 1
+            self.cond.notify_all()
+
+    def safe_start(self, worker_id):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.start_worker(worker_id)
+            except Exception as e:
+                log.warning(f"Worker {worker_id}: start attempt {attempt + 1} failed: {str(e)}")
+        return None
+
+    def safe_stop(self, context):
+        if context is None:
+            return
+        try:
+            self.stop_worker(context)
+        except Exception as e:
+            log.warning(f"Error stopping worker: {str(e)}")
+
+    def worker_loop(self, worker_id):
+        context = self.safe_start(worker_id)
+        try:
+            while True:
+                task = self.next_task(worker_id)
+                if task is None:
+                    return
+                done = False
+                try:
+                    for attempt in range(self.max_retries + 1):
+                        if context is None:
+                            context = self.safe_start(worker_id)
+                        if context is None:
+                            # Can't get a working driver; hand the task back for another worker
+                            log.warning(f"Worker {worker_id} giving up, returning {task!r} to the pool")
+                            self.push(worker_id, task)
+                            return
+                        try:
+                            self.handle(context, task, lambda t: self.push(worker_id, t))
+                            done = True
+                            break
+                        except Exception as e:
+                            log.warning(f"Worker {worker_id} crashed on {task!r} "
+                                        f"(attempt {attempt + 1}): {e.__class__.__name__} {str(e)}")
+                            self.safe_stop(context)
+                            context = None
+                            with self.cond:
+                                self.restarts += 1
+                    if not done:
+                        with self.cond:
+                            self.failed_tasks.append(task)
+                finally:
+                    self.task_done()
+        finally:
+            self.safe_stop(context)
+
+    def run(self, tasks):
+        """Shard tasks across the workers and block until all (and all spawned) tasks are done"""
+        tasks = list(tasks)
+        random.shuffle(tasks)  # Avoid alphabetical clumping of big states on one worker
+        for idx, task in enumerate(tasks):
+            self.deques[idx % self.num_workers].append(task)
+        threads = [threading.Thread(target=self.worker_loop, args=(i,), name=f"pool-worker-{i}", daemon=True)
+                   for i in range(self.num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Anything left was returned by workers that could not start a driver
+        for own in self.deques:
+            self.failed_tasks.extend(own)
+            own.clear()
+        log.info(f"Pool finished: {self.stolen} tasks stolen, {self.restarts} worker restarts, "
+                 f"{len(self.failed_tasks)} tasks failed")
+        return self.failed_tasks
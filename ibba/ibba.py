@@ -0,0 +1,450 @@
+import os
+import re
+import sys
+import logging
+import argparse
+import threading
+from urllib.parse import urlsplit
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.http import make_session, fetch_html
+from common.throttle import RateController, looks_blocked
+from common.fetcher import AsyncFetcher
+from common.worker_pool import WorkStealingPool
+from common.store import RecordStore
+from common.dedup import DedupIndex
+from common.cache import ResponseCache
+from common.metrics import METRICS
+from common.log import setup_logging
+from common.snapshot import PageSnapshot, node_text
+from common.checkpoint import Checkpoint
+from common.selector_resolver import SelectorResolver
+
+log = logging.getLogger('ibba')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY_URL = 'https://www.ibba.org/find-a-business-broker/'
+PROGRESS_DIR = os.path.join(REPO_DIR, 'ibba', 'progress')
+# Progress folder of the earlier Selenium crawl, kept in the repo: read for a hint, never written or cleared
+LEGACY_PROGRESS_DIR = os.path.join(REPO_DIR, '995Axial', 'ibba_scraper_progress')
+# /broker-profile/<state>/<city>/<name>/
+PROFILE_PATH = re.compile(r'^/broker-profile/([a-z0-9-]+)/([a-z0-9-]+)/([a-z0-9-]+)/?$')
+
+COLUMNS = ['Broker Name', 'Company Name', 'Phone', 'Email', 'Website', 'City', 'State', 'Designations',
+           'Profile URL']
+
+# The find-a-broker page fills its broker panel with JavaScript, but the "Brokers By State" list under
+# it is static, and so are the state and profile pages it links to
+SELECTORS = SelectorResolver('ibba.org')
+SELECTORS.register('State Link', [
+    "//div[contains(@class, 'statescontainer')]//div[contains(@class, 'state')]"
+    "/a[contains(@href, '/state/') or contains(@href, '/canadian-state/')]",
+], fallbacks=["//a[contains(@href, '/state/') or contains(@href, '/canadian-state/')]"])
+SELECTORS.register('Profile Link', ["//a[contains(@href, '/broker-profile/')]"])
+SELECTORS.register('Next Page', [
+    "//a[@rel='next']",
+    "//a[contains(@class, 'next') and contains(@class, 'page')]",
+    "//link[@rel='next']",
+])
+# Class-based selectors first; the loose ones below them may read the site header instead
+SELECTORS.register('Broker Name', ["//div[@id='content']//*[contains(@class, 'broker')]//h1"], fallbacks=[
+    "//div[@id='content']//h1",
+    "//h1",
+])
+SELECTORS.register('Company Name', ["//div[@id='content']//*[contains(@class, 'company')][not(self::a)]"],
+                   fallbacks=["//div[@id='content']//h1/following::h2[1]"])
+SELECTORS.register('Phone', ["//div[@id='content']//a[starts-with(@href, 'tel:')]"])
+SELECTORS.register('Email', ["//div[@id='content']//a[starts-with(@href, 'mailto:')]"])
+SELECTORS.register('Website', ["//div[@id='content']//a[contains(@class, 'website')]"], fallbacks=[
+    "//div[@id='content']//a[starts-with(@href, 'http') and not(contains(@href, 'ibba.org'))"
+    " and not(contains(@href, 'mapbox')) and not(contains(@href, 'openstreetmap'))]",
+])
+# Credential badges (CBI, M&AMI, MCBI); the map legend explains them with the same classes
+SELECTORS.register('Designations', [
+    "//div[@id='content']//*[contains(@class, 'cbi') or contains(@class, 'designation')]"
+    "[not(ancestor::*[contains(@class, 'legends')])]",
+])
+# Headings of pages that answer 200 without being a profile
+NOT_PROFILES = ('find a business broker', 'page not found', 'nothing found')
+
+
+def slug_title(slug):
+    return ' '.join(word.capitalize() for word in slug.split('-'))
+
+
+def parse_profile_url(url):
+    """(canonical URL, state slug, city slug, name slug) for a /broker-profile/ link, else None"""
+    parts = urlsplit(url or '')
+    match = PROFILE_PATH.match(parts.path.lower())
+    if not match:
+        return None
+    state, city, name = match.groups()
+    return f"{parts.scheme}://{parts.netloc.lower()}/broker-profile/{state}/{city}/{name}/", state, city, name
+
+
+def parse_states(page_html, url):
+    """[{'name', 'url', 'slug'}] from the directory's Brokers By State list, US states then Canada"""
+    try:
+        snapshot = PageSnapshot(page_html, url)
+    except (etree.ParserError, ValueError):
+        return []
+    states, seen = [], set()
+    for link in SELECTORS.find_all(snapshot, 'State Link'):
+        state_url, name = snapshot.link(link), node_text(link)
+        if not state_url or not name or state_url in seen:
+            continue
+        seen.add(state_url)
+        states.append({'name': name, 'url': state_url, 'slug': state_url.rstrip('/').rsplit('/', 1)[-1]})
+    return states
+
+
+def collect_profile_links(snapshot):
+    """Canonical profile URLs on a state page, in page order"""
+    links = []
+    for link in SELECTORS.find_all(snapshot, 'Profile Link'):
+        parsed = parse_profile_url(snapshot.link(link))
+        if parsed and parsed[0] not in links:
+            links.append(parsed[0])
+    return links
+
+
+def parse_profile_html(page_html, url, state_names=None):
+    """Profile fields from a server-rendered profile page; None if the page doesn't look like a profile.
+
+    City and state come from the URL; the name falls back to it when the
+    page has none of its own.
+    """
+    parsed = parse_profile_url(url)
+    if parsed is None or looks_blocked(page_html):
+        return None
+    try:
+        snapshot = PageSnapshot(page_html, url)
+    except (etree.ParserError, ValueError):
+        return None
+    _, state, city, name_slug = parsed
+    name = SELECTORS.text(snapshot, 'Broker Name')
+    if name and name.lower() in NOT_PROFILES:
+        return None
+    phone = SELECTORS.first(snapshot, 'Phone')
+    email = SELECTORS.first(snapshot, 'Email')
+    # Without a name or any contact link this is a JS shell or error page, not a profile
+    if not name and phone is None and email is None:
+        return None
+    website = SELECTORS.first(snapshot, 'Website')
+    designations = []
+    for badge in SELECTORS.find_all(snapshot, 'Designations'):
+        text = node_text(badge)
+        if text and len(text) <= 8 and text not in designations:
+            designations.append(text)
+    return {
+        'Broker Name': name or slug_title(name_slug),
+        'Company Name': SELECTORS.text(snapshot, 'Company Name', 'Not found'),
+        'Phone': phone.get('href')[4:].strip() if phone is not None else 'Not found',
+        'Email': email.get('href')[7:].split('?')[0].strip() if email is not None else 'Not found',
+        'Website': (snapshot.link(website) if website is not None else None) or 'Not found',
+        'City': slug_title(city),
+        'State': (state_names or {}).get(state) or slug_title(state),
+        'Designations': ', '.join(designations) or 'Not found',
+    }
+
+
+class IbbaScraper:
+    """IBBA broker directory over plain HTTP: states are shards on a work-stealing pool of sessions"""
+
+    def __init__(self, concurrency=8, per_host_limit=4, refresh=False, use_cache=True, progress_dir=PROGRESS_DIR):
+        self.concurrency = concurrency  # Profiles in flight at once per worker
+        self.per_host_limit = per_host_limit  # Cap on simultaneous connections to one host
+        self.refresh = refresh  # Re-visit every profile and update changed records in place
+        self.base_url = DIRECTORY_URL
+        self.output_dir = os.path.join(os.getcwd(), 'ibba')
+        self.excel_path = os.path.join(self.output_dir, 'ibba_brokers.xlsx')
+        self.db_path = os.path.join(self.output_dir, 'ibba_brokers.db')
+        self.selector_stats_path = os.path.join(self.output_dir, 'selector_stats.json')
+        self.save_frequency = 25
+        self.data = []
+        self.state_names = {}  # URL slug -> state name, for the State column
+        self.rate = RateController(max_window=per_host_limit)
+        self.profile_latencies = []  # Seconds per profile fetched
+        self.profile_chunk_size = 25  # Profiles per stealable task in the pool
+        self.failed_profiles = 0
+        self.lock = threading.RLock()
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+            log.info(f"Created output directory: {self.output_dir}")
+
+        SELECTORS.load(self.selector_stats_path)
+        self.cache = ResponseCache(os.path.join(self.output_dir, 'http_cache')) if use_cache else None
+
+        self.store = RecordStore(self.db_path, COLUMNS, key_column='Profile URL')
+        if self.store.count() == 0 and os.path.exists(self.excel_path):
+            imported = self.store.import_xlsx(self.excel_path)
+            log.info(f"Imported {imported} brokers from {self.excel_path}")
+        self.saved_count = self.store.count()
+        self.changed_count = 0
+        if self.refresh:
+            self.processed_urls = DedupIndex(os.path.join(self.output_dir, 'refresh_urls.idx'))
+        else:
+            self.processed_urls = DedupIndex(os.path.join(self.output_dir, 'processed_urls.idx'),
+                                             self.store, ['Profile URL'])
+        if self.saved_count:
+            log.info(f"Loaded {self.saved_count} previously scraped brokers")
+        else:
+            log.info('Starting fresh — no existing record store found')
+
+        if os.path.abspath(progress_dir) == os.path.abspath(LEGACY_PROGRESS_DIR):
+            log.warning(f"{LEGACY_PROGRESS_DIR} is the earlier crawl's tracked folder; checkpointing to {PROGRESS_DIR}")
+            progress_dir = PROGRESS_DIR
+        if refresh:
+            progress_dir = os.path.join(self.output_dir, 'refresh_progress')
+        self.checkpoint = Checkpoint(progress_dir)
+        self.processed_urls.update(self.checkpoint.done_urls)
+        if self.checkpoint.has_progress():
+            log.info(f"Resuming crawl from {progress_dir}: {len(self.checkpoint.done_urls)} profiles and "
+                     f"{len(self.checkpoint.cursor['completed_states'])} states already done"
+                     + (f", last started {self.checkpoint.current_state()}" if self.checkpoint.current_state() else ''))
+        elif not refresh:
+            self.legacy_hint()
+        self.pending_chunks = {}  # Profile chunks left per state
+        self.state_failures = {}  # Profiles per state that failed this run
+
+    def legacy_hint(self):
+        """Say where the earlier crawl stopped; its profiles have no records here, so they are scraped again"""
+        urls_path = os.path.join(LEGACY_PROGRESS_DIR, 'scraped_urls.txt')
+        if not os.path.exists(urls_path):
+            return
+        with open(urls_path, encoding='utf-8') as f:
+            urls = {line.strip() for line in f if line.strip()}
+        state_path = os.path.join(LEGACY_PROGRESS_DIR, 'current_state.txt')
+        state = None
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                state = f.read().strip() or None
+        missing = sum(1 for url in urls if self.store.get(url) is None)
+        log.info(f"The earlier crawl in {LEGACY_PROGRESS_DIR} visited {len(urls)} profiles"
+                 + (f" and last started {state}" if state else '')
+                 + (f"; {missing} of them have no record here and will be scraped" if missing else ''))
+
+    def make_session(self):
+        return make_session(pool_size=self.per_host_limit)
+
+    def save_progress(self, force=False):
+        count = len(self.data)
+        if count == 0:
+            return
+        if not force and count < self.save_frequency:
+            return
+
+        with self.lock, METRICS.timer('save'):
+            if self.refresh:
+                self.changed_count += self.store.append_many(self.data, replace=True)
+            else:
+                self.saved_count += self.store.append_many(self.data)
+            self.processed_urls.commit()
+            # Only mark profiles done once their records are durable
+            self.checkpoint.mark_profiles_done([record['Profile URL'] for record in self.data])
+            self.data.clear()
+        METRICS.count('records_saved', count)
+        if self.refresh:
+            log.info(f"→ Refreshed brokers, {self.changed_count} new or changed so far",
+                     extra={'changed': self.changed_count})
+        else:
+            log.info(f"→ Saved {self.saved_count} brokers", extra={'saved': self.saved_count})
+
+    def export_excel(self):
+        """Write the deliverable .xlsx from the record store in one streaming pass"""
+        with METRICS.timer('export'):
+            count = self.store.export_xlsx(self.excel_path)
+        log.info(f"Exported {count} brokers to {self.excel_path}")
+
+    def save_selector_stats(self):
+        """Persist the learned selector order and log this run's selector, cache and rate-control reports"""
+        SELECTORS.save(self.selector_stats_path)
+        log.info(SELECTORS.report())
+        if self.cache:
+            log.info(self.cache.report())
+        log.info(self.rate.report())
+
+    def finish_crawl(self):
+        """Forget crawl progress after a clean finish so the next run starts from the top"""
+        self.checkpoint.clear()
+        if self.refresh:
+            self.processed_urls.clear()
+
+    def get_states(self, session):
+        with METRICS.timer('listing_page'):
+            page_html = fetch_html(session, self.base_url, rate=self.rate)
+        states = parse_states(page_html, self.base_url) if page_html else []
+        log.info(f"Found {len(states)} states and provinces")
+        return states
+
+    def load_states(self, session):
+        """State list from the checkpoint when resuming, else read from the directory page"""
+        states = self.checkpoint.recall('states')
+        if states:
+            log.info(f"Using {len(states)} checkpointed states")
+        else:
+            states = self.get_states(session)
+            if states:
+                self.checkpoint.remember('states', states)
+        self.state_names = {state['slug']: state['name'] for state in states}
+        return states
+
+    def state_listings(self, session, state):
+        """Profile URLs listed for a state, walking its pages (or resuming an interrupted walk)"""
+        saved = self.checkpoint.saved_listing(state['name'])
+        if saved is not None:
+            return saved
+        page, url, listings = 1, state['url'], []
+        resume = self.checkpoint.resume_point(state['name'])
+        if resume:
+            page, url, listings = resume[0] + 1, resume[1], list(resume[2])
+            log.info(f"Resuming {state['name']} at page {page}")
+        while url:
+            with METRICS.timer('listing_page'):
+                page_html = fetch_html(session, url, cache=self.cache, ttl=24 * 3600, rate=self.rate)
+            if page_html is None:
+                return None  # Leave the listing unfinished so a retry or the next run picks it up
+            snapshot = PageSnapshot(page_html, url)
+            for link in collect_profile_links(snapshot):
+                if link not in listings:
+                    listings.append(link)
+            next_link = SELECTORS.first(snapshot, 'Next Page')
+            next_url = snapshot.link(next_link) if next_link is not None else None
+            url = next_url if next_url and next_url != url else None
+            if url:
+                self.checkpoint.save_page(state['name'], page, url, listings)
+                page += 1
+        self.checkpoint.finish_listing(state['name'], listings)
+        return listings
+
+    def record_broker(self, listing_url, broker_info):
+        """Queue an extracted broker for saving and mark its profile URL as processed"""
+        with self.lock:
+            # Brokers listed under several states are only kept once
+            if listing_url in self.processed_urls:
+                return
+            self.data.append(dict(broker_info, **{'Profile URL': listing_url}))
+            self.processed_urls.add(listing_url)
+            if len(self.data) >= self.save_frequency:
+                self.save_progress()
+
+    def fetch_profiles(self, urls, state_name):
+        """Fetch profiles over HTTP in parallel, streaming each parsed one into the save path; returns failures"""
+        fetcher = AsyncFetcher(concurrency=self.concurrency, per_host=self.per_host_limit, cache=self.cache,
+                               rate=self.rate)
+
+        def on_result(listing_url, broker_info):
+            if broker_info:
+                log.debug(f"Extracted broker info: {broker_info}")
+                self.record_broker(listing_url, broker_info)
+
+        failures = fetcher.run(urls, lambda page_html, url: parse_profile_html(page_html, url, self.state_names),
+                               on_result)
+        with self.lock:
+            self.profile_latencies.extend(fetcher.latencies)
+            self.failed_profiles += len(failures)
+        log.info(f"Fetched {fetcher.fetched}/{len(urls)} brokers from {state_name} "
+                 f"at {fetcher.pages_per_second():.1f} pages/sec")
+        if failures:
+            # Not marked processed, so the next run tries them again
+            log.warning(f"{len(failures)} profiles from {state_name} failed to download or parse")
+        return failures
+
+    def handle_task(self, session, task, spawn):
+        """Process one pool task: ('state', state) or ('profiles', state_name, urls)"""
+        if task[0] == 'state':
+            state = task[1]
+            log.info(f"[{threading.current_thread().name}] Processing state: {state['name']}")
+            self.checkpoint.start_state(state['name'])
+            listings = self.state_listings(session, state)
+            if listings is None:
+                raise IOError(f"Couldn't read the listing for {state['name']}")
+            todo = [url for url in listings if url not in self.processed_urls]
+            log.info(f"Found {len(listings)} brokers for {state['name']}, {len(todo)} not yet scraped")
+            if not todo:
+                self.checkpoint.mark_state_done(state['name'])
+                return
+            # Split the state into chunks so idle workers can steal part of a big state
+            chunks = [todo[i:i + self.profile_chunk_size] for i in range(0, len(todo), self.profile_chunk_size)]
+            with self.lock:
+                self.pending_chunks[state['name']] = len(chunks)
+                self.state_failures[state['name']] = 0
+            for chunk in chunks:
+                spawn(('profiles', state['name'], chunk))
+        else:
+            _, state_name, urls = task
+            failures = self.fetch_profiles([url for url in urls if url not in self.processed_urls], state_name)
+            # The state is finished once its last chunk is saved; with failed profiles it stays open for the next run
+            with self.lock:
+                self.pending_chunks[state_name] -= 1
+                self.state_failures[state_name] += len(failures)
+                if self.pending_chunks[state_name] == 0:
+                    self.save_progress(force=True)
+                    if not self.state_failures[state_name]:
+                        self.checkpoint.mark_state_done(state_name)
+
+    def run(self, workers=4):
+        """Crawl every state, `workers` states (or chunks of a big one) at a time"""
+        session = self.make_session()
+        try:
+            states = self.load_states(session)
+            if not states:
+                log.warning("No states found. Exiting.")
+                return
+
+            pool = WorkStealingPool(
+                workers,
+                start_worker=lambda worker_id: self.make_session(),
+                stop_worker=lambda worker_session: worker_session.close(),
+                handle=self.handle_task,
+            )
+            todo = [state for state in states if not self.checkpoint.state_done(state['name'])]
+            log.info(f"{len(states) - len(todo)} states already done, {len(todo)} to go")
+            failed = pool.run([('state', state) for state in todo])
+            for task in failed:
+                log.warning(f"Gave up on task: {task[0]} {task[1]['name'] if task[0] == 'state' else task[1]}")
+            self.save_progress(force=True)
+            if not failed and not self.failed_profiles:
+                self.finish_crawl()
+            log.info("Scraping completed!")
+        except Exception as e:
+            log.exception(f"Error running scraper: {str(e)}")
+        finally:
+            self.save_progress(force=True)
+            self.export_excel()
+            self.save_selector_stats()
+            session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape the IBBA broker directory over HTTP')
+    parser.add_argument('--workers', type=int, default=4, help='States crawled in parallel')
+    parser.add_argument('--concurrency', type=int, default=8, help='Profiles in flight at once per worker')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Re-visit every profile and update changed brokers (unchanged pages come from the cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk HTTP response cache')
+    parser.add_argument('--progress-dir', default=PROGRESS_DIR, help='Checkpoint folder (default: ibba/progress)')
+    parser.add_argument('--export', action='store_true', help='Only export the record store to Excel')
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='Time each crawl stage and write ibba.prom and a JSON summary to DIR')
+    parser.add_argument('--log-json', action='store_true', help='Log one JSON object per line')
+    parser.add_argument('--log-level', default='INFO', help='DEBUG shows every profile (default: INFO)')
+    args = parser.parse_args()
+
+    setup_logging(json_lines=args.log_json, level=args.log_level)
+    if args.metrics:
+        METRICS.enable(scraper='ibba')
+    scraper = IbbaScraper(concurrency=args.concurrency, refresh=args.refresh, use_cache=not args.no_cache,
+                          progress_dir=args.progress_dir)
+    try:
+        if args.export:
+            scraper.export_excel()
+        else:
+            scraper.run(workers=args.workers)
+    finally:
+        if args.metrics:
+            if scraper.cache:
+                scraper.cache.count_metrics()
+            prom_path, summary_path = METRICS.write(args.metrics, 'ibba')
+            log.info(f"Wrote metrics to {prom_path} and {summary_path}")